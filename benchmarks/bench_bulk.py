@@ -0,0 +1,97 @@
+"""
+Compare ``POST /api/books/bulk/`` with one request per book.
+
+    python -m benchmarks.bench_bulk --items 500
+"""
+
+import argparse
+import itertools
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from books.models import Author, Book
+    from books.views import BookViewSet
+    from users.models import User
+
+    BookViewSet.throttle_classes = []
+    client = APIClient()
+    client.force_authenticate(
+        User.objects.create_user(email="bench@example.com", password="bench")
+    )
+    authors = [
+        author.id
+        for author in Author.objects.bulk_create(
+            Author(first_name=f"First{i}", last_name=f"Last{i}") for i in range(20)
+        )
+    ]
+    counter = itertools.count()
+
+    def payload():
+        return [
+            {
+                "title": f"Book {next(counter)}",
+                "authors": [authors[i % 20], authors[(i + 7) % 20]],
+                "cover": "SOFT",
+                "inventory": 2,
+                "daily_fee": "1.50",
+            }
+            for i in range(args.items)
+        ]
+
+    def create_one_by_one():
+        for item in payload():
+            client.post(reverse("book-list"), item, format="json")
+
+    def create_bulk():
+        response = client.post(reverse("book-bulk"), payload(), format="json")
+        assert response.status_code == 200, response.data
+
+    def updates():
+        ids = Book.objects.order_by("?").values_list("id", flat=True)[: args.items]
+        return [{"id": book_id, "inventory": 5} for book_id in ids]
+
+    def update_one_by_one():
+        for item in updates():
+            client.patch(reverse("book-detail", args=[item["id"]]), item, format="json")
+
+    def update_bulk():
+        response = client.post(reverse("book-bulk"), updates(), format="json")
+        assert response.status_code == 200, response.data
+
+    rows = []
+    for name, single, bulk in (
+        ("create", create_one_by_one, create_bulk),
+        ("update", update_one_by_one, update_bulk),
+    ):
+        single_time = measure(single, args.repeat)
+        bulk_time = measure(bulk, args.repeat)
+        rows.append(
+            (
+                name,
+                f"{single_time * 1000:.0f}",
+                f"{bulk_time * 1000:.0f}",
+                f"{single_time / bulk_time:.1f}x",
+            )
+        )
+
+    report(
+        f"Writing {args.items} books (median of {args.repeat}, ms)",
+        rows,
+        ["operation", "one by one", "bulk", "speedup"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Hammer one book with concurrent check-outs.
+
+Compares the conditional ``UPDATE`` behind ``Book.objects.check_out`` with
+the read-modify-write the borrowing endpoints used to do, and checks that
+the number of successful check-outs matches the inventory taken.
+
+    python -m benchmarks.bench_checkout --threads 8 --attempts 200
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks.utils import report, setup_django
+
+
+def read_modify_write(book_id):
+    from books.models import Book
+
+    book = Book.objects.get(pk=book_id)
+    if book.inventory <= 0:
+        return False
+    book.inventory -= 1
+    book.save(update_fields=["inventory", "updated_at"])
+    return True
+
+
+def conditional_update(book_id):
+    from books.models import Book
+
+    return Book.objects.check_out(book_id)
+
+
+def run(check_out, threads, attempts, inventory):
+    from django.db import OperationalError, connection
+
+    from books.models import Book
+
+    book = Book.objects.create(
+        title="Hot Book", cover="HARD", inventory=inventory, daily_fee="1.00"
+    )
+    results = {"ok": 0, "sold_out": 0, "errors": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(attempts):
+                try:
+                    outcome = "ok" if check_out(book.id) else "sold_out"
+                except OperationalError:
+                    outcome = "errors"
+                with lock:
+                    results[outcome] += 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    taken = inventory - Book.objects.get(pk=book.id).inventory
+    return results, taken, threads * attempts / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=200, help="per thread")
+    parser.add_argument(
+        "--inventory",
+        type=int,
+        help="initial copies; defaults to half of all attempts",
+    )
+    args = parser.parse_args()
+
+    setup_django(on_disk=True)
+
+    inventory = args.inventory or args.threads * args.attempts // 2
+    rows = []
+    for name, check_out in (
+        ("read-modify-write", read_modify_write),
+        ("conditional update", conditional_update),
+    ):
+        results, taken, rate = run(check_out, args.threads, args.attempts, inventory)
+        rows.append(
+            (
+                name,
+                f"{rate:,.0f}",
+                results["ok"],
+                taken,
+                results["ok"] - taken,
+                results["sold_out"],
+                results["errors"],
+            )
+        )
+
+    report(
+        f"{args.threads} threads x {args.attempts} check-outs of one book "
+        f"with {inventory} copies",
+        rows,
+        [
+            "strategy",
+            "ops/s",
+            "succeeded",
+            "copies taken",
+            "lost",
+            "sold out",
+            "errors",
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
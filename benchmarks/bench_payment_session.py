@@ -0,0 +1,160 @@
+"""
+Concurrent checkouts against a slow payment gateway.
+
+Compares creating the Stripe session inside the checkout transaction, as the
+borrowing endpoints used to, with the two-phase flow: commit the borrowing
+as "awaiting_session", then call Stripe and record the session with a
+conditional update. Sessions are created by the real Stripe client against
+the local stand-in from ``benchmarks.fake_stripe``.
+
+    python -m benchmarks.bench_payment_session --threads 8 --checkouts 20 \
+        --latency 200 --distribution lognormal
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.fake_stripe import DISTRIBUTIONS, GatewayProfile, start_server
+from benchmarks.utils import report, setup_django
+
+
+def insert_borrowing(user_id, book_id, payment_status):
+    from books.models import Book
+    from borrowings.models import Borrowing
+
+    if not Book.objects.check_out(book_id):
+        raise RuntimeError("sold out")
+    return Borrowing.objects.create(
+        user_id=user_id,
+        book_id=book_id,
+        expected_return_date=date.today() + timedelta(days=7),
+        amount_paid=7,
+        payment_status=payment_status,
+    )
+
+
+def in_transaction(user_id, book_id):
+    from django.db import transaction
+
+    from payments.models import Payment
+    from payments.services import StripePaymentService
+
+    start = time.perf_counter()
+    with transaction.atomic():
+        borrowing = insert_borrowing(user_id, book_id, "pending")
+        session = StripePaymentService().create_payment_session(
+            {"amount": borrowing.amount_paid, "book_name": "Hot Book"}
+        )
+        Payment.objects.create(
+            borrowing=borrowing,
+            purpose=Payment.RENTAL,
+            amount=borrowing.amount_paid,
+            session_id=session["session_id"],
+            session_url=session["session_url"],
+        )
+    return time.perf_counter() - start
+
+
+def two_phase(user_id, book_id):
+    from django.db import transaction
+
+    from borrowings.payment_sessions import AWAITING_SESSION, attach_payment_session
+
+    start = time.perf_counter()
+    with transaction.atomic():
+        borrowing = insert_borrowing(user_id, book_id, AWAITING_SESSION)
+    held = time.perf_counter() - start
+    attach_payment_session(borrowing)
+    return held
+
+
+def run(checkout, threads, checkouts):
+    from django.db import connection
+
+    from books.models import Book
+    from users.models import User
+
+    book = Book.objects.create(
+        title="Hot Book", cover="HARD", inventory=threads * checkouts, daily_fee="1.00"
+    )
+    users = User.objects.bulk_create(
+        User(email=f"{checkout.__name__}{i}@example.com")
+        for i in range(threads * checkouts)
+    )
+    held = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(user_ids):
+        barrier.wait()
+        try:
+            for user_id in user_ids:
+                seconds = checkout(user_id, book.id)
+                with lock:
+                    held.append(seconds)
+        finally:
+            connection.close()
+
+    user_ids = [user.id for user in users]
+    workers = [
+        threading.Thread(target=worker, args=(user_ids[i::threads],))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return held, len(held) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--checkouts", type=int, default=20, help="per thread")
+    parser.add_argument(
+        "--latency", type=float, default=200, help="gateway latency in ms"
+    )
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    args = parser.parse_args()
+
+    setup_django(on_disk=True)
+
+    from django.test import override_settings
+
+    server = start_server(
+        GatewayProfile(latency=args.latency, distribution=args.distribution)
+    )
+    rows = []
+    with override_settings(
+        STRIPE_API_BASE=server.api_base, STRIPE_API_KEY="sk_test_benchmark"
+    ):
+        for name, checkout in (
+            ("session inside transaction", in_transaction),
+            ("two-phase", two_phase),
+        ):
+            held, rate = run(checkout, args.threads, args.checkouts)
+            rows.append(
+                (
+                    name,
+                    f"{rate:,.1f}",
+                    f"{statistics.median(held) * 1000:.1f}",
+                    f"{max(held) * 1000:.1f}",
+                )
+            )
+    server.shutdown()
+
+    report(
+        f"{args.threads} threads x {args.checkouts} checkouts, "
+        f"gateway latency {args.latency:.0f} ms ({args.distribution})",
+        rows,
+        ["strategy", "checkouts/s", "median tx ms", "max tx ms"],
+    )
+
+
+if __name__ == "__main__":
+    main()
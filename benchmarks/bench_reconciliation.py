@@ -0,0 +1,123 @@
+"""
+Reconciling stale pending payments against a slow payment gateway.
+
+Seeds pending payments whose sessions the local Stripe stand-in reports as
+paid, expired or still open, then runs ``reconcile_payments`` with growing
+thread pools and reports sessions checked per second.
+
+    python -m benchmarks.bench_reconciliation --payments 400 --latency 100 \
+        --concurrency 1 4 8
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.fake_stripe import DISTRIBUTIONS, GatewayProfile, start_server
+from benchmarks.utils import report, setup_django
+
+SESSION_STATES = (
+    {"status": "complete", "payment_status": "paid"},
+    {"status": "expired"},
+    {},
+)
+
+
+def seed(server, count):
+    from django.utils import timezone
+
+    from books.models import Book
+    from borrowings.models import Borrowing
+    from payments.models import Payment
+    from users.models import User
+
+    book = Book.objects.create(
+        title="Hot Book", cover="HARD", inventory=count, daily_fee="1.00"
+    )
+    users = User.objects.bulk_create(
+        User(email=f"reader{i}@example.com") for i in range(count)
+    )
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(
+            user=user,
+            book=book,
+            expected_return_date=date.today(),
+            payment_status=Payment.PENDING,
+        )
+        for user in users
+    )
+    created_at = timezone.now() - timedelta(days=1)
+    payments = Payment.objects.bulk_create(
+        Payment(
+            borrowing=borrowing,
+            purpose=Payment.RENTAL,
+            amount=7,
+            session_id=f"cs_test_{i}",
+            created_at=created_at,
+        )
+        for i, borrowing in enumerate(borrowings)
+    )
+    for i, payment in enumerate(payments):
+        server.set_session(payment.session_id, **SESSION_STATES[i % 3])
+
+
+def reset():
+    from borrowings.models import Borrowing
+    from payments.models import Payment
+
+    Payment.objects.update(status=Payment.PENDING, paid_at=None)
+    Borrowing.objects.update(payment_status=Payment.PENDING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=400)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument(
+        "--latency", type=float, default=100, help="gateway latency in ms"
+    )
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    args = parser.parse_args()
+
+    setup_django(on_disk=True)
+
+    from django.test import override_settings
+
+    from payments.reconciliation import reconcile_payments
+
+    server = start_server(
+        GatewayProfile(latency=args.latency, distribution=args.distribution)
+    )
+    seed(server, args.payments)
+    rows = []
+    with override_settings(
+        STRIPE_API_BASE=server.api_base,
+        STRIPE_API_KEY="sk_test_benchmark",
+        STRIPE_POOL_SIZE=max(args.concurrency),
+    ):
+        for concurrency in args.concurrency:
+            reset()
+            stats = reconcile_payments(
+                page_size=args.page_size, concurrency=concurrency
+            )
+            rows.append(
+                (
+                    concurrency,
+                    stats["checked"],
+                    stats["reconciled"],
+                    stats["errors"],
+                    f"{stats['per_second']:,.1f}",
+                )
+            )
+    server.shutdown()
+
+    report(
+        f"{args.payments} stale payments, page size {args.page_size}, "
+        f"gateway latency {args.latency:.0f} ms ({args.distribution})",
+        rows,
+        ["threads", "checked", "reconciled", "errors", "sessions/s"],
+    )
+
+
+if __name__ == "__main__":
+    main()
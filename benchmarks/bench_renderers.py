@@ -0,0 +1,118 @@
+"""
+Compare response rendering time and payload size of DRF's JSONRenderer, the
+orjson renderer and, when msgpack is installed, the MessagePack renderer.
+
+    python -m benchmarks.bench_renderers --rows 200 --rows 1000
+"""
+
+import argparse
+from datetime import date, timedelta
+from importlib.util import find_spec
+
+from benchmarks.utils import measure, report, setup_django
+
+
+def populate(rows):
+    from books.models import Author, Book
+    from borrowings.models import Borrowing
+    from users.models import User
+
+    authors = Author.objects.bulk_create(
+        Author(first_name=f"First{i}", last_name=f"Last{i}") for i in range(50)
+    )
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Book number {i}",
+            author_display=f"{authors[i % 50]}, {authors[(i + 1) % 50]}",
+            cover="HARD" if i % 2 else "SOFT",
+            inventory=i % 7,
+            daily_fee=f"{i % 20}.{i % 100:02d}",
+        )
+        for i in range(rows)
+    )
+    through = Book.authors.through
+    through.objects.bulk_create(
+        through(book_id=book.id, author_id=authors[(i + offset) % 50].id)
+        for i, book in enumerate(books)
+        for offset in (0, 1)
+    )
+    users = User.objects.bulk_create(
+        User(email=f"reader{i}@example.com") for i in range(rows)
+    )
+    Borrowing.objects.bulk_create(
+        Borrowing(
+            user=user,
+            book=book,
+            borrow_date=date(2024, 1, 1) + timedelta(days=i % 300),
+            expected_return_date=date(2024, 1, 15) + timedelta(days=i % 300),
+            amount_paid=f"{i % 50}.50",
+        )
+        for i, (user, book) in enumerate(zip(users, books))
+    )
+
+
+def payloads(rows):
+    from books.models import Book
+    from books.serializers import BookSerializer
+    from borrowings.models import Borrowing
+    from borrowings.serializers import BorrowingSerializer
+
+    books = BookSerializer(Book.objects.with_authors()[:rows], many=True).data
+    borrowings = BorrowingSerializer(
+        Borrowing.objects.select_related("user", "book")[:rows], many=True
+    ).data
+    # Raw values as views that skip serializers would hand them over.
+    raw = list(
+        Borrowing.objects.values(
+            "id", "borrow_date", "expected_return_date", "amount_paid"
+        )[:rows]
+    )
+    return {"books": books, "borrowings": borrowings, "raw borrowings": raw}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, action="append")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    sizes = args.rows or [50, 200, 1000]
+
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+
+    from library_management.renderers import MessagePackRenderer, ORJSONRenderer
+
+    renderers = [("drf json", JSONRenderer()), ("orjson", ORJSONRenderer())]
+    if find_spec("msgpack"):
+        renderers.append(("msgpack", MessagePackRenderer()))
+
+    populate(max(sizes))
+
+    rows = []
+    for size in sizes:
+        for name, data in payloads(size).items():
+            baseline = None
+            for renderer_name, renderer in renderers:
+                seconds = measure(lambda: renderer.render(data), args.repeat)
+                baseline = baseline or seconds
+                rows.append(
+                    (
+                        name,
+                        size,
+                        renderer_name,
+                        f"{seconds * 1000:.2f}",
+                        f"{baseline / seconds:.1f}x",
+                        len(renderer.render(data)),
+                    )
+                )
+
+    report(
+        f"Rendering (median of {args.repeat})",
+        rows,
+        ["payload", "rows", "renderer", "ms", "speedup", "bytes"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare the full-text index behind ``/api/books/?q=`` with ``icontains`` scans.
+
+    python -m benchmarks.bench_search --rows 1000000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.utils import measure, report, setup_django
+
+SYLLABLES = ["ka", "lo", "mir", "then", "sa", "dor", "vel", "ur", "an", "is", "tor"]
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def populate(rows, rng):
+    from books.models import Author, Book
+
+    authors = Author.objects.bulk_create(
+        Author(first_name=word(rng).title(), last_name=word(rng).title())
+        for _ in range(max(rows // 50, 10))
+    )
+    through = Book.authors.through
+    batch = 10_000
+    for start in range(0, rows, batch):
+        books = Book.objects.bulk_create(
+            Book(
+                title=" ".join(word(rng) for _ in range(rng.randint(2, 6))).title(),
+                cover="SOFT",
+                inventory=1,
+                daily_fee="1.00",
+            )
+            for _ in range(min(batch, rows - start))
+        )
+        through.objects.bulk_create(
+            through(book_id=book.id, author_id=rng.choice(authors).id) for book in books
+        )
+
+
+def icontains(query):
+    from django.db.models import Q
+
+    from books.models import Book
+
+    queryset = Book.objects.all()
+    for token in query.split():
+        queryset = queryset.filter(
+            Q(title__icontains=token)
+            | Q(authors__first_name__icontains=token)
+            | Q(authors__last_name__icontains=token)
+        )
+    return queryset.distinct()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from books.models import Book
+    from books.search import rebuild_index, search_books
+
+    rng = random.Random(42)
+    start = time.perf_counter()
+    populate(args.rows, rng)
+    print(f"Inserted {args.rows} books in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    rebuild_index()
+    print(f"Built search index in {time.perf_counter() - start:.1f}s")
+
+    sample = Book.objects.order_by("?").values_list("title", flat=True).first()
+    queries = [
+        sample.split()[0].lower(),
+        sample.lower(),
+        word(rng)[:4],
+        "zzzz",
+    ]
+
+    rows = []
+    for query in queries:
+        fts = search_books(Book.objects.all(), query).order_by("search_rank", "id")
+        scan = icontains(query).order_by("id")
+        fts_page = measure(lambda: list(fts[: args.page_size]), args.repeat)
+        scan_page = measure(lambda: list(scan[: args.page_size]), args.repeat)
+        fts_total = measure(lambda: len(fts.values_list("id")), args.repeat)
+        scan_total = measure(lambda: len(scan.values_list("id")), args.repeat)
+        rows.append(
+            (
+                repr(query),
+                len(fts.values_list("id")),
+                f"{fts_page * 1000:.1f}",
+                f"{scan_page * 1000:.1f}",
+                f"{fts_total * 1000:.1f}",
+                f"{scan_total * 1000:.1f}",
+            )
+        )
+
+    report(
+        f"Catalog search over {args.rows} books (median of {args.repeat}, ms)",
+        rows,
+        ["query", "matches", "fts page", "scan page", "fts all", "scan all"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+A local stand-in for the Stripe Checkout Sessions API.
+
+Answers ``POST /v1/checkout/sessions`` and ``GET /v1/checkout/sessions/<id>``
+like Stripe does, with configurable latency, error rate and rate limiting,
+so checkout, return and reconciliation load tests can reproduce a slow or
+failing gateway on one machine with no network access. A repeated
+idempotency key gets the first response back, as on Stripe, and a 400
+``idempotency_error`` if the params differ from the first request's.
+
+Run it and point the API at it::
+
+    python -m benchmarks.fake_stripe --port 12111 --latency 300 \\
+        --distribution lognormal --error-rate 0.05 --rate-limit 25
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_API_KEY=sk_test_fake \\
+        python manage.py runserver
+
+or start it in-process with ``start_server()``.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+class GatewayProfile:
+    """
+    How the fake gateway behaves.
+
+    ``latency`` is in milliseconds: the constant delay for ``fixed``, the
+    mean for ``uniform`` (spread over ±``jitter`` ms) and ``exponential``,
+    and the median for ``lognormal`` (with shape ``sigma``). A share
+    ``error_rate`` of requests fails with a 500 ``api_error``; above
+    ``rate_limit`` requests per second (0 for no limit) requests get a 429.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        distribution="fixed",
+        jitter=0.0,
+        sigma=0.5,
+        error_rate=0.0,
+        rate_limit=0.0,
+        seed=None,
+    ):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {DISTRIBUTIONS}")
+        self.latency = latency
+        self.distribution = distribution
+        self.jitter = jitter
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit
+        self._refilled_at = time.monotonic()
+
+    def delay(self):
+        """Seconds to wait before answering."""
+        with self._lock:
+            if self.distribution == "uniform":
+                ms = self._random.uniform(
+                    self.latency - self.jitter, self.latency + self.jitter
+                )
+            elif self.distribution == "exponential":
+                ms = self._random.expovariate(1 / self.latency) if self.latency else 0
+            elif self.distribution == "lognormal":
+                ms = (
+                    self._random.lognormvariate(0, self.sigma) * self.latency
+                    if self.latency
+                    else 0
+                )
+            else:
+                ms = self.latency
+        return max(ms, 0) / 1000
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def take_token(self):
+        """Token bucket of ``rate_limit`` per second; False means rate limited."""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate_limit,
+                self._tokens + (now - self._refilled_at) * self.rate_limit,
+            )
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profile):
+        super().__init__(address, FakeStripeHandler)
+        self.profile = profile
+        self.lock = threading.Lock()
+        self.idempotent_responses = {}
+        self.sessions = {}
+        self.counts = {"sessions": 0, "retrievals": 0, "errors": 0, "rate_limited": 0}
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def set_session(self, session_id, **fields):
+        """Add or change a session, e.g. ``status="complete", payment_status="paid"``."""
+        with self.lock:
+            session = self.sessions.setdefault(
+                session_id, new_session(self.api_base, session_id)
+            )
+            session.update(fields)
+            return dict(session)
+
+
+def new_session(api_base, session_id):
+    return {
+        "id": session_id,
+        "object": "checkout.session",
+        "mode": "payment",
+        "status": "open",
+        "payment_status": "unpaid",
+        "url": f"{api_base}/pay/{session_id}",
+    }
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params_hash = hashlib.sha256(self.rfile.read(length)).hexdigest()
+        if self.path.split("?")[0] != "/v1/checkout/sessions":
+            self.send_error_json(404, "invalid_request_error", "Unrecognized URL.")
+            return
+
+        server = self.server
+        key = self.headers.get("Idempotency-Key")
+        with server.lock:
+            replay = server.idempotent_responses.get(key)
+        if replay is not None:
+            first_hash, body = replay
+            if first_hash != params_hash:
+                self.send_error_json(
+                    400,
+                    "idempotency_error",
+                    "Keys for idempotent requests can only be used with the "
+                    "same parameters they were first used with.",
+                )
+                return
+            self.send_json(200, body)
+            return
+
+        if not self.simulate_gateway():
+            return
+
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        body = new_session(server.api_base, session_id)
+        if key:
+            with server.lock:
+                _, body = server.idempotent_responses.setdefault(
+                    key, (params_hash, body)
+                )
+        with server.lock:
+            server.sessions.setdefault(body["id"], dict(body))
+        server.count("sessions")
+        self.send_json(200, body)
+
+    def do_GET(self):
+        prefix = "/v1/checkout/sessions/"
+        path = self.path.split("?")[0]
+        if not path.startswith(prefix):
+            self.send_error_json(404, "invalid_request_error", "Unrecognized URL.")
+            return
+        if not self.simulate_gateway():
+            return
+
+        server = self.server
+        session_id = path[len(prefix) :]
+        with server.lock:
+            session = server.sessions.get(session_id)
+            session = dict(session) if session else None
+        if session is None:
+            self.send_error_json(
+                404,
+                "invalid_request_error",
+                f"No such checkout.session: '{session_id}'",
+                "resource_missing",
+            )
+            return
+        server.count("retrievals")
+        self.send_json(200, session)
+
+    def simulate_gateway(self):
+        """Apply the profile's rate limit, latency and errors; False if answered."""
+        server = self.server
+        profile = server.profile
+        if not profile.take_token():
+            server.count("rate_limited")
+            self.send_error_json(
+                429, "invalid_request_error", "Too many requests.", "rate_limit"
+            )
+            return False
+        time.sleep(profile.delay())
+        if profile.should_fail():
+            server.count("errors")
+            self.send_error_json(500, "api_error", "Something went wrong.")
+            return False
+        return True
+
+    def send_error_json(self, status, error_type, message, code=None):
+        error = {"type": error_type, "message": message}
+        if code:
+            error["code"] = code
+        self.send_json(status, {"error": error})
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Request-Id", f"req_{uuid.uuid4().hex[:14]}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(profile=None, host="127.0.0.1", port=0):
+    """Serve in a daemon thread; ``port=0`` picks a free port."""
+    server = FakeStripeServer((host, port), profile or GatewayProfile())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0, help="ms")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0, help="ms, for uniform")
+    parser.add_argument("--sigma", type=float, default=0.5, help="for lognormal")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    profile = GatewayProfile(
+        latency=args.latency,
+        distribution=args.distribution,
+        jitter=args.jitter,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+    server = FakeStripeServer((args.host, args.port), profile)
+    print(f"Fake Stripe listening on {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {server.counts}")
+
+
+if __name__ == "__main__":
+    main()
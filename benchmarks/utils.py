@@ -0,0 +1,62 @@
+"""
+Shared setup for the scripts in this package.
+
+Benchmarks run against a throwaway test database (never the configured
+one) and are started from the repository root, e.g.::
+
+    python -m benchmarks.bench_search --rows 1000000
+"""
+
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup_django(on_disk=False):
+    """Configure Django and create a migrated test database.
+
+    ``on_disk`` puts a SQLite test database in a temporary file instead of
+    memory, which multi-threaded benchmarks need.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_management.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import django
+    from django.conf import settings
+
+    database = settings.DATABASES["default"]
+    if on_disk and database["ENGINE"].endswith("sqlite3"):
+        path = os.path.join(tempfile.mkdtemp(prefix="library-bench-"), "bench.sqlite3")
+        database["TEST"] = {"NAME": path}
+        database.setdefault("OPTIONS", {})["timeout"] = 60
+
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def measure(func, repeat=5):
+    """Call ``func`` ``repeat`` times and return the median wall time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def report(title, rows, headers):
+    """Print ``rows`` as a plain-text table."""
+    widths = [
+        max(len(str(value)) for value in column) for column in zip(headers, *rows)
+    ]
+    print(f"\n{title}")
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(value).ljust(w) for value, w in zip(row, widths)))
@@ -0,0 +1,134 @@
+"""
+Versioned cache for catalog reads.
+
+Every cache key embeds the current catalog version, so bumping the version
+invalidates all cached pages at once without having to find and delete them.
+Serialized books are cached as per-book fragments whose keys also carry the
+book's own version, which lets inventory changes refresh a single book
+without dropping the rest of the catalog.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG = "catalog"
+# Bumped on every borrowing change; only views showing loan counts use it.
+LOANS = "loans"
+
+VERSION_KEY = "catalog:version:{namespace}"
+BOOK_VERSION_KEY = "catalog:book-version:{book_id}"
+STATS_KEY = "catalog:stats:{name}"
+STATS_KINDS = ("response", "fragment")
+
+
+def get_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+
+
+def get_availability_timeout():
+    return getattr(settings, "CATALOG_AVAILABILITY_TIMEOUT", 30)
+
+
+def _initial_version():
+    # Seeding from the clock instead of 1 means a version that was evicted
+    # from the cache never comes back with a number older entries still use.
+    return time.time_ns()
+
+
+def get_version(namespace=CATALOG):
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(namespaces):
+    return [get_version(namespace) for namespace in namespaces]
+
+
+def bump_version(namespace=CATALOG):
+    key = VERSION_KEY.format(namespace=namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def get_book_versions(book_ids):
+    keys = {BOOK_VERSION_KEY.format(book_id=book_id): book_id for book_id in book_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, book_id in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            versions[book_id] = cache.get(key)
+    return versions
+
+
+def touch_book(book_id):
+    """Invalidate the cached fragments of one book."""
+    key = BOOK_VERSION_KEY.format(book_id=book_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def make_key(prefix, *parts):
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f"catalog:{prefix}:{get_version()}:{digest}"
+
+
+def book_fragment_keys(book_ids, variant=""):
+    catalog_version = get_version()
+    versions = get_book_versions(book_ids)
+    return {
+        book_id: f"catalog:book:{catalog_version}:{book_id}:{versions[book_id]}:{variant}"
+        for book_id in book_ids
+    }
+
+
+def record(kind, hits=0, misses=0):
+    """Count cache lookups of one kind ("response" or "fragment")."""
+    for name, count in (("hits", hits), ("misses", misses)):
+        if not count:
+            continue
+        key = STATS_KEY.format(name=f"{kind}:{name}")
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+def get_stats():
+    keys = {
+        STATS_KEY.format(name=f"{kind}:{name}"): (kind, name)
+        for kind in STATS_KINDS
+        for name in ("hits", "misses")
+    }
+    found = cache.get_many(keys)
+    stats = {kind: {"hits": 0, "misses": 0} for kind in STATS_KINDS}
+    for key, (kind, name) in keys.items():
+        stats[kind][name] = found.get(key, 0)
+    for counters in stats.values():
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_ratio"] = (
+            round(counters["hits"] / lookups, 4) if lookups else None
+        )
+    stats["catalog_version"] = get_version()
+    return stats
+
+
+def reset_stats():
+    cache.delete_many(
+        [
+            STATS_KEY.format(name=f"{kind}:{name}")
+            for kind in STATS_KINDS
+            for name in ("hits", "misses")
+        ]
+    )
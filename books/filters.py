@@ -0,0 +1,41 @@
+import re
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class AuthorCountFilter(BaseFilterBackend):
+    """
+    ``?min_books=`` and ``?min_active_loans=`` on the counts annotated by
+    ``Author.objects.with_counts()``; the database applies them as HAVING.
+    """
+
+    params = {
+        "min_books": ("book_count", "Only authors with at least this many books"),
+        "min_active_loans": (
+            "active_loan_count",
+            "Only authors with at least this many books currently on loan",
+        ),
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        for param, (annotation, _) in self.params.items():
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            if not re.fullmatch(r"[0-9]+", value):
+                raise ValidationError({param: ["Expected a non-negative integer."]})
+            queryset = queryset.filter(**{f"{annotation}__gte": int(value)})
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": param,
+                "required": False,
+                "in": "query",
+                "description": description,
+                "schema": {"type": "integer", "minimum": 0},
+            }
+            for param, (_, description) in self.params.items()
+        ]
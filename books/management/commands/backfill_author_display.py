@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.cache import bump_version
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized Book.author_display column from the "
+        "authors relation, in primary key order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Books loaded and written per batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        start = time.perf_counter()
+        written = Book.objects.all().refresh_author_display(batch_size, touch=False)
+        bump_version()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {written} books in {elapsed:.1f}s.")
+        )
@@ -0,0 +1,192 @@
+import csv
+import gzip
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books.cache import bump_version
+from books.models import Author, Book, format_author_names
+from books.search import index_rows
+
+COVERS = {value for value, _ in Book.COVER_CHOICES}
+TITLE_MAX_LENGTH = Book._meta.get_field("title").max_length
+NAME_MAX_LENGTH = Author._meta.get_field("first_name").max_length
+
+
+def open_source(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_csv(stream):
+    """Rows with an ``authors`` column of ``First Last; First Last``."""
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    """One JSON object per line; ``authors`` is a list of names or of objects."""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def split_name(author):
+    if isinstance(author, dict):
+        return author.get("first_name", "").strip(), author.get("last_name", "").strip()
+    first_name, _, last_name = author.strip().partition(" ")
+    return first_name, last_name.strip()
+
+
+def parse_row(row):
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    title = (row.get("title") or "").strip()
+    if not title:
+        raise ValueError("missing title")
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError(f"title longer than {TITLE_MAX_LENGTH} characters")
+    cover = (row.get("cover") or "").strip().upper()
+    if cover not in COVERS:
+        raise ValueError(f"unknown cover {cover!r}")
+    try:
+        inventory = int(row.get("inventory"))
+        daily_fee = Decimal(str(row.get("daily_fee"))).quantize(Decimal("0.01"))
+        if not daily_fee.is_finite():
+            raise ValueError
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError("inventory and daily_fee must be numbers")
+    if inventory < 0 or daily_fee < 0 or daily_fee.adjusted() >= 3:
+        raise ValueError("inventory or daily_fee out of range")
+
+    authors = row.get("authors") or []
+    if isinstance(authors, str):
+        authors = authors.split(";")
+    authors = [split_name(author) for author in authors]
+    authors = [name for name in dict.fromkeys(authors) if name[0] or name[1]]
+    if any(len(part) > NAME_MAX_LENGTH for name in authors for part in name):
+        raise ValueError(f"author name longer than {NAME_MAX_LENGTH} characters")
+    return (
+        Book(title=title, cover=cover, inventory=inventory, daily_fee=daily_fee),
+        authors,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream books from a CSV or JSONL file into the catalog in batched, "
+        "chunk-committed inserts. Authors are matched on first and last name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format; guessed from the file extension when omitted",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Rows inserted and committed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"]
+        if input_format is None:
+            stem = path[:-3] if path.endswith(".gz") else path
+            input_format = "jsonl" if stem.endswith((".jsonl", ".json")) else "csv"
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        self.author_ids = {
+            (first_name, last_name): author_id
+            for author_id, first_name, last_name in Author.objects.values_list(
+                "id", "first_name", "last_name"
+            ).iterator()
+        }
+        self.imported = self.skipped = 0
+        start = time.perf_counter()
+
+        try:
+            stream = open_source(path)
+        except OSError as error:
+            raise CommandError(error)
+
+        with stream:
+            reader = read_jsonl(stream) if input_format == "jsonl" else read_csv(stream)
+            line = 0
+            while True:
+                chunk = list(islice(reader, batch_size))
+                if not chunk:
+                    break
+                parsed = []
+                for row in chunk:
+                    line += 1
+                    try:
+                        parsed.append(parse_row(row))
+                    except ValueError as error:
+                        self.skipped += 1
+                        self.stderr.write(f"Skipping record {line}: {error}")
+                self.import_chunk(parsed)
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{self.imported} books imported "
+                    f"({self.imported / elapsed:,.0f} rows/s)"
+                )
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.imported} books in {elapsed:.1f}s "
+                f"({self.imported / elapsed if elapsed else 0:,.0f} rows/s), "
+                f"skipped {self.skipped}, {len(self.author_ids)} authors known."
+            )
+        )
+
+    @transaction.atomic
+    def import_chunk(self, parsed):
+        if not parsed:
+            return
+
+        new_authors = {
+            name: Author(first_name=name[0], last_name=name[1])
+            for _, authors in parsed
+            for name in authors
+            if name not in self.author_ids
+        }
+        for name, author in zip(
+            new_authors, Author.objects.bulk_create(new_authors.values())
+        ):
+            self.author_ids[name] = author.id
+
+        for book, authors in parsed:
+            authors.sort(key=self.author_ids.__getitem__)
+            book.author_display = format_author_names(authors)
+        books = Book.objects.bulk_create([book for book, _ in parsed])
+        Through = Book.authors.through
+        Through.objects.bulk_create(
+            Through(book_id=book.id, author_id=self.author_ids[name])
+            for book, (_, authors) in zip(books, parsed)
+            for name in authors
+        )
+
+        # bulk_create skips the model signals, so do their work once per chunk.
+        index_rows([(book.id, book.title, book.author_display) for book in books])
+        transaction.on_commit(bump_version)
+        self.imported += len(books)
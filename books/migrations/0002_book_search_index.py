@@ -0,0 +1,103 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The search DDL as books.search had it when this migration was written,
+# copied so that later changes to that module leave the migration alone.
+SEARCH_TABLE = "books_book_search"
+CREATE_SQL = {
+    "sqlite": [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "title, authors, tokenize = 'unicode61 remove_diacritics 2')",
+        f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) "
+        "VALUES ('rank', 'bm25(10.0, 5.0)')",
+    ],
+    "postgresql": [
+        f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+        "rowid bigint PRIMARY KEY REFERENCES books_book (id) "
+        "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL)",
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+        f"ON {SEARCH_TABLE} USING GIN (document)",
+    ],
+}
+INSERT_SQL = {
+    "sqlite": f"INSERT INTO {SEARCH_TABLE} (rowid, title, authors) VALUES (%s, %s, %s)",
+    "postgresql": f"INSERT INTO {SEARCH_TABLE} (rowid, document) VALUES (%s, "
+    "setweight(to_tsvector('simple', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'B'))",
+}
+BATCH_SIZE = 2000
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases search with an unindexed scan and get no table.
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_SQL:
+        return
+    with connection.cursor() as cursor:
+        for statement in CREATE_SQL[connection.vendor]:
+            cursor.execute(statement)
+
+    Book = apps.get_model("books", "Book")
+    last_id = 0
+    while True:
+        books = list(
+            Book.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .prefetch_related("authors")[:BATCH_SIZE]
+        )
+        if not books:
+            return
+        rows = [
+            (
+                book.id,
+                book.title,
+                " ".join(
+                    f"{author.first_name} {author.last_name}"
+                    for author in book.authors.all()
+                ),
+            )
+            for book in books
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(INSERT_SQL[connection.vendor], rows)
+        last_id = books[-1].id
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor in CREATE_SQL:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookSearchEntry",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="books.book",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "books_book_search",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
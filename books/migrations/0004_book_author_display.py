@@ -0,0 +1,62 @@
+# Generated by Django 5.0.6 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+AUTHOR_DISPLAY_MAX_LENGTH = 512
+
+
+def backfill_author_display(apps, schema_editor):
+    """
+    Fill ``author_display`` as ``"First Last, First Last"`` in author id
+    order, leaving ``updated_at`` alone. Kept inline, not calling
+    ``books.models``, so the migration does not change with the app code.
+
+    The search index built in 0002 already holds the same names, read from
+    the authors relation, so it needs no rebuild here.
+    """
+    Book = apps.get_model("books", "Book")
+    Author = apps.get_model("books", "Author")
+    books = (
+        Book.objects.order_by("id")
+        .only("id", "author_display")
+        .prefetch_related(
+            models.Prefetch(
+                "authors",
+                queryset=Author.objects.only("id", "first_name", "last_name").order_by(
+                    "id"
+                ),
+            )
+        )
+    )
+    last_id = 0
+    while True:
+        batch = list(books.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return
+        for book in batch:
+            display = ", ".join(
+                f"{author.first_name} {author.last_name}"
+                for author in book.authors.all()
+            )
+            book.author_display = display[:AUTHOR_DISPLAY_MAX_LENGTH]
+        Book.objects.bulk_update(batch, ["author_display"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0003_author_updated_at_book_updated_at_alter_book_authors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="author_display",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=512
+            ),
+        ),
+        migrations.RunPython(backfill_author_display, migrations.RunPython.noop),
+    ]
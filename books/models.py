@@ -1,14 +1,125 @@
-from django.db import models
+from functools import partial
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from books.cache import touch_book
+
+AUTHOR_DISPLAY_MAX_LENGTH = 512
+
+
+def format_author_names(names):
+    """Join ``(first_name, last_name)`` pairs as ``"First Last, First Last"``."""
+    display = ", ".join(f"{first_name} {last_name}" for first_name, last_name in names)
+    return display[:AUTHOR_DISPLAY_MAX_LENGTH]
+
+
+def refresh_author_display(books, batch_size=2000, touch=True):
+    """
+    Recompute ``author_display`` for the ``books`` queryset, walking it in
+    primary key order ``batch_size`` books at a time.
+
+    ``touch`` also bumps ``updated_at``, which callers reacting to an author
+    change want; a backfill leaves it alone. Works on the historical models
+    migrations pass in as well.
+    """
+    author_model = books.model._meta.get_field("authors").related_model
+    fields = ["author_display", "updated_at"] if touch else ["author_display"]
+    now = timezone.now()
+    queryset = (
+        books.order_by("id")
+        .only("id", "author_display")
+        .prefetch_related(
+            models.Prefetch(
+                "authors",
+                queryset=author_model.objects.only(
+                    "id", "first_name", "last_name"
+                ).order_by("id"),
+            )
+        )
+    )
+    last_id = written = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return written
+        for book in batch:
+            book.author_display = format_author_names(
+                (author.first_name, author.last_name) for author in book.authors.all()
+            )
+            book.updated_at = now
+        books.model.objects.bulk_update(batch, fields)
+        written += len(batch)
+        last_id = batch[-1].id
+
+
+class AuthorQuerySet(models.QuerySet):
+    def with_counts(self):
+        """
+        Annotate ``book_count`` and ``active_loan_count`` (borrowings of the
+        author's books not returned yet) in the same query.
+
+        Both counts go through the same joins, so they count distinct rows.
+        """
+        active = models.Q(authors__borrowing__actual_return_date__isnull=True)
+        return self.annotate(
+            book_count=models.Count("authors", distinct=True),
+            active_loan_count=models.Count(
+                "authors__borrowing", filter=active, distinct=True
+            ),
+        )
 
 
 class Author(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = AuthorQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 
+class BookQuerySet(models.QuerySet):
+    def with_authors(self):
+        """Load every book's authors in one extra query instead of one per row."""
+        return self.prefetch_related(
+            models.Prefetch(
+                "authors",
+                queryset=Author.objects.only("id", "first_name", "last_name"),
+            )
+        )
+
+    def refresh_author_display(self, batch_size=2000, touch=True):
+        """See ``refresh_author_display``; returns the number of books written."""
+        return refresh_author_display(self, batch_size, touch)
+
+    def check_out(self, book_id):
+        """
+        Take one copy of a book in a single conditional ``UPDATE``.
+
+        Returns ``False`` when no copy is left. The database applies
+        concurrent check-outs one after another, so none is lost and the
+        inventory never goes below zero.
+        """
+        updated = self.filter(pk=book_id, inventory__gt=0).update(
+            inventory=models.F("inventory") - 1, updated_at=timezone.now()
+        )
+        if updated:
+            transaction.on_commit(partial(touch_book, book_id))
+        return bool(updated)
+
+    def check_in(self, book_id):
+        """Put one copy of a book back."""
+        updated = self.filter(pk=book_id).update(
+            inventory=models.F("inventory") + 1, updated_at=timezone.now()
+        )
+        if updated:
+            transaction.on_commit(partial(touch_book, book_id))
+        return bool(updated)
+
+
 class Book(models.Model):
     COVER_CHOICES = [
         ("HARD", "Hardcover"),
@@ -17,15 +128,43 @@ class Book(models.Model):
 
     title = models.CharField(max_length=255)
     authors = models.ManyToManyField(Author, related_name="authors")
+    author_display = models.CharField(
+        max_length=AUTHOR_DISPLAY_MAX_LENGTH,
+        blank=True,
+        default="",
+        editable=False,
+        db_index=True,
+    )
     cover = models.CharField(max_length=4, choices=COVER_CHOICES)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = BookQuerySet.as_manager()
 
     def __str__(self):
-        authors = ", ".join([str(author) for author in self.authors.all()])
-        author_label = "Author" if self.authors.count() == 1 else "Authors"
+        authors = list(self.authors.all())
+        author_names = ", ".join([str(author) for author in authors])
+        author_label = "Author" if len(authors) == 1 else "Authors"
         return (
-            f"Title: {self.title} | {author_label}: {authors} | "
+            f"Title: {self.title} | {author_label}: {author_names} | "
             f"Cover: {self.get_cover_display()} | Inventory: {self.inventory} | "
             f"Daily Fee: ${self.daily_fee}"
         )
+
+
+class BookSearchEntry(models.Model):
+    """Row of the full-text index maintained by ``books.search``."""
+
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_entry",
+    )
+
+    class Meta:
+        managed = False
+        db_table = "books_book_search"
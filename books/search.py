@@ -0,0 +1,265 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+SEARCH_TABLE = "books_book_search"
+SEARCH_PARAM = "q"
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table keyed by ``rowid = books_book.id``, ranked by bm25."""
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "title, authors, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) "
+            "VALUES ('rank', 'bm25(10.0, 5.0)')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def delete(self, cursor, book_ids):
+        placeholders = ", ".join(["%s"] * len(book_ids))
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", book_ids
+        )
+
+    def insert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, authors) VALUES (%s, %s, %s)",
+            rows,
+        )
+
+    def search(self, queryset, tokens):
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return (
+            queryset.filter(search_entry__isnull=False)
+            .filter(
+                RawSQL(
+                    f"{SEARCH_TABLE} MATCH %s", (match,), output_field=BooleanField()
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"{SEARCH_TABLE}.rank", (), output_field=FloatField()
+                )
+            )
+        )
+
+
+class PostgresSearchBackend:
+    """
+    ``tsvector`` column with a GIN index, title weighted above authors.
+
+    The key column is called ``rowid`` as well, so ``BookSearchEntry`` maps
+    both tables.
+    """
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "rowid bigint PRIMARY KEY REFERENCES books_book (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+            f"ON {SEARCH_TABLE} USING GIN (document)"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def delete(self, cursor, book_ids):
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = ANY(%s)", (list(book_ids),)
+        )
+
+    def insert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'B'))",
+            rows,
+        )
+
+    def search(self, queryset, tokens):
+        match = " & ".join(f"{token}:*" for token in tokens)
+        return (
+            queryset.filter(search_entry__isnull=False)
+            .filter(
+                RawSQL(
+                    f"{SEARCH_TABLE}.document @@ to_tsquery('simple', %s)",
+                    (match,),
+                    output_field=BooleanField(),
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"-ts_rank({SEARCH_TABLE}.document, to_tsquery('simple', %s))",
+                    (match,),
+                    output_field=FloatField(),
+                )
+            )
+        )
+
+
+class ScanSearchBackend:
+    """Unindexed ``icontains`` fallback for databases without full-text search."""
+
+    def create(self, cursor):
+        pass
+
+    def drop(self, cursor):
+        pass
+
+    def delete(self, cursor, book_ids):
+        pass
+
+    def insert(self, cursor, rows):
+        pass
+
+    def search(self, queryset, tokens):
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(title__icontains=token)
+                | Q(authors__first_name__icontains=token)
+                | Q(authors__last_name__icontains=token)
+            )
+        return queryset.distinct().annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+SEARCH_BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend(db_connection=connection):
+    return SEARCH_BACKENDS.get(db_connection.vendor, ScanSearchBackend)()
+
+
+def document_rows(books):
+    """Return ``(id, title, author names)`` rows for books with their authors loaded."""
+    return [
+        (
+            book.id,
+            book.title,
+            " ".join(
+                f"{author.first_name} {author.last_name}"
+                for author in book.authors.all()
+            ),
+        )
+        for book in books
+    ]
+
+
+def index_books(book_ids):
+    """Rewrite the search entries of the given books from the database."""
+    from books.models import Book
+
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    rows = list(
+        Book.objects.filter(id__in=book_ids).values_list(
+            "id", "title", "author_display"
+        )
+    )
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        backend.delete(cursor, book_ids)
+        backend.insert(cursor, rows)
+
+
+def index_rows(rows):
+    """Add search entries for new books from ``(id, title, author names)`` rows."""
+    if rows:
+        with connection.cursor() as cursor:
+            get_backend().insert(cursor, rows)
+
+
+def unindex_books(book_ids):
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, book_ids)
+
+
+def rebuild_index(book_model=None, db_connection=connection, batch_size=2000):
+    """Index every book, walking the table in primary key order."""
+    if book_model is None:
+        from books.models import Book as book_model
+
+    backend = get_backend(db_connection)
+    last_id = 0
+    while True:
+        books = list(
+            book_model.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .prefetch_related("authors")[:batch_size]
+        )
+        if not books:
+            break
+        with db_connection.cursor() as cursor:
+            backend.delete(cursor, [book.id for book in books])
+            backend.insert(cursor, document_rows(books))
+        last_id = books[-1].id
+
+
+def search_books(queryset, query):
+    """Filter ``queryset`` to books matching ``query``, annotated with ``search_rank``.
+
+    Lower ranks are better matches.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        ).none()
+    return get_backend().search(queryset, tokens)
+
+
+class BookSearchFilter(BaseFilterBackend):
+    """``?q=`` full-text search over book titles and author names, best match first."""
+
+    def get_query(self, request):
+        return request.query_params.get(SEARCH_PARAM, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_query(request)
+        if not query:
+            return queryset
+        return search_books(queryset, query)
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_query(request):
+            return ("search_rank",)
+        return None
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": SEARCH_PARAM,
+                "required": False,
+                "in": "query",
+                "description": "Full-text search on title and author names",
+                "schema": {"type": "string"},
+            }
+        ]
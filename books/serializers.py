@@ -1,18 +1,22 @@
 from rest_framework import serializers
 from books.models import Author, Book
+from library_management.sparse_fields import SparseFieldsetSerializerMixin
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    book_count = serializers.IntegerField(read_only=True)
+    active_loan_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Author
-        fields = ("id", "first_name", "last_name")
+        fields = ("id", "first_name", "last_name", "book_count", "active_loan_count")
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     authors = serializers.PrimaryKeyRelatedField(
         queryset=Author.objects.all(), many=True
     )
-    author_names = serializers.SerializerMethodField()
+    author_names = serializers.CharField(source="author_display", read_only=True)
 
     class Meta:
         model = Book
@@ -26,7 +30,29 @@ class BookSerializer(serializers.ModelSerializer):
             "daily_fee",
         )
 
-    def get_author_names(self, obj):
-        return ", ".join(
-            [f"{author.first_name} {author.last_name}" for author in obj.authors.all()]
-        )
+
+class BookAvailabilitySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    inventory = serializers.IntegerField()
+    active_borrowings = serializers.IntegerField()
+    next_return_date = serializers.DateField(allow_null=True)
+
+
+class BookBulkItemSerializer(serializers.ModelSerializer):
+    """
+    One item of a bulk write. Items with an ``id`` update that book and may
+    leave fields out; the rest create a book. Author ids are only checked for
+    shape here, the view resolves them for the whole payload in one query.
+    """
+
+    id = serializers.IntegerField(min_value=1, required=False)
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+
+    class Meta:
+        model = Book
+        fields = ("id", "title", "authors", "cover", "inventory", "daily_fee")
+
+    def validate_authors(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,92 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from books.cache import bump_version, touch_book
+from books.models import Author, Book
+from books.search import index_books, unindex_books
+
+INVENTORY_FIELDS = {"inventory", "updated_at"}
+
+
+def is_inventory_update(update_fields):
+    return update_fields is not None and set(update_fields) <= INVENTORY_FIELDS
+
+
+def refresh_books(book_ids):
+    """Rewrite ``author_display`` and the search entries of books whose authors changed."""
+    book_ids = list(book_ids)
+    if book_ids:
+        Book.objects.filter(id__in=book_ids).refresh_author_display()
+        index_books(book_ids)
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, update_fields, **kwargs):
+    if update_fields is None or "title" in update_fields:
+        index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    unindex_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def refresh_books_of_saved_author(sender, instance, created, **kwargs):
+    if not created:
+        refresh_books(instance.authors.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+def remember_books_of_deleted_author(sender, instance, **kwargs):
+    instance._book_ids = list(instance.authors.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def refresh_books_of_deleted_author(sender, instance, **kwargs):
+    refresh_books(getattr(instance, "_book_ids", []))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def refresh_books_with_changed_authors(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action == "pre_clear" and reverse:
+        instance._book_ids = list(instance.authors.values_list("id", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        refresh_books([instance.pk])
+        # Keep the instance in step so a later save() does not write back
+        # the names it was loaded with.
+        instance.refresh_from_db(fields=["author_display", "updated_at"])
+    elif action == "post_clear":
+        refresh_books(getattr(instance, "_book_ids", []))
+    else:
+        refresh_books(pk_set)
+
+
+# Invalidation waits for the commit: bumped earlier, a concurrent reader
+# could cache the old row under the new version for the whole timeout.
+@receiver(post_save, sender=Book)
+def invalidate_cached_book(sender, instance, update_fields, **kwargs):
+    if is_inventory_update(update_fields):
+        transaction.on_commit(partial(touch_book, instance.pk))
+    else:
+        transaction.on_commit(bump_version)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_version)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def invalidate_catalog_on_authors_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(bump_version)
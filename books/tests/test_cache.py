@@ -0,0 +1,129 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books import cache as catalog_cache
+from books.models import Author, Book
+from users.models import User
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.author = Author.objects.create(first_name="John", last_name="Doe")
+        self.books = []
+        for i in range(3):
+            book = Book.objects.create(
+                title=f"Book {i}", cover="HARD", inventory=5, daily_fee="1.00"
+            )
+            book.authors.add(self.author)
+            self.books.append(book)
+
+    def get_books(self):
+        response = self.client.get(reverse("book-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_repeated_book_list_only_checks_freshness(self):
+        first = self.get_books()
+        with self.assertNumQueries(1):
+            second = self.get_books()
+        self.assertEqual(first, second)
+
+    def test_repeated_book_detail_only_checks_freshness(self):
+        url = reverse("book-detail", args=[self.books[0].id])
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+
+    def test_repeated_author_list_only_checks_freshness(self):
+        self.client.get(reverse("author-list"))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("author-list"))
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_book_changes_bump_catalog_version(self):
+        version = catalog_cache.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(
+                title="New", cover="SOFT", inventory=1, daily_fee="1.00"
+            )
+            # Not before the commit, or a reader could cache the old rows
+            # under the new version.
+            self.assertEqual(catalog_cache.get_version(), version)
+        self.assertNotEqual(catalog_cache.get_version(), version)
+        self.assertEqual(len(self.get_books()), 4)
+
+    def test_author_changes_bump_catalog_version(self):
+        self.get_books()
+        self.author.last_name = "Roe"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        self.assertTrue(
+            all(book["author_names"] == "John Roe" for book in self.get_books())
+        )
+
+    def test_m2m_changes_bump_catalog_version(self):
+        self.get_books()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].authors.clear()
+        self.assertEqual(self.get_books()[0]["authors"], [])
+
+    def test_inventory_change_only_invalidates_that_book(self):
+        self.get_books()
+        version = catalog_cache.get_version()
+        catalog_cache.reset_stats()
+
+        book = self.books[1]
+        book.inventory = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            book.save(update_fields=["inventory", "updated_at"])
+        books = self.get_books()
+
+        self.assertEqual(catalog_cache.get_version(), version)
+        self.assertEqual(books[1]["inventory"], 4)
+        stats = catalog_cache.get_stats()
+        self.assertEqual(stats["response"]["hits"], 1)
+        self.assertEqual(stats["fragment"]["hits"], 2)
+        self.assertEqual(stats["fragment"]["misses"], 1)
+
+    def test_evicted_version_does_not_reuse_old_keys(self):
+        version = catalog_cache.get_version()
+        cache.delete(catalog_cache.VERSION_KEY.format(namespace="catalog"))
+        self.assertNotEqual(catalog_cache.get_version(), version)
+
+
+class CatalogCacheStatsViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("catalog-cache-stats")
+
+    def test_stats_require_admin(self):
+        user = User.objects.create_user(email="user@gmail.com", password="password")
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stats_report_hits_and_misses(self):
+        admin = User.objects.create_superuser(
+            email="admin@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=admin)
+        self.client.get(reverse("author-list"))
+        self.client.get(reverse("author-list"))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["response"]["hits"], 1)
+        self.assertEqual(response.data["response"]["misses"], 1)
+        self.assertEqual(response.data["response"]["hit_ratio"], 0.5)
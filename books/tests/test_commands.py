@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from books.models import Author, Book
+from books.search import search_books
+
+
+class ImportCatalogCommandTest(TestCase):
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w", encoding="utf-8") as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_catalog", path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_csv(self):
+        existing = Author.objects.create(first_name="John", last_name="Tolkien")
+        path = self.write_file(
+            ".csv",
+            "title,authors,cover,inventory,daily_fee\n"
+            "The Hobbit,John Tolkien,HARD,3,1.50\n"
+            "Silmarillion,John Tolkien; Christopher Tolkien,soft,2,2\n"
+            "Unfinished Tales,Christopher Tolkien,SOFT,1,0.75\n",
+        )
+
+        stdout, _ = self.run_import(path, "--batch-size", "2")
+
+        self.assertIn("Imported 3 books", stdout)
+        self.assertIn("rows/s", stdout)
+        self.assertEqual(Author.objects.count(), 2)
+        silmarillion = Book.objects.get(title="Silmarillion")
+        self.assertEqual(silmarillion.cover, "SOFT")
+        self.assertEqual(
+            {str(author) for author in silmarillion.authors.all()},
+            {"John Tolkien", "Christopher Tolkien"},
+        )
+        self.assertIn(existing, silmarillion.authors.all())
+        self.assertEqual(
+            silmarillion.author_display, "John Tolkien, Christopher Tolkien"
+        )
+        self.assertEqual(
+            Book.objects.get(title="Unfinished Tales").authors.get().last_name,
+            "Tolkien",
+        )
+
+    def test_import_jsonl(self):
+        records = [
+            {
+                "title": "Earthsea",
+                "authors": [{"first_name": "Ursula", "last_name": "Le Guin"}],
+                "cover": "SOFT",
+                "inventory": 4,
+                "daily_fee": "1.25",
+            },
+            {
+                "title": "The Dispossessed",
+                "authors": ["Ursula Le Guin"],
+                "cover": "HARD",
+                "inventory": 1,
+                "daily_fee": 2,
+            },
+        ]
+        path = self.write_file(
+            ".jsonl", "\n".join(json.dumps(record) for record in records)
+        )
+
+        self.run_import(path)
+
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Author.objects.get().last_name, "Le Guin")
+        self.assertEqual(Book.authors.through.objects.count(), 2)
+
+    def test_imported_books_are_searchable(self):
+        path = self.write_file(
+            ".csv",
+            "title,authors,cover,inventory,daily_fee\n" "Dune,Frank Herbert,HARD,1,1\n",
+        )
+        self.run_import(path)
+        self.assertEqual(
+            [book.title for book in search_books(Book.objects.all(), "herbert")],
+            ["Dune"],
+        )
+
+    def test_invalid_records_are_skipped(self):
+        path = self.write_file(
+            ".jsonl",
+            '{"title": "Good", "cover": "HARD", "inventory": 1, "daily_fee": 1}\n'
+            "not json\n"
+            '{"title": "", "cover": "HARD", "inventory": 1, "daily_fee": 1}\n'
+            '{"title": "Bad cover", "cover": "PAPER", "inventory": 1, "daily_fee": 1}\n'
+            '{"title": "Bad fee", "cover": "HARD", "inventory": 1, "daily_fee": 5000}\n',
+        )
+
+        stdout, stderr = self.run_import(path)
+
+        self.assertEqual(list(Book.objects.values_list("title", flat=True)), ["Good"])
+        self.assertIn("skipped 4", stdout)
+        self.assertIn("Skipping record 2", stderr)
+
+    def test_values_the_columns_cannot_hold_are_skipped(self):
+        long_name = "N" * 51
+        path = self.write_file(
+            ".csv",
+            "title,authors,cover,inventory,daily_fee\n"
+            "Good,Jane Doe,HARD,1,1\n"
+            "NaN fee,,HARD,1,NaN\n"
+            "Infinite fee,,HARD,1,Infinity\n"
+            f"{'T' * 256},,HARD,1,1\n"
+            f"Long author,{long_name} Doe,HARD,1,1\n"
+            f"Long surname,Jane {long_name},HARD,1,1\n",
+        )
+
+        stdout, stderr = self.run_import(path)
+
+        self.assertEqual(list(Book.objects.values_list("title", flat=True)), ["Good"])
+        self.assertIn("skipped 5", stdout)
+        self.assertIn("Skipping record 2: inventory and daily_fee", stderr)
+        self.assertIn("Skipping record 4: title longer", stderr)
+        self.assertIn("Skipping record 5: author name longer", stderr)
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        rows = "".join(f"Book {i},Author {i % 3},HARD,1,1\n" for i in range(50))
+        path = self.write_file(
+            ".csv", "title,authors,cover,inventory,daily_fee\n" + rows
+        )
+        with self.assertNumQueries(7):
+            self.run_import(path, "--batch-size", "50")
+
+
+class BackfillAuthorDisplayCommandTest(TestCase):
+    def test_backfill(self):
+        author = Author.objects.create(first_name="Frank", last_name="Herbert")
+        books = [
+            Book.objects.create(title=title, cover="HARD", inventory=1, daily_fee=1)
+            for title in ("Dune", "Dune Messiah", "Whipping Star")
+        ]
+        for book in books[:2]:
+            book.authors.add(author)
+        Book.objects.update(author_display="")
+
+        stdout = StringIO()
+        call_command("backfill_author_display", "--batch-size", "2", stdout=stdout)
+
+        self.assertIn("Updated 3 books", stdout.getvalue())
+        self.assertEqual(
+            dict(Book.objects.values_list("title", "author_display")),
+            {
+                "Dune": "Frank Herbert",
+                "Dune Messiah": "Frank Herbert",
+                "Whipping Star": "",
+            },
+        )
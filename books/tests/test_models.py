@@ -1,5 +1,6 @@
 from django.test import TestCase
 from books.models import Author, Book
+from books.cache import get_book_versions
 
 
 class AuthorModelTest(TestCase):
@@ -51,3 +52,72 @@ class BookModelTest(TestCase):
     def test_book_daily_fee_max_digits(self):
         book = Book.objects.get(id=1)
         self.assertLessEqual(len(str(book.daily_fee).split(".")[0]), 5)
+
+    def test_book_str_uses_prefetched_authors(self):
+        book = Book.objects.with_authors().get(id=1)
+        with self.assertNumQueries(0):
+            str(book)
+
+    def test_check_out_takes_one_copy(self):
+        book = Book.objects.get(id=1)
+        versions = get_book_versions([book.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                self.assertTrue(Book.objects.check_out(book.id))
+            self.assertEqual(get_book_versions([book.id]), versions)
+        self.assertEqual(Book.objects.get(id=1).inventory, book.inventory - 1)
+        self.assertNotEqual(get_book_versions([book.id]), versions)
+
+    def test_check_out_stops_at_zero(self):
+        Book.objects.filter(id=1).update(inventory=1)
+        self.assertTrue(Book.objects.check_out(1))
+        self.assertFalse(Book.objects.check_out(1))
+        self.assertEqual(Book.objects.get(id=1).inventory, 0)
+
+    def test_check_in_returns_one_copy(self):
+        book = Book.objects.get(id=1)
+        self.assertTrue(Book.objects.check_in(book.id))
+        self.assertEqual(Book.objects.get(id=1).inventory, book.inventory + 1)
+
+
+class BookAuthorDisplayTest(TestCase):
+    def setUp(self):
+        self.john = Author.objects.create(first_name="John", last_name="Doe")
+        self.jane = Author.objects.create(first_name="Jane", last_name="Smith")
+        self.book = Book.objects.create(
+            title="Test Book", cover="HARD", inventory=1, daily_fee=1
+        )
+
+    def display(self):
+        return Book.objects.values_list("author_display", flat=True).get(
+            id=self.book.id
+        )
+
+    def test_follows_added_and_removed_authors(self):
+        self.book.authors.add(self.jane, self.john)
+        self.assertEqual(self.display(), "John Doe, Jane Smith")
+        self.assertEqual(self.book.author_display, "John Doe, Jane Smith")
+        self.book.authors.remove(self.john)
+        self.assertEqual(self.display(), "Jane Smith")
+        self.book.authors.clear()
+        self.assertEqual(self.display(), "")
+
+    def test_follows_reverse_changes(self):
+        self.jane.authors.add(self.book)
+        self.assertEqual(self.display(), "Jane Smith")
+        self.jane.authors.clear()
+        self.assertEqual(self.display(), "")
+
+    def test_follows_author_rename_and_delete(self):
+        self.book.authors.add(self.john, self.jane)
+        self.john.last_name = "Roe"
+        self.john.save()
+        self.assertEqual(self.display(), "John Roe, Jane Smith")
+        self.jane.delete()
+        self.assertEqual(self.display(), "John Roe")
+
+    def test_save_after_author_change_keeps_names(self):
+        self.book.authors.add(self.john)
+        self.book.inventory = 2
+        self.book.save()
+        self.assertEqual(self.display(), "John Doe")
@@ -0,0 +1,119 @@
+import datetime
+import unittest
+from decimal import Decimal
+from importlib.util import find_spec
+from io import BytesIO
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from books.models import Author, Book
+from books.serializers import BookSerializer
+from library_management.renderers import (
+    MessagePackRenderer,
+    ORJSONParser,
+    ORJSONRenderer,
+)
+from users.models import User
+
+
+class ORJSONRendererTest(TestCase):
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_drf_for_serialized_books(self):
+        author = Author.objects.create(first_name="Jöhn", last_name="Doe")
+        book = Book.objects.create(
+            title="Test „Book”", cover="HARD", inventory=3, daily_fee="10.50"
+        )
+        book.authors.add(author)
+        self.assertRendersLikeDRF(BookSerializer(Book.objects.all(), many=True).data)
+
+    def test_matches_drf_for_raw_values(self):
+        self.assertRendersLikeDRF(
+            {
+                "amount_paid": Decimal("12.30"),
+                "borrow_date": datetime.date(2024, 6, 1),
+                "created": datetime.datetime(
+                    2024, 6, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc
+                ),
+                "naive": datetime.datetime(2024, 6, 1, 12, 30),
+                "now": timezone.now(),
+                "time": datetime.time(9, 15, 0, 500000),
+                "label": gettext_lazy("Hardcover"),
+                1: None,
+            }
+        )
+
+    def test_escapes_line_separators_like_drf(self):
+        data = {"title": "Line\u2028and paragraph\u2029separators"}
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(rendered, JSONRenderer().render(data))
+        self.assertIn(b"\\u2028", rendered)
+
+    def test_non_finite_floats_render_as_null(self):
+        # JSONRenderer raises instead; see the module docstring.
+        self.assertEqual(
+            ORJSONRenderer().render({"nan": float("nan")}), b'{"nan":null}'
+        )
+
+    def test_indent(self):
+        rendered = ORJSONRenderer().render({"id": 1}, "application/json; indent=4", {})
+        self.assertIn(b"\n", rendered)
+
+    def test_none(self):
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+
+class ORJSONParserTest(TestCase):
+    def test_parses_json(self):
+        parsed = ORJSONParser().parse(BytesIO(b'{"title": "B\xc3\xb6ok", "id": 1}'))
+        self.assertEqual(parsed, {"title": "Böok", "id": 1})
+
+    def test_invalid_json(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"title": '))
+
+    def test_api_accepts_json(self):
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_user(email="testuser@gmail.com", password="password")
+        )
+        response = client.post(
+            reverse("author-list"),
+            b'{"first_name": "Jane", "last_name": "Smith"}',
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["last_name"], "Smith")
+
+
+@unittest.skipUnless(find_spec("msgpack"), "msgpack is not installed")
+class MessagePackRendererTest(TestCase):
+    def test_renders_decimals_and_dates_like_json(self):
+        import msgpack
+
+        data = {"daily_fee": Decimal("1.50"), "due": datetime.date(2024, 6, 1)}
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            {"daily_fee": 1.5, "due": "2024-06-01"},
+        )
+
+    def test_accept_header_selects_msgpack(self):
+        import msgpack
+
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_user(email="testuser@gmail.com", password="password")
+        )
+        Author.objects.create(first_name="Jane", last_name="Smith")
+        response = client.get(reverse("author-list"), HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        results = msgpack.unpackb(response.content)["results"]
+        self.assertEqual(results[0]["last_name"], "Smith")
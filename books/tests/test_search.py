@@ -0,0 +1,117 @@
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books.models import Author, Book
+from books.search import search_books
+from users.models import User
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        self.tolkien = Author.objects.create(first_name="John", last_name="Tolkien")
+        self.lewis = Author.objects.create(first_name="Clive", last_name="Lewis")
+        self.hobbit = Book.objects.create(
+            title="The Hobbit", cover="HARD", inventory=1, daily_fee="1.00"
+        )
+        self.hobbit.authors.add(self.tolkien)
+        self.narnia = Book.objects.create(
+            title="The Lion, the Witch and the Wardrobe",
+            cover="SOFT",
+            inventory=1,
+            daily_fee="1.00",
+        )
+        self.narnia.authors.add(self.lewis)
+
+    def search(self, query):
+        return list(search_books(Book.objects.all(), query).order_by("search_rank"))
+
+    def test_search_by_title_prefix(self):
+        self.assertEqual(self.search("hob"), [self.hobbit])
+
+    def test_search_by_author_name(self):
+        self.assertEqual(self.search("lewis"), [self.narnia])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search("the tolkien"), [self.hobbit])
+
+    def test_title_matches_rank_above_author_matches(self):
+        lewis_book = Book.objects.create(
+            title="Clive Lewis: A Biography",
+            cover="SOFT",
+            inventory=1,
+            daily_fee="1.00",
+        )
+        self.assertEqual(self.search("lewis"), [lewis_book, self.narnia])
+
+    def test_query_without_words_matches_nothing(self):
+        self.assertEqual(self.search('"*)('), [])
+
+    def test_index_follows_title_change(self):
+        self.hobbit.title = "There and Back Again"
+        self.hobbit.save()
+        self.assertEqual(self.search("hobbit"), [])
+        self.assertEqual(self.search("again"), [self.hobbit])
+
+    def test_index_follows_author_rename(self):
+        self.tolkien.last_name = "Tolkin"
+        self.tolkien.save()
+        self.assertEqual(self.search("tolkien"), [])
+        self.assertEqual(self.search("tolkin"), [self.hobbit])
+
+    def test_index_follows_author_changes(self):
+        self.hobbit.authors.remove(self.tolkien)
+        self.assertEqual(self.search("tolkien"), [])
+        self.lewis.authors.add(self.hobbit)
+        self.assertEqual(self.search("lewis"), [self.hobbit, self.narnia])
+        self.lewis.authors.clear()
+        self.assertEqual(self.search("lewis"), [])
+
+    def test_index_follows_author_delete(self):
+        self.tolkien.delete()
+        self.assertEqual(self.search("tolkien"), [])
+
+    def test_index_follows_book_delete(self):
+        self.hobbit.delete()
+        self.assertEqual(self.search("hobbit"), [])
+
+
+class BookSearchViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        author = Author.objects.create(first_name="Ursula", last_name="Le Guin")
+        self.books = []
+        for title in ["Earthsea", "Tombs of Earthsea", "The Dispossessed"]:
+            book = Book.objects.create(
+                title=title, cover="SOFT", inventory=1, daily_fee="1.00"
+            )
+            book.authors.add(author)
+            self.books.append(book)
+
+    def test_search_query_param(self):
+        response = self.client.get(reverse("book-list"), {"q": "earthsea"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {book["id"] for book in response.data["results"]},
+            {self.books[0].id, self.books[1].id},
+        )
+
+    def test_search_results_paginate_by_rank(self):
+        ranked = [
+            book.id
+            for book in search_books(Book.objects.all(), "guin").order_by(
+                "search_rank", "id"
+            )
+        ]
+        ids = []
+        url = reverse("book-list") + "?q=guin&page_size=1"
+        while url:
+            response = self.client.get(url)
+            ids.extend(book["id"] for book in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(ids, ranked)
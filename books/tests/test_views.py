@@ -1,14 +1,23 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 from users.models import User
 from django.urls import reverse
 from books.models import Author, Book
 from books.serializers import AuthorSerializer, BookSerializer
+from books.views import BookViewSet
+from borrowings.models import Borrowing
 
 
 class AuthorViewSetTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             email="testuser@gmail.com", password="password"
@@ -20,20 +29,21 @@ class AuthorViewSetTest(TestCase):
     def test_author_list(self):
         response = self.client.get(reverse("author-list"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.all()
+        authors = Author.objects.with_counts()
         serializer = AuthorSerializer(authors, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
 
     def test_author_detail(self):
         response = self.client.get(reverse("author-detail", args=[self.author1.id]))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        author = Author.objects.get(id=self.author1.id)
+        author = Author.objects.with_counts().get(id=self.author1.id)
         serializer = AuthorSerializer(author)
         self.assertEqual(response.data, serializer.data)
 
 
 class BookViewSetTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             email="testuser@gmail.com", password="password"
@@ -53,7 +63,7 @@ class BookViewSetTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         books = Book.objects.all()
         serializer = BookSerializer(books, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
 
     def test_book_detail(self):
         response = self.client.get(reverse("book-detail", args=[self.book1.id]))
@@ -61,3 +71,580 @@ class BookViewSetTest(TestCase):
         book = Book.objects.get(id=self.book1.id)
         serializer = BookSerializer(book)
         self.assertEqual(response.data, serializer.data)
+
+
+class BookViewSetQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.authors = [
+            Author.objects.create(first_name=f"First{i}", last_name=f"Last{i}")
+            for i in range(3)
+        ]
+
+    def create_books(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                book = Book.objects.create(
+                    title=f"Book {i}", cover="HARD", inventory=1, daily_fee="1.00"
+                )
+                book.authors.add(*self.authors)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("book-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_book_list_query_count_does_not_grow_with_page_size(self):
+        self.create_books(2)
+        small_page_queries = self.count_list_queries()
+        self.create_books(20)
+        large_page_queries = self.count_list_queries()
+        self.assertEqual(small_page_queries, large_page_queries)
+
+    def test_book_list_uses_one_query_for_authors(self):
+        self.create_books(5)
+        # Freshness check, the page of books and their authors.
+        with self.assertNumQueries(3):
+            self.client.get(reverse("book-list"))
+
+    def test_book_detail_query_count(self):
+        self.create_books(1)
+        book = Book.objects.get()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("book-detail", args=[book.id]))
+        self.assertEqual(len(response.data["authors"]), 3)
+
+
+class BookPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", cover="SOFT", inventory=1, daily_fee="1.00"
+            )
+            for i in range(5)
+        ]
+
+    def collect_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(book["id"] for book in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_pages_follow_primary_key_order(self):
+        ids = self.collect_ids(reverse("book-list") + "?page_size=2")
+        self.assertEqual(ids, [book.id for book in self.books])
+
+    def test_page_size_is_configurable(self):
+        response = self.client.get(reverse("book-list"), {"page_size": 3})
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+
+    def test_cursor_is_stable_when_rows_are_inserted(self):
+        response = self.client.get(reverse("book-list"), {"page_size": 2})
+        first_page = [book["id"] for book in response.data["results"]]
+        Book.objects.create(title="New", cover="SOFT", inventory=1, daily_fee="1.00")
+
+        rest = self.collect_ids(response.data["next"])
+
+        self.assertEqual(len(set(first_page) & set(rest)), 0)
+        self.assertEqual(
+            first_page + rest, list(Book.objects.values_list("id", flat=True))
+        )
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(reverse("book-list"), {"page_size": 2})
+        second = self.client.get(first.data["next"])
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(previous.data["results"], first.data["results"])
+
+    def test_list_does_not_count_rows(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("book-list"), {"page_size": 2})
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("book-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.author = Author.objects.create(first_name="John", last_name="Doe")
+        self.book1 = Book.objects.create(
+            title="Test Book 1", cover="HARD", inventory=10, daily_fee="10.50"
+        )
+        self.book2 = Book.objects.create(
+            title="Test Book 2", cover="SOFT", inventory=5, daily_fee="8.99"
+        )
+
+    def test_list_sends_validators(self):
+        response = self.client.get(reverse("book-list"))
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", response)
+
+    def test_matching_etag_returns_not_modified_after_one_query(self):
+        etag = self.client.get(reverse("book-list"))["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("book-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_modified_since_returns_not_modified(self):
+        last_modified = self.client.get(reverse("book-list"))["Last-Modified"]
+        response = self.client.get(
+            reverse("book-list"), HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_when_book_changes(self):
+        etag = self.client.get(reverse("book-list"))["ETag"]
+        self.book1.title = "Renamed"
+        self.book1.save()
+        response = self.client.get(reverse("book-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_changes_when_older_book_is_deleted(self):
+        etag = self.client.get(reverse("book-list"))["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book1.delete()
+        response = self.client.get(reverse("book-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_when_authors_change(self):
+        url = reverse("book-detail", args=[self.book1.id])
+        etag = self.client.get(url)["ETag"]
+        self.book1.authors.add(self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_etag_changes_with_inventory(self):
+        url = reverse("book-detail", args=[self.book1.id])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.book1.inventory -= 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book1.save(update_fields=["inventory", "updated_at"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["inventory"], 9)
+
+    def test_author_detail_not_modified(self):
+        url = reverse("author-detail", args=[self.author.id])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_author_detail_etag_changes_when_books_are_linked(self):
+        url = reverse("author-detail", args=[self.author.id])
+        response = self.client.get(url)
+        self.assertEqual(response.data["book_count"], 0)
+        self.assertNotIn("Last-Modified", response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book1.authors.add(self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["book_count"], 1)
+
+    def test_missing_book_is_not_found(self):
+        response = self.client.get(reverse("book-detail", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_book_id_is_not_found(self):
+        response = self.client.get(reverse("book-detail", args=["abc"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookBulkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.author1 = Author.objects.create(first_name="John", last_name="Doe")
+        self.author2 = Author.objects.create(first_name="Jane", last_name="Smith")
+        self.book = Book.objects.create(
+            title="Old Title", cover="HARD", inventory=1, daily_fee="1.00"
+        )
+        self.book.authors.add(self.author1)
+        self.url = reverse("book-bulk")
+
+    def new_book(self, **fields):
+        data = {
+            "title": "New Book",
+            "authors": [self.author1.id],
+            "cover": "SOFT",
+            "inventory": 3,
+            "daily_fee": "2.50",
+        }
+        data.update(fields)
+        return data
+
+    def test_creates_and_updates_books(self):
+        response = self.client.post(
+            self.url,
+            [
+                self.new_book(authors=[self.author1.id, self.author2.id]),
+                {
+                    "id": self.book.id,
+                    "title": "New Title",
+                    "authors": [self.author2.id],
+                },
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+        created = Book.objects.get(title="New Book")
+        self.assertEqual(response.data[0]["id"], created.id)
+        self.assertEqual(
+            set(created.authors.values_list("id", flat=True)),
+            {self.author1.id, self.author2.id},
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "New Title")
+        self.assertEqual(self.book.inventory, 1)
+        self.assertEqual(list(self.book.authors.all()), [self.author2])
+        self.assertEqual(self.book.author_display, "Jane Smith")
+        self.assertEqual(created.author_display, "John Doe, Jane Smith")
+
+    def test_update_refreshes_search_index_and_timestamp(self):
+        before = self.book.updated_at
+        self.client.post(
+            self.url, [{"id": self.book.id, "title": "Renamed"}], format="json"
+        )
+        self.book.refresh_from_db()
+        self.assertGreater(self.book.updated_at, before)
+        response = self.client.get(reverse("book-list"), {"q": "renamed"})
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [self.book.id]
+        )
+
+    def test_invalid_item_rejects_whole_payload(self):
+        response = self.client.post(
+            self.url,
+            [
+                self.new_book(),
+                self.new_book(authors=[999]),
+                self.new_book(cover="PAPER"),
+                {"id": 999, "title": "Missing"},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("authors", response.data[1])
+        self.assertIn("cover", response.data[2])
+        self.assertIn("id", response.data[3])
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_duplicate_update_is_rejected(self):
+        response = self.client.post(
+            self.url,
+            [
+                {"id": self.book.id, "inventory": 2},
+                {"id": self.book.id, "inventory": 3},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("id", response.data[1])
+
+    def test_book_deleted_after_validation_is_rejected(self):
+        validate = BookViewSet.validate_bulk_items
+
+        def validate_then_delete(view, items):
+            result = validate(view, items)
+            Book.objects.filter(id=self.book.id).delete()
+            return result
+
+        with mock.patch.object(
+            BookViewSet, "validate_bulk_items", validate_then_delete
+        ):
+            response = self.client.post(
+                self.url,
+                [self.new_book(), {"id": self.book.id, "inventory": 2}],
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("id", response.data[1])
+        self.assertFalse(Book.objects.exists())
+
+    def test_payload_must_be_a_list(self):
+        response = self.client.post(self.url, self.new_book(), format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_items(self):
+        def count(size):
+            payload = [self.new_book(title=f"Book {i}") for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, payload, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.assertEqual(count(2), count(40))
+
+
+class BookAvailabilityTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", cover="HARD", inventory=i, daily_fee="1.00"
+            )
+            for i in range(3)
+        ]
+        today = date.today()
+        for days, returned in ((5, None), (2, None), (1, today)):
+            reader = User.objects.create_user(
+                email=f"reader{days}@gmail.com", password="password"
+            )
+            Borrowing.objects.create(
+                user=reader,
+                book=self.books[1],
+                expected_return_date=today + timedelta(days=days),
+                actual_return_date=returned,
+            )
+        self.url = reverse("book-availability")
+
+    def get(self, ids):
+        return self.client.get(self.url, {"ids": ids})
+
+    def test_returns_availability_in_requested_order(self):
+        ids = f"{self.books[1].id},999,{self.books[0].id}"
+        with self.assertNumQueries(1):
+            response = self.get(ids)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "id": self.books[1].id,
+                    "inventory": 1,
+                    "active_borrowings": 2,
+                    "next_return_date": str(date.today() + timedelta(days=2)),
+                },
+                {
+                    "id": self.books[0].id,
+                    "inventory": 0,
+                    "active_borrowings": 0,
+                    "next_return_date": None,
+                },
+            ],
+        )
+        self.assertIn("max-age=30", response["Cache-Control"])
+
+    def test_is_cached_until_inventory_changes(self):
+        ids = f"{self.books[1].id}"
+        self.get(ids)
+        with self.assertNumQueries(0):
+            self.get(ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.check_out(self.books[1].id)
+        response = self.get(ids)
+        self.assertEqual(response.data[0]["inventory"], 0)
+
+    def test_query_count_does_not_grow_with_ids(self):
+        extra = Book.objects.bulk_create(
+            Book(title="Extra", cover="SOFT", inventory=1, daily_fee="1.00")
+            for _ in range(150)
+        )
+        ids = ",".join(str(book.id) for book in self.books + extra)
+        with self.assertNumQueries(1):
+            response = self.get(ids)
+        self.assertEqual(len(response.data), 153)
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.get("").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get("1,x").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get("1,²").status_code, status.HTTP_400_BAD_REQUEST)
+        too_many = ",".join(str(i) for i in range(1, 202))
+        self.assertEqual(self.get(too_many).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SparseFieldsetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        author = Author.objects.create(first_name="John", last_name="Doe")
+        for i in range(3):
+            book = Book.objects.create(
+                title=f"Book {i}", cover="HARD", inventory=1, daily_fee="1.00"
+            )
+            book.authors.add(author)
+
+    def test_fields_trims_output_and_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("book-list"), {"fields": "id,title"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for book in response.data["results"]:
+            self.assertEqual(set(book), {"id", "title"})
+        # Freshness and the page; authors are not prefetched.
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("daily_fee", queries[-1]["sql"])
+
+    def test_omit_drops_fields(self):
+        response = self.client.get(
+            reverse("book-list"), {"omit": "authors,author_names"}
+        )
+        self.assertEqual(
+            set(response.data["results"][0]),
+            {"id", "title", "cover", "inventory", "daily_fee"},
+        )
+
+    def test_detail_fields(self):
+        book = Book.objects.first()
+        response = self.client.get(
+            reverse("book-detail", args=[book.id]), {"fields": "author_names"}
+        )
+        self.assertEqual(response.data, {"author_names": "John Doe"})
+
+    def test_sparse_and_full_responses_are_cached_apart(self):
+        self.client.get(reverse("book-list"), {"fields": "id"})
+        response = self.client.get(reverse("book-list"))
+        self.assertIn("author_names", response.data["results"][0])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse("book-list"), {"fields": "id,isbn"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_author_fields(self):
+        response = self.client.get(reverse("author-list"), {"fields": "last_name"})
+        self.assertEqual(response.data["results"], [{"last_name": "Doe"}])
+
+
+class AuthorCountsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@gmail.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.prolific = Author.objects.create(first_name="Prolific", last_name="A")
+        self.popular = Author.objects.create(first_name="Popular", last_name="B")
+        self.unread = Author.objects.create(first_name="Unread", last_name="C")
+
+        books = [
+            Book.objects.create(
+                title=f"Book {i}", cover="HARD", inventory=5, daily_fee="1.00"
+            )
+            for i in range(4)
+        ]
+        for book in books[:3]:
+            book.authors.add(self.prolific)
+        books[3].authors.add(self.popular, self.prolific)
+        for i in range(3):
+            self.borrow(books[3], returned=i == 2)
+        self.borrow(books[0])
+
+    def borrow(self, book, returned=False):
+        reader = User.objects.create_user(
+            email=f"reader{Borrowing.objects.count()}@gmail.com", password="password"
+        )
+        return Borrowing.objects.create(
+            user=reader,
+            book=book,
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=date.today() if returned else None,
+        )
+
+    def get(self, **params):
+        response = self.client.get(reverse("author-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def counts(self, **params):
+        return [
+            (author["first_name"], author["book_count"], author["active_loan_count"])
+            for author in self.get(**params).data["results"]
+        ]
+
+    def test_counts(self):
+        with self.assertNumQueries(2):
+            counts = self.counts()
+        self.assertEqual(
+            counts, [("Prolific", 4, 3), ("Popular", 1, 2), ("Unread", 0, 0)]
+        )
+
+    def test_ordering_by_popularity_across_pages(self):
+        names = []
+        url = reverse("author-list") + "?ordering=-active_loan_count&page_size=1"
+        while url:
+            response = self.client.get(url)
+            names += [author["first_name"] for author in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(names, ["Prolific", "Popular", "Unread"])
+
+        self.assertEqual(
+            [name for name, *_ in self.counts(ordering="book_count,-id")],
+            ["Unread", "Popular", "Prolific"],
+        )
+
+    def test_filters(self):
+        self.assertEqual([name for name, *_ in self.counts(min_books=2)], ["Prolific"])
+        self.assertEqual(
+            [name for name, *_ in self.counts(min_active_loans=1)],
+            ["Prolific", "Popular"],
+        )
+        for value in ("-1", "²"):
+            response = self.client.get(reverse("author-list"), {"min_books": value})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_loans_invalidate_cached_counts(self):
+        response = self.get()
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        borrowing = Borrowing.objects.get(book__title="Book 0")
+        borrowing.actual_return_date = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            borrowing.save()
+
+        response = self.client.get(reverse("author-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["active_loan_count"], 2)
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from books.views import BookViewSet, AuthorViewSet
+from books.views import BookViewSet, AuthorViewSet, CatalogCacheStatsView
 
 router = DefaultRouter()
 router.register("authors", AuthorViewSet)
 router.register("books", BookViewSet)
 
 urlpatterns = [
+    path("cache/stats/", CatalogCacheStatsView.as_view(), name="catalog-cache-stats"),
     path("", include(router.urls)),
 ]
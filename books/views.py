@@ -1,16 +1,495 @@
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+import hashlib
+import re
 
-from books.models import Book, Author
-from books.serializers import BookSerializer, AuthorSerializer
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    quote_etag,
+)
+from django.utils.http import http_date
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from books import cache as catalog_cache
+from books.filters import AuthorCountFilter
+from books.models import Book, Author, format_author_names
+from books.search import BookSearchFilter, index_books
+from library_management.sparse_fields import SparseFieldsetViewMixin
+from books.serializers import (
+    BookAvailabilitySerializer,
+    BookBulkItemSerializer,
+    BookSerializer,
+    AuthorSerializer,
+)
 
-class AuthorViewSet(viewsets.ModelViewSet):
+
+class CachedResponseMixin:
+    """
+    Serve GET responses from the versioned catalog cache.
+
+    ``version_namespaces`` lists further cache versions, besides the
+    catalog's, that the responses depend on.
+    """
+
+    version_namespaces = ()
+
+    def cached_response(self, request, build_response):
+        key = catalog_cache.make_key(
+            "response",
+            request.build_absolute_uri(),
+            *catalog_cache.get_versions(self.version_namespaces),
+        )
+        data = cache.get(key)
+        catalog_cache.record("response", hits=data is not None, misses=data is None)
+        if data is not None:
+            return Response(data)
+
+        response = build_response()
+        if response.status_code == 200:
+            cache.set(key, response.data, catalog_cache.get_timeout())
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs from ``updated_at`` before doing any other work.
+
+    A list is validated by one ``MAX(updated_at)`` query plus the catalog
+    version, which deletions bump even though they leave the newest timestamp
+    alone. Views whose responses also depend on ``version_namespaces`` fold
+    those versions, and on a detail the catalog version too, into the ETag
+    and send no ``Last-Modified``, which could not reflect them.
+    """
+
+    version_namespaces = ()
+
+    def get_list_freshness(self):
+        freshness = self.get_queryset().model.objects.aggregate(
+            last_modified=Max("updated_at")
+        )
+        versions = [
+            catalog_cache.get_version(),
+            *catalog_cache.get_versions(self.version_namespaces),
+        ]
+        return freshness["last_modified"], ":".join(map(str, versions))
+
+    def get_detail_freshness(self, pk):
+        try:
+            last_modified = (
+                self.get_queryset()
+                .model.objects.filter(pk=pk)
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except ValueError:
+            last_modified = None
+        versions = [last_modified is not None]
+        if self.version_namespaces:
+            # Such a payload also depends on related rows (an author's
+            # ``book_count``), which change without touching ``updated_at``.
+            versions.append(catalog_cache.get_version())
+        versions.extend(catalog_cache.get_versions(self.version_namespaces))
+        return last_modified, ":".join(map(str, versions))
+
+    def conditional_response(self, request, freshness, build_response):
+        last_modified, version = freshness
+        validator = "|".join(
+            [
+                last_modified.isoformat() if last_modified else "",
+                str(version),
+                request.get_full_path(),
+                request.accepted_renderer.format,
+            ]
+        )
+        etag = quote_etag(hashlib.sha1(validator.encode()).hexdigest())
+        timestamp = (
+            int(last_modified.timestamp())
+            if last_modified and not self.version_namespaces
+            else None
+        )
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+
+        response = build_response()
+        if response.status_code == 200:
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+
+class AuthorViewSet(
+    SparseFieldsetViewMixin,
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [OrderingFilter, AuthorCountFilter]
+    ordering_fields = ["id", "last_name", "book_count", "active_loan_count"]
+    version_namespaces = (catalog_cache.LOANS,)
+
+    def get_queryset(self):
+        return self.sparse_queryset(super().get_queryset().with_counts())
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_list_freshness(),
+            lambda: self.cached_response(
+                request,
+                lambda: super(AuthorViewSet, self).list(request, *args, **kwargs),
+            ),
+        )
 
-class BookViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_detail_freshness(kwargs[self.lookup_field]),
+            lambda: self.cached_response(
+                request,
+                lambda: super(AuthorViewSet, self).retrieve(request, *args, **kwargs),
+            ),
+        )
+
+
+class BookViewSet(SparseFieldsetViewMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    filter_backends = [BookSearchFilter]
+    bulk_max_items = 1000
+    availability_max_ids = 200
+
+    def get_serializer_class(self):
+        if self.action == "bulk":
+            return BookBulkItemSerializer
+        if self.action == "availability":
+            return BookAvailabilitySerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_field("authors"):
+            queryset = queryset.with_authors()
+        return self.sparse_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_list_freshness(),
+            lambda: self.cached_list(request),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_detail_freshness(kwargs[self.lookup_field]),
+            lambda: self.cached_retrieve(request, *args, **kwargs),
+        )
+
+    def cached_list(self, request):
+        """
+        Cache which books are on a page separately from the books themselves,
+        so a changed book only re-serializes that one row.
+        """
+        key = catalog_cache.make_key("page", request.build_absolute_uri())
+        page = cache.get(key)
+        catalog_cache.record("response", hits=page is not None, misses=page is None)
+
+        loaded = {}
+        if page is None:
+            books = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            loaded = {book.id: book for book in books}
+            page = {
+                "ids": list(loaded),
+                "next": self.paginator.get_next_link(),
+                "previous": self.paginator.get_previous_link(),
+            }
+            cache.set(key, page, catalog_cache.get_timeout())
+
+        return Response(
+            {
+                "next": page["next"],
+                "previous": page["previous"],
+                "results": self.get_book_fragments(page["ids"], loaded),
+            }
+        )
+
+    def cached_retrieve(self, request, *args, **kwargs):
+        try:
+            book_id = int(kwargs[self.lookup_field])
+        except (KeyError, ValueError):
+            return super().retrieve(request, *args, **kwargs)
+
+        fragments = self.get_book_fragments([book_id])
+        if not fragments:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(fragments[0])
+
+    def get_book_fragments(self, book_ids, loaded=None):
+        """Return serialized books in ``book_ids`` order, serializing only cache misses."""
+        keys = catalog_cache.book_fragment_keys(book_ids, self.get_sparse_variant())
+        fragments = cache.get_many(keys.values())
+        missing = [book_id for book_id in book_ids if keys[book_id] not in fragments]
+        catalog_cache.record(
+            "fragment", hits=len(book_ids) - len(missing), misses=len(missing)
+        )
+
+        if missing:
+            loaded = loaded or self.get_queryset().in_bulk(missing)
+            serialized = {
+                keys[book_id]: self.get_serializer(loaded[book_id]).data
+                for book_id in missing
+                if book_id in loaded
+            }
+            cache.set_many(serialized, catalog_cache.get_timeout())
+            fragments.update(serialized)
+
+        return [
+            fragments[keys[book_id]]
+            for book_id in book_ids
+            if keys[book_id] in fragments
+        ]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "ids",
+                str,
+                required=True,
+                description="Comma-separated book ids, at most 200",
+            )
+        ],
+        responses={200: BookAvailabilitySerializer(many=True)},
+    )
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def availability(self, request):
+        """
+        Inventory, active borrowings and the earliest expected return date
+        for many books at once, in the order the ids were given.
+
+        Unknown ids are left out. The answer is cached for
+        ``CATALOG_AVAILABILITY_TIMEOUT`` seconds, here and by clients.
+        """
+        book_ids = self.get_availability_ids(request)
+        versions = catalog_cache.get_book_versions(book_ids)
+        key = catalog_cache.make_key(
+            "availability", *[f"{book_id}:{versions[book_id]}" for book_id in book_ids]
+        )
+        data = cache.get(key)
+        catalog_cache.record("response", hits=data is not None, misses=data is None)
+
+        if data is None:
+            active = Q(borrowing__actual_return_date__isnull=True)
+            rows = (
+                Book.objects.filter(id__in=book_ids)
+                .annotate(
+                    active_borrowings=Count("borrowing", filter=active),
+                    next_return_date=Min(
+                        "borrowing__expected_return_date", filter=active
+                    ),
+                )
+                .values("id", "inventory", "active_borrowings", "next_return_date")
+            )
+            rows = {row["id"]: row for row in rows}
+            data = self.get_serializer(
+                [rows[book_id] for book_id in book_ids if book_id in rows], many=True
+            ).data
+            cache.set(key, data, catalog_cache.get_availability_timeout())
+
+        response = Response(data)
+        patch_cache_control(
+            response, private=True, max_age=catalog_cache.get_availability_timeout()
+        )
+        return response
+
+    def get_availability_ids(self, request):
+        book_ids = []
+        for value in request.query_params.getlist("ids"):
+            for part in value.split(","):
+                part = part.strip()
+                if not part:
+                    continue
+                # Not isdigit(): it accepts digits such as "²" that int() rejects.
+                if not re.fullmatch(r"[0-9]+", part):
+                    raise ValidationError({"ids": [f"{part!r} is not a book id."]})
+                book_ids.append(int(part))
+        book_ids = list(dict.fromkeys(book_ids))
+        if not book_ids:
+            raise ValidationError({"ids": ["Give at least one book id."]})
+        if len(book_ids) > self.availability_max_ids:
+            raise ValidationError(
+                {"ids": [f"At most {self.availability_max_ids} ids per request."]}
+            )
+        return book_ids
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Create and update many books in one request.
+
+        Either every item is written or none is: a payload with any invalid
+        item is answered with 400 and a list of errors in payload order,
+        empty for the items that were fine.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Expected a non-empty list of books."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {"detail": f"At most {self.bulk_max_items} books per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        validated, errors = self.validate_bulk_items(items)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        book_ids, errors = self.write_bulk_items(validated)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        books = self.get_queryset().in_bulk(book_ids)
+        serializer = BookSerializer(
+            [books[book_id] for book_id in book_ids if book_id in books],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    def validate_bulk_items(self, items):
+        validated, errors = [], []
+        for item in items:
+            serializer = self.get_serializer(
+                data=item, partial=isinstance(item, dict) and "id" in item
+            )
+            if serializer.is_valid():
+                validated.append(serializer.validated_data)
+                errors.append({})
+            else:
+                validated.append(None)
+                errors.append(serializer.errors)
+
+        author_ids = {
+            author_id
+            for data in validated
+            if data is not None
+            for author_id in data.get("authors", [])
+        }
+        author_names = {
+            author_id: (first_name, last_name)
+            for author_id, first_name, last_name in Author.objects.filter(
+                id__in=author_ids
+            ).values_list("id", "first_name", "last_name")
+        }
+        update_ids = [data["id"] for data in validated if data and "id" in data]
+        known_books = set(
+            Book.objects.filter(id__in=update_ids).values_list("id", flat=True)
+        )
+
+        seen = set()
+        for data, item_errors in zip(validated, errors):
+            if data is None:
+                continue
+            missing = [
+                author_id
+                for author_id in data.get("authors", [])
+                if author_id not in author_names
+            ]
+            if missing:
+                item_errors["authors"] = [
+                    f'Invalid pk "{author_id}" - object does not exist.'
+                    for author_id in missing
+                ]
+            elif "authors" in data:
+                data["author_display"] = format_author_names(
+                    author_names[author_id] for author_id in sorted(data["authors"])
+                )
+            if "id" in data:
+                if data["id"] not in known_books:
+                    item_errors["id"] = [f"Book {data['id']} does not exist."]
+                elif data["id"] in seen:
+                    item_errors["id"] = [f"Book {data['id']} appears twice."]
+                seen.add(data["id"])
+        return validated, errors
+
+    @transaction.atomic
+    def write_bulk_items(self, validated):
+        """
+        Write validated items and return the book ids in payload order. If a
+        book to update was deleted since validation nothing is written, and
+        per-item errors are returned instead of the ids.
+        """
+        creates = [data for data in validated if "id" not in data]
+        updates = {data["id"]: data for data in validated if "id" in data}
+
+        # Locked until commit, so no book can go away while it is updated.
+        books = Book.objects.select_for_update().in_bulk(updates) if updates else {}
+        if len(books) < len(updates):
+            return None, [
+                (
+                    {"id": [f"Book {data['id']} does not exist."]}
+                    if "id" in data and data["id"] not in books
+                    else {}
+                )
+                for data in validated
+            ]
+
+        created = Book.objects.bulk_create(
+            Book(**{name: value for name, value in data.items() if name != "authors"})
+            for data in creates
+        )
+        for book, data in zip(created, creates):
+            data["id"] = book.id
+
+        if updates:
+            now = timezone.now()
+            fields = {"updated_at"}
+            for book_id, data in updates.items():
+                book = books[book_id]
+                for name, value in data.items():
+                    if name not in ("id", "authors"):
+                        setattr(book, name, value)
+                        fields.add(name)
+                book.updated_at = now
+            Book.objects.bulk_update(books.values(), sorted(fields))
+
+        relinked = [data for data in validated if "authors" in data]
+        Through = Book.authors.through
+        Through.objects.filter(
+            book_id__in=[data["id"] for data in relinked if data["id"] in updates]
+        ).delete()
+        Through.objects.bulk_create(
+            Through(book_id=data["id"], author_id=author_id)
+            for data in relinked
+            for author_id in data["authors"]
+        )
+
+        # bulk_create and bulk_update skip the model signals.
+        book_ids = [data["id"] for data in validated]
+        index_books(book_ids)
+        transaction.on_commit(catalog_cache.bump_version)
+        return book_ids, None
+
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache.get_stats())
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from borrowings.notifications import (
+    BATCH_SIZE,
+    CONCURRENCY,
+    drain_outbox,
+    run_worker,
+)
+
+
+class Command(BaseCommand):
+    help = "Send the pending Telegram notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Notifications loaded per batch",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=CONCURRENCY,
+            help="Messages in flight at once",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running and drain the outbox every this many seconds "
+            "over one bot client, instead of draining it once",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--batch-size and --concurrency must be positive")
+        if options["interval"] is not None:
+            if options["interval"] <= 0:
+                raise CommandError("--interval must be positive")
+            run_worker(
+                options["interval"], options["batch_size"], options["concurrency"]
+            )
+            return
+
+        start = time.perf_counter()
+        stats = drain_outbox(options["batch_size"], options["concurrency"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent {stats['sent']} notifications, {stats['failed']} failed "
+                f"in {elapsed:.1f}s."
+            )
+        )
@@ -0,0 +1,97 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0004_book_author_display"),
+        ("borrowings", "0004_alter_borrowing_fine_payment_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_borrowing_id", models.BigIntegerField(default=0)),
+                ("refreshed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BookBorrowDailyCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(db_index=True)),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="books.book",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TrendingBook",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "window",
+                    models.PositiveSmallIntegerField(
+                        choices=[(7, "7 days"), (30, "30 days"), (365, "365 days")]
+                    ),
+                ),
+                ("rank", models.PositiveIntegerField()),
+                ("borrow_count", models.PositiveIntegerField()),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="books.book",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="bookborrowdailycount",
+            constraint=models.UniqueConstraint(
+                fields=("book", "day"), name="unique_book_borrow_day"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trendingbook",
+            constraint=models.UniqueConstraint(
+                fields=("window", "rank"), name="unique_trending_window_rank"
+            ),
+        ),
+    ]
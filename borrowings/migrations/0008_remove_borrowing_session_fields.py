@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0007_notification_outbox"),
+        # The sessions are copied into the payment ledger first.
+        ("payments", "0002_payment_ledger"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="borrowing",
+            name="unique_borrowing_session_id",
+        ),
+        migrations.RemoveField(
+            model_name="borrowing",
+            name="session_id",
+        ),
+        migrations.RemoveField(
+            model_name="borrowing",
+            name="session_url",
+        ),
+    ]
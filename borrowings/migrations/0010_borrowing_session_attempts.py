@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0009_notification_outbox_claimed_until"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="borrowing",
+            name="fine_session_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="borrowing",
+            name="fine_session_retry_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="borrowing",
+            name="session_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="borrowing",
+            name="session_retry_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
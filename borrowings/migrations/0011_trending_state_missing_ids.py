@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0010_borrowing_session_attempts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trendingstate",
+            name="missing_ids",
+            field=models.JSONField(default=list),
+        ),
+    ]
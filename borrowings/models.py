@@ -1,8 +1,11 @@
-from django.db import models
-from django.db.models.signals import pre_delete
+from functools import partial
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
+from books.cache import LOANS, bump_version
 from books.models import Book
 from users.models import User
 
@@ -17,14 +20,18 @@ class Borrowing(models.Model):
     actual_return_date = models.DateField(blank=True, null=True)
     payment_status = models.CharField(max_length=20, default="pending")
     fine_payment_status = models.CharField(max_length=20, default="pending", null=True)
-    session_id = models.CharField(max_length=100, blank=True, null=True)
-    session_url = models.CharField(max_length=100, blank=True, null=True)
     amount_paid = models.DecimalField(
         max_digits=10, decimal_places=2, blank=True, null=True
     )
     fine_amount = models.DecimalField(
         max_digits=10, decimal_places=2, blank=True, null=True
     )
+    # Failed Stripe session attempts and when the sweeper may retry, per
+    # purpose; see ``borrowings.payment_sessions``.
+    session_attempts = models.PositiveSmallIntegerField(default=0)
+    session_retry_at = models.DateTimeField(null=True, blank=True)
+    fine_session_attempts = models.PositiveSmallIntegerField(default=0)
+    fine_session_retry_at = models.DateTimeField(null=True, blank=True)
 
     def is_active(self):
         return self.actual_return_date is None
@@ -62,15 +69,119 @@ class Borrowing(models.Model):
                 self.fine_payment_status = "pending"
         self.save()
 
+    def get_payment(self, purpose):
+        """The latest ``payments.Payment`` of ``purpose``, or None; cached."""
+        cache = self.__dict__.setdefault("_latest_payments", {})
+        if purpose not in cache:
+            cache[purpose] = (
+                self.payments.filter(purpose=purpose).order_by("-id").first()
+            )
+        return cache[purpose]
+
+    def set_payment(self, payment):
+        self.__dict__.setdefault("_latest_payments", {})[payment.purpose] = payment
+
     def __str__(self):
         return f"{self.user} borrows {self.book}"
 
     class Meta:
         unique_together = ["user", "book"]
+        indexes = [
+            # Active borrowings of a user, checked on every checkout.
+            models.Index(
+                fields=["user"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_user_idx",
+            ),
+            # Overdue scan: open borrowings by due date.
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_open_due_idx",
+            ),
+        ]
+
+
+class BookBorrowDailyCount(models.Model):
+    """Borrowings of a book per borrow date, the input of the trending ranking."""
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField(db_index=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "day"], name="unique_book_borrow_day"
+            )
+        ]
+
+
+class TrendingBook(models.Model):
+    """One row of the precomputed most-borrowed ranking of a rolling window."""
+
+    WINDOW_CHOICES = [
+        (7, "7 days"),
+        (30, "30 days"),
+        (365, "365 days"),
+    ]
+
+    window = models.PositiveSmallIntegerField(choices=WINDOW_CHOICES)
+    rank = models.PositiveIntegerField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    borrow_count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["window", "rank"], name="unique_trending_window_rank"
+            )
+        ]
+
+
+class TrendingState(models.Model):
+    """Single row remembering how far the ranking refresh has read."""
+
+    last_borrowing_id = models.BigIntegerField(default=0)
+    # Ids at or below ``last_borrowing_id`` not seen yet; see ``trending``.
+    missing_ids = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+
+class NotificationOutbox(models.Model):
+    """
+    A Telegram message waiting to be sent.
+
+    Rows are written in the transaction that causes them and sent later by
+    ``borrowings.notifications.drain_outbox``, so a rolled back borrowing is
+    never announced and a slow Telegram never slows a checkout down.
+    """
+
+    chat_id = models.CharField(max_length=64)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Set while a drain is sending the row; see ``notifications.claim_batch``.
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="notification_outbox_unsent_idx",
+            ),
+        ]
 
 
 @receiver(pre_delete, sender=Borrowing)
 def update_inventory_on_return(sender, instance, **kwargs):
     if instance.actual_return_date is not None:
-        instance.book.inventory += 1
-        instance.book.save()
+        Book.objects.check_in(instance.book_id)
+
+
+@receiver(post_save, sender=Borrowing)
+@receiver(post_delete, sender=Borrowing)
+def invalidate_loan_counts(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, LOANS))
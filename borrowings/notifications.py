@@ -1,13 +1,154 @@
+"""
+New-borrowing notifications through a transactional outbox.
+
+``notify_new_borrowing`` only writes a ``NotificationOutbox`` row, inside the
+caller's transaction. ``drain_outbox`` sends the pending rows in batches
+over one bot client with a bounded number of requests in flight; it runs
+from the ``send_notifications`` command and the Celery task, and opens the
+client only when it has claimed something to send. ``run_worker`` (the
+command's ``--interval``) keeps a single client open across drains instead.
+
+Each batch is claimed before it is sent: a short ``select_for_update``
+transaction stamps ``claimed_until`` on rows nobody holds a live lease on,
+so an overrunning drain and the next scheduled one never send the same
+message. Rows of a drain that died are picked up once the lease expires.
+"""
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from borrowings.models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+CONCURRENCY = 8
+# Rows that failed this many times are left for someone to look at.
+MAX_ATTEMPTS = 5
+# How long a claimed batch is reserved for the drain that claimed it.
+LEASE = timedelta(minutes=5)
+
+
+def notify_new_borrowing(borrowing):
+    # Built from the denormalized author names: ``str(book)`` would query
+    # the authors inside the checkout transaction.
+    book = borrowing.book
+    text = f"New borrowing created: {borrowing.user} borrows {book.title}"
+    if book.author_display:
+        text += f" by {book.author_display}"
+    return NotificationOutbox.objects.create(
+        chat_id=settings.TELEGRAM_CHAT_ID, text=text
+    )
+
+
+def claim_batch(after_id, batch_size, lease=LEASE):
+    """Lease the next ``batch_size`` unsent rows after ``after_id`` and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            NotificationOutbox.objects.filter(
+                Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+                sent_at__isnull=True,
+                attempts__lt=MAX_ATTEMPTS,
+                id__gt=after_id,
+            )
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        NotificationOutbox.objects.filter(id__in=ids).update(claimed_until=now + lease)
+    return list(NotificationOutbox.objects.filter(id__in=ids).order_by("id"))
+
+
+async def send_batch(bot, notifications, semaphore):
+    """Send ``notifications``; returns the ids that went out and those that failed."""
+
+    async def send(notification):
+        async with semaphore:
+            try:
+                await bot.send_message(
+                    chat_id=notification.chat_id, text=notification.text
+                )
+            except Exception:
+                logger.warning(
+                    "Notification %s could not be sent.", notification.id, exc_info=True
+                )
+                return False
+            return True
+
+    results = await asyncio.gather(*(send(n) for n in notifications))
+    sent = [n.id for n, ok in zip(notifications, results) if ok]
+    failed = [n.id for n, ok in zip(notifications, results) if not ok]
+    return sent, failed
+
+
+def make_bot(concurrency=CONCURRENCY):
+    return Bot(
+        token=settings.TELEGRAM_BOT_TOKEN,
+        request=HTTPXRequest(connection_pool_size=concurrency),
+    )
+
+
+async def adrain_outbox(batch_size=BATCH_SIZE, concurrency=CONCURRENCY, bot=None):
+    """
+    Send every pending notification over ``bot``. Without one, a bot is
+    opened only once there is something to send: opening it calls Telegram.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"sent": 0, "failed": 0}
+
+    batch = await sync_to_async(claim_batch)(0, batch_size)
+    if not batch:
+        return stats
+    if bot is None:
+        async with make_bot(concurrency) as bot:
+            return await send_batches(bot, batch, batch_size, semaphore, stats)
+    return await send_batches(bot, batch, batch_size, semaphore, stats)
+
+
+async def send_batches(bot, batch, batch_size, semaphore, stats):
+    while batch:
+        sent, failed = await send_batch(bot, batch, semaphore)
+        if sent:
+            await NotificationOutbox.objects.filter(id__in=sent).aupdate(
+                sent_at=timezone.now(), attempts=F("attempts") + 1
+            )
+        if failed:
+            # Released so that the next drain retries them straight away.
+            await NotificationOutbox.objects.filter(id__in=failed).aupdate(
+                attempts=F("attempts") + 1, claimed_until=None
+            )
+        stats["sent"] += len(sent)
+        stats["failed"] += len(failed)
+        batch = await sync_to_async(claim_batch)(batch[-1].id, batch_size)
+    return stats
+
+
+async def arun_worker(interval, batch_size=BATCH_SIZE, concurrency=CONCURRENCY):
+    async with make_bot(concurrency) as bot:
+        while True:
+            stats = await adrain_outbox(batch_size, concurrency, bot=bot)
+            if stats["sent"] or stats["failed"]:
+                logger.info(
+                    "Sent %s notifications, %s failed.", stats["sent"], stats["failed"]
+                )
+            await asyncio.sleep(interval)
 
 
-async def send_notification(chat_id, message):
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    await bot.send_message(chat_id=chat_id, text=message)
+def drain_outbox(batch_size=BATCH_SIZE, concurrency=CONCURRENCY):
+    """Send every pending notification once; returns sent and failed counts."""
+    return async_to_sync(adrain_outbox)(batch_size, concurrency)
 
 
-async def notify_new_borrowing(borrowing):
-    chat_id = "6976462510"
-    message = f"New borrowing created: {borrowing}"
-    await send_notification(chat_id, message)
+def run_worker(interval, batch_size=BATCH_SIZE, concurrency=CONCURRENCY):
+    """Drain the outbox every ``interval`` seconds over one bot, until stopped."""
+    async_to_sync(arun_worker)(interval, batch_size, concurrency)
@@ -0,0 +1,132 @@
+"""
+Daily Telegram digest of overdue borrowings.
+
+Overdue rows are streamed in chunks with their user and book joined in, and
+folded into as few messages as Telegram's length limit allows. Messages go
+out over one pooled HTTP session with timeouts. ``sendMessage`` is not
+idempotent, so only failures that guarantee nothing was sent are retried:
+connection errors and 429 answers (honouring ``Retry-After``). A 5xx or a
+read timeout may follow a delivered message and is not retried.
+"""
+
+import logging
+import time
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from borrowings.models import Borrowing
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+# Telegram rejects longer message texts.
+MESSAGE_LIMIT = 4096
+CHUNK_SIZE = 2000
+# (connect, read) seconds.
+TIMEOUT = (3.05, 10)
+NOTHING_OVERDUE = "No borrowings overdue today!"
+
+_session = None
+
+
+def get_session():
+    """The process-wide HTTP session, created on first use."""
+    global _session
+    if _session is None:
+        retry = Retry(
+            total=5,
+            connect=3,
+            read=0,
+            other=0,
+            backoff_factor=1,
+            status_forcelist=(429,),
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(max_retries=retry))
+        _session = session
+    return _session
+
+
+def format_entry(borrowing):
+    return (
+        f"Borrowing ID: {borrowing.id} is overdue.\n"
+        f"User: {borrowing.user.email}\n"
+        f"Book: {borrowing.book.title}\n"
+        f"Expected return date: {borrowing.expected_return_date}"
+    )
+
+
+def build_digests(entries, limit=MESSAGE_LIMIT):
+    """Join ``entries`` into messages of at most ``limit`` characters."""
+    digest = ""
+    for entry in entries:
+        entry = entry[:limit]
+        if digest and len(digest) + 2 + len(entry) > limit:
+            yield digest
+            digest = ""
+        digest = f"{digest}\n\n{entry}" if digest else entry
+    if digest:
+        yield digest
+
+
+def get_overdue_borrowings(today):
+    return (
+        Borrowing.objects.filter(
+            expected_return_date__lte=today, actual_return_date__isnull=True
+        )
+        .select_related("user", "book")
+        .only("id", "expected_return_date", "user__email", "book__title")
+        .order_by("expected_return_date", "id")
+    )
+
+
+def send_message(text, session=None):
+    session = session or get_session()
+    response = session.post(
+        f"{TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage",
+        data={"chat_id": settings.TELEGRAM_CHAT_ID, "text": text},
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def notify_overdue(today=None, chunk_size=CHUNK_SIZE, session=None):
+    """Send the overdue digest; returns counts and throughput of the run."""
+    today = today or timezone.localdate()
+    start = time.perf_counter()
+    overdue = 0
+
+    def entries():
+        nonlocal overdue
+        for borrowing in get_overdue_borrowings(today).iterator(chunk_size=chunk_size):
+            overdue += 1
+            yield format_entry(borrowing)
+
+    messages = 0
+    for digest in build_digests(entries()):
+        send_message(digest, session)
+        messages += 1
+    if not overdue:
+        send_message(NOTHING_OVERDUE, session)
+        messages = 1
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "overdue": overdue,
+        "messages": messages,
+        "seconds": round(seconds, 3),
+        "per_second": round(overdue / seconds, 1) if seconds else 0.0,
+    }
+    logger.info(
+        "Notified %(overdue)d overdue borrowings in %(messages)d messages "
+        "(%(seconds).3fs, %(per_second).1f/s).",
+        stats,
+    )
+    return stats
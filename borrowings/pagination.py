@@ -0,0 +1,9 @@
+from library_management.pagination import KeysetPagination
+
+
+class BorrowingPagination(KeysetPagination):
+    ordering = ("expected_return_date", "id")
+
+
+class TrendingPagination(KeysetPagination):
+    ordering = ("rank", "id")
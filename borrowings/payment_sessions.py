@@ -0,0 +1,169 @@
+"""
+Stripe checkout sessions for borrowings, created outside any transaction.
+
+A borrowing (or a late return with a fine) is committed first with its
+status set to ``AWAITING_SESSION``. The Stripe round trip happens afterwards,
+holding no locks. The session becomes a ``payments.Payment`` row, written
+together with an update conditional on the borrowing still awaiting a
+session, so the inline attempt and the ``create_missing_payment_sessions``
+sweeper never record one twice.
+
+While the gateway's circuit breaker is open no call is made at all; the row
+is marked ``PAYMENT_DEFERRED`` and left for the sweeper.
+
+A failed attempt is counted on the row and pushes its next retry back
+exponentially, up to ``MAX_SESSION_ATTEMPTS``; the sweeper serves the rows
+with the fewest attempts first, so a few permanently failing borrowings
+cannot keep newer ones from getting a session.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+from payments.models import Payment
+from payments.services import StripePaymentService, breaker
+
+logger = logging.getLogger(__name__)
+
+AWAITING_SESSION = "awaiting_session"
+PAYMENT_DEFERRED = "deferred"
+WITHOUT_SESSION = [AWAITING_SESSION, PAYMENT_DEFERRED]
+CHECKOUT = "payment_status"
+FINE = "fine_payment_status"
+
+# Payment purpose, also part of the Stripe idempotency key, per status field.
+PURPOSES = {CHECKOUT: Payment.RENTAL, FINE: Payment.FINE}
+# Attempt counter and next retry time of each status field.
+RETRY_FIELDS = {
+    CHECKOUT: ("session_attempts", "session_retry_at"),
+    FINE: ("fine_session_attempts", "fine_session_retry_at"),
+}
+MAX_SESSION_ATTEMPTS = 8
+RETRY_BASE = timedelta(minutes=5)
+RETRY_CAP = timedelta(hours=6)
+
+
+def get_amount(borrowing, status_field):
+    if status_field == FINE:
+        return borrowing.fine_amount
+    return borrowing.amount_paid
+
+
+def get_expiration_time(borrowing, status_field):
+    """
+    A day after the borrowing (or the return, for a fine). Derived from the
+    row rather than the clock so that every attempt under the same Stripe
+    idempotency key sends identical params.
+    """
+    day = borrowing.actual_return_date if status_field == FINE else None
+    start = datetime.combine(day or borrowing.borrow_date, time.min, dt_timezone.utc)
+    return start + timedelta(hours=24)
+
+
+def get_retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_CAP)
+
+
+def record_failed_attempt(borrowing, status_field):
+    attempts_field, retry_field = RETRY_FIELDS[status_field]
+    attempts = getattr(borrowing, attempts_field) + 1
+    retry_at = timezone.now() + get_retry_delay(attempts)
+    Borrowing.objects.filter(
+        id=borrowing.id, **{f"{status_field}__in": WITHOUT_SESSION}
+    ).update(**{attempts_field: F(attempts_field) + 1, retry_field: retry_at})
+    setattr(borrowing, attempts_field, attempts)
+    setattr(borrowing, retry_field, retry_at)
+    if attempts >= MAX_SESSION_ATTEMPTS:
+        logger.error(
+            "Giving up on the %s session of borrowing %s after %s attempts.",
+            PURPOSES[status_field],
+            borrowing.id,
+            attempts,
+        )
+
+
+def attach_payment_session(borrowing, status_field=CHECKOUT):
+    """
+    Create the Stripe session for ``borrowing`` and record it. Call it with
+    no transaction open.
+
+    Returns whether this call recorded the session. ``borrowing`` is updated
+    in place when it did; ``borrowing.get_payment()`` returns the new row.
+    """
+    payment_response = StripePaymentService().create_payment_session(
+        {
+            "borrowing_id": borrowing.id,
+            "purpose": PURPOSES[status_field],
+            "user_id": borrowing.user_id,
+            "amount": get_amount(borrowing, status_field),
+            "book_name": borrowing.book.title,
+            "expires_at": get_expiration_time(borrowing, status_field),
+        }
+    )
+    if payment_response.get("deferred"):
+        updated = Borrowing.objects.filter(
+            id=borrowing.id, **{status_field: AWAITING_SESSION}
+        ).update(**{status_field: PAYMENT_DEFERRED})
+        if updated:
+            setattr(borrowing, status_field, PAYMENT_DEFERRED)
+        return False
+    if not payment_response["success"]:
+        logger.warning(
+            "Payment session for borrowing %s failed: %s",
+            borrowing.id,
+            payment_response.get("error"),
+        )
+        record_failed_attempt(borrowing, status_field)
+        return False
+
+    with transaction.atomic():
+        recorded = Borrowing.objects.filter(
+            id=borrowing.id, **{f"{status_field}__in": WITHOUT_SESSION}
+        ).update(**{status_field: Payment.PENDING})
+        if not recorded:
+            return False
+        payment = Payment.objects.create(
+            borrowing_id=borrowing.id,
+            purpose=PURPOSES[status_field],
+            amount=get_amount(borrowing, status_field),
+            session_id=payment_response["session_id"],
+            session_url=payment_response["session_url"] or "",
+        )
+    setattr(borrowing, status_field, Payment.PENDING)
+    borrowing.set_payment(payment)
+    return True
+
+
+def create_missing_payment_sessions(limit=500):
+    """
+    Retry sessions the inline attempt did not record, deferred ones
+    included, whose backoff has passed; returns how many were. Stops early
+    while the breaker is open.
+    """
+    recorded = 0
+    now = timezone.now()
+    for status_field in (CHECKOUT, FINE):
+        attempts_field, retry_field = RETRY_FIELDS[status_field]
+        awaiting = (
+            Borrowing.objects.filter(
+                Q(**{f"{retry_field}__isnull": True})
+                | Q(**{f"{retry_field}__lte": now}),
+                **{
+                    f"{status_field}__in": WITHOUT_SESSION,
+                    f"{attempts_field}__lt": MAX_SESSION_ATTEMPTS,
+                },
+            )
+            .select_related("book")
+            .order_by(attempts_field, "id")[:limit]
+        )
+        for borrowing in awaiting:
+            if breaker.is_open:
+                return recorded
+            recorded += attach_payment_session(borrowing, status_field)
+    return recorded
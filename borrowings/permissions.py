@@ -10,4 +10,4 @@ class IsBorrowerOrAdmin(permissions.BasePermission):
         if request.user.is_staff:
             return True
 
-        return obj.user == request.user
+        return obj.user_id == request.user.id
@@ -3,8 +3,10 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from books.models import Book
-from borrowings.models import Borrowing
-from payments.services import StripePaymentService
+from library_management.sparse_fields import SparseFieldsetSerializerMixin
+from borrowings.models import Borrowing, TrendingBook
+from borrowings.payment_sessions import AWAITING_SESSION
+from payments.models import Payment
 from users.models import User
 
 FINE_MULTIPLIER = 10
@@ -64,17 +66,15 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         return obj.user.email
 
     def get_book_details(self, obj):
-        book = obj.book
-        author_names = [
-            f"{author.first_name} {author.last_name}" for author in book.authors.all()
-        ]
-        return f"{book.title} by {', '.join(author_names)}"
+        return f"{obj.book.title} by {obj.book.author_display}"
 
     def get_session_id(self, obj):
-        return obj.session_id
+        payment = obj.get_payment(Payment.RENTAL)
+        return payment.session_id if payment else None
 
     def get_session_url(self, obj):
-        return obj.session_url
+        payment = obj.get_payment(Payment.RENTAL)
+        return payment.session_url if payment else None
 
     def get_payment_status(self, obj):
         return obj.payment_status
@@ -97,31 +97,17 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
 
             validated_data["amount_paid"] = total_fee
 
-            book.inventory -= 1
-            book.save()
-
-            borrowing = super().create(validated_data)
-
-            payment_service = StripePaymentService()
-            payment_data = {
-                "user_id": borrowing.user.id,
-                "amount": total_fee,
-                "book_name": borrowing.book.title,
-            }
-
-            payment_response = payment_service.create_payment_session(payment_data)
-            if payment_response["success"]:
-                borrowing.session_id = payment_response["session_id"]
-                borrowing.session_url = payment_response["session_url"]
-                borrowing.payment_status = "pending"
-                borrowing.save()
-            else:
-                raise ValidationError("Payment processing failed.")
+            if not Book.objects.check_out(book.id):
+                raise serializers.ValidationError(
+                    "Not enough inventory to borrow this book"
+                )
 
-            return borrowing
+            # The Stripe session is attached once this has committed.
+            validated_data["payment_status"] = AWAITING_SESSION
+            return super().create(validated_data)
 
 
-class BorrowingSerializer(serializers.ModelSerializer):
+class BorrowingSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     book = serializers.SerializerMethodField()
     payment_status = serializers.SerializerMethodField()
@@ -138,6 +124,11 @@ class BorrowingSerializer(serializers.ModelSerializer):
             "payment_status",
         ]
         validators = []
+        sparse_sources = {
+            "user": ["user__email"],
+            "book": ["book__title", "book__author_display"],
+            "payment_status": ["payment_status"],
+        }
 
     def validate(self, data):
         user = data.get("user")
@@ -152,11 +143,7 @@ class BorrowingSerializer(serializers.ModelSerializer):
         return obj.user.email
 
     def get_book(self, obj):
-        book = obj.book
-        author_names = [
-            f"{author.first_name} {author.last_name}" for author in book.authors.all()
-        ]
-        return f"{book.title} by {', '.join(author_names)}"
+        return f"{obj.book.title} by {obj.book.author_display}"
 
     def get_payment_status(self, obj):
         return obj.payment_status
@@ -212,17 +199,19 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
         return obj.user.email
 
     def get_book_details(self, obj):
-        book = obj.book
-        author_names = [
-            f"{author.first_name} {author.last_name}" for author in book.authors.all()
-        ]
-        return f"{book.title} by {', '.join(author_names)}"
+        return f"{obj.book.title} by {obj.book.author_display}"
+
+    def get_fine_payment(self, obj):
+        # Only a fine opens a payment session on return.
+        return obj.get_payment(Payment.FINE) if obj.fine_amount else None
 
     def get_session_id(self, obj):
-        return obj.session_id
+        payment = self.get_fine_payment(obj)
+        return payment.session_id if payment else None
 
     def get_session_url(self, obj):
-        return obj.session_url
+        payment = self.get_fine_payment(obj)
+        return payment.session_url if payment else None
 
     def get_fine_payment_status(self, obj):
         return obj.fine_payment_status
@@ -239,28 +228,19 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
                     instance.book.daily_fee, FINE_MULTIPLIER
                 )
                 if fine_amount > 0:
+                    # The Stripe session is attached once this has committed.
                     instance.fine_amount = fine_amount
-                    instance.fine_payment_status = "pending"
+                    instance.fine_payment_status = AWAITING_SESSION
                     instance.save()
 
-                    payment_service = StripePaymentService()
-                    payment_data = {
-                        "user_id": instance.user.id,
-                        "amount": fine_amount,
-                        "book_name": instance.book.title,
-                    }
-
-                    payment_response = payment_service.create_payment_session(
-                        payment_data
-                    )
+            return instance
 
-                    if payment_response["success"]:
-                        instance.session_id = payment_response["session_id"]
-                        instance.session_url = payment_response["session_url"]
 
-                        instance.fine_payment_status = "pending"
-                        instance.save()
-                    else:
-                        raise ValidationError("Fine payment processing failed.")
+class TrendingBookSerializer(serializers.ModelSerializer):
+    book = serializers.IntegerField(source="book_id")
+    title = serializers.CharField(source="book.title")
+    author_names = serializers.CharField(source="book.author_display")
 
-            return instance
+    class Meta:
+        model = TrendingBook
+        fields = ["rank", "book", "title", "author_names", "borrow_count"]
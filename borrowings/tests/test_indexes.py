@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from books.models import Book
+from borrowings.models import Borrowing
+from users.models import User
+
+
+class BorrowingIndexTest(TestCase):
+    """The hot borrowing lookups must be answered from an index, not a scan."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="pass"
+        )
+        self.book = Book.objects.create(title="Book", inventory=1, daily_fee=1)
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == "postgresql":
+            # Tiny test tables are cheaper to scan; make the planner show
+            # whether the index is usable at all.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn("Seq Scan", plan)
+        self.assertNotRegex(plan, r"SCAN borrowings_borrowing(?! USING)")
+
+    def test_active_borrowings_of_user(self):
+        # BorrowingCreateSerializer.validate
+        self.assertUsesIndex(
+            Borrowing.objects.filter(user=self.user, actual_return_date__isnull=True),
+            "borrowing_active_user_idx",
+        )
+
+    def test_overdue_borrowings(self):
+        # borrowings.tasks.check_overdue_borrowings
+        self.assertUsesIndex(
+            Borrowing.objects.filter(
+                expected_return_date__lte=timezone.now().date(),
+                actual_return_date__isnull=True,
+            ),
+            "borrowing_open_due_idx",
+        )
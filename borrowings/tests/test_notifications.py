@@ -1,20 +1,203 @@
-import unittest
-from unittest.mock import patch, MagicMock
+import asyncio
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-from borrowings.notifications import notify_new_borrowing
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
 
+from books.models import Book
+from borrowings import notifications
+from borrowings.models import Borrowing, NotificationOutbox
+from borrowings.notifications import (
+    MAX_ATTEMPTS,
+    claim_batch,
+    drain_outbox,
+    notify_new_borrowing,
+)
+from users.models import User
 
-class TestNotifyNewBorrowing(unittest.TestCase):
-    @patch("borrowings.notifications.send_notification")
-    async def test_notify_new_borrowing(self, mock_send_notification):
-        borrowing = MagicMock()
-        chat_id = "6976462510"
-        message = f"New borrowing created: {borrowing}"
 
-        await notify_new_borrowing(borrowing)
+class FakeBot:
+    """Stands in for ``telegram.Bot``; records messages and peak concurrency."""
 
-        mock_send_notification.assert_called_once_with(chat_id, message)
+    instances = []
 
+    def __init__(self, token, request=None):
+        self.sent = []
+        self.fail_texts = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        FakeBot.instances.append(self)
 
-if __name__ == "__main__":
-    unittest.main()
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def send_message(self, chat_id, text):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        if text in self.fail_texts:
+            raise RuntimeError("Telegram is down")
+        self.sent.append((chat_id, text))
+
+
+@override_settings(TELEGRAM_BOT_TOKEN="token", TELEGRAM_CHAT_ID="42")
+@mock.patch("borrowings.notifications.Bot", FakeBot)
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        FakeBot.instances = []
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="testpass"
+        )
+        self.book = Book.objects.create(title="Hamlet", daily_fee=10, inventory=5)
+
+    def enqueue(self, count):
+        return [
+            NotificationOutbox.objects.create(chat_id="42", text=f"message {i}")
+            for i in range(count)
+        ]
+
+    @mock.patch("payments.services.StripePaymentService.create_payment_session")
+    def test_create_borrowing_writes_outbox_row(self, mock_create_payment_session):
+        mock_create_payment_session.return_value = {
+            "success": True,
+            "session_id": "test_session_id",
+            "session_url": "https://test_url.com",
+        }
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post(
+            reverse("borrowing-create"),
+            {
+                "user": self.user.id,
+                "book": self.book.id,
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=1),
+                "amount_paid": 10,
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        notification = NotificationOutbox.objects.get()
+        self.assertEqual(notification.chat_id, "42")
+        self.assertEqual(
+            notification.text,
+            "New borrowing created: testuser@example.com borrows Hamlet",
+        )
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(FakeBot.instances, [])
+
+    def test_message_uses_denormalized_authors(self):
+        self.book.author_display = "William Shakespeare"
+        borrowing = Borrowing(user=self.user, book=self.book)
+
+        with self.assertNumQueries(1):
+            notification = notify_new_borrowing(borrowing)
+
+        self.assertEqual(
+            notification.text,
+            "New borrowing created: testuser@example.com borrows Hamlet "
+            "by William Shakespeare",
+        )
+
+    def test_rolled_back_borrowing_is_not_announced(self):
+        borrowing = Borrowing(user=self.user, book=self.book)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            notify_new_borrowing(borrowing)
+            raise RuntimeError
+
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_drain_sends_batches_over_one_bot(self):
+        self.enqueue(25)
+
+        stats = drain_outbox(batch_size=10, concurrency=4)
+
+        self.assertEqual(stats, {"sent": 25, "failed": 0})
+        (bot,) = FakeBot.instances
+        self.assertEqual(len(bot.sent), 25)
+        self.assertLessEqual(bot.max_in_flight, 4)
+        self.assertFalse(NotificationOutbox.objects.filter(sent_at__isnull=True))
+        self.assertEqual(drain_outbox(), {"sent": 0, "failed": 0})
+        self.assertEqual(len(FakeBot.instances), 1)
+
+    @override_settings(TELEGRAM_BOT_TOKEN=None)
+    def test_empty_outbox_opens_no_bot(self):
+        self.assertEqual(drain_outbox(), {"sent": 0, "failed": 0})
+        self.assertEqual(FakeBot.instances, [])
+
+    def test_claimed_rows_are_not_sent_twice(self):
+        claimed, expired, free = self.enqueue(3)
+        self.assertEqual(claim_batch(0, 1), [claimed])
+        NotificationOutbox.objects.filter(id=expired.id).update(
+            claimed_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        stats = drain_outbox()
+
+        self.assertEqual(stats, {"sent": 2, "failed": 0})
+        (bot,) = FakeBot.instances
+        self.assertEqual([text for _, text in bot.sent], [expired.text, free.text])
+        claimed.refresh_from_db()
+        self.assertIsNone(claimed.sent_at)
+
+    def test_failed_messages_are_retried_until_max_attempts(self):
+        ok, broken = self.enqueue(2)
+        original_init = FakeBot.__init__
+
+        def failing_init(bot, *args, **kwargs):
+            original_init(bot, *args, **kwargs)
+            bot.fail_texts.add(broken.text)
+
+        with mock.patch.object(FakeBot, "__init__", failing_init), self.assertLogs(
+            "borrowings.notifications", "WARNING"
+        ):
+            for _ in range(MAX_ATTEMPTS + 1):
+                drain_outbox()
+
+        ok.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertIsNotNone(ok.sent_at)
+        self.assertEqual(ok.attempts, 1)
+        self.assertIsNone(broken.sent_at)
+        self.assertEqual(broken.attempts, MAX_ATTEMPTS)
+
+    def test_send_notifications_command(self):
+        self.enqueue(3)
+        out = StringIO()
+
+        call_command("send_notifications", "--batch-size", "2", stdout=out)
+
+        self.assertIn("Sent 3 notifications, 0 failed", out.getvalue())
+
+    def test_worker_reuses_one_bot(self):
+        self.enqueue(2)
+        drain = notifications.adrain_outbox
+        bots = []
+
+        async def drain_twice(*args, bot):
+            bots.append(bot)
+            if len(bots) > 2:
+                raise KeyboardInterrupt
+            return await drain(*args, bot=bot)
+
+        with mock.patch.object(notifications, "adrain_outbox", drain_twice):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("send_notifications", "--interval", "0.01")
+
+        (bot,) = FakeBot.instances
+        self.assertEqual(bots, [bot] * 3)
+        self.assertEqual(len(bot.sent), 2)
+        self.assertFalse(NotificationOutbox.objects.filter(sent_at__isnull=True))
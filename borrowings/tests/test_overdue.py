@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+from unittest import mock
+from unittest.mock import MagicMock
+
+from django.test import TestCase, override_settings
+
+from books.models import Book
+from borrowings.models import Borrowing
+from borrowings import overdue
+from borrowings.overdue import (
+    NOTHING_OVERDUE,
+    build_digests,
+    get_session,
+    notify_overdue,
+)
+from users.models import User
+
+TODAY = date(2024, 6, 30)
+
+
+@override_settings(TELEGRAM_BOT_TOKEN="token", TELEGRAM_CHAT_ID="42")
+class OverdueNotificationTest(TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.book = Book.objects.create(title="Book", inventory=10, daily_fee=1)
+
+    def borrow(self, count, days_overdue=1):
+        for i in range(count):
+            user = User.objects.create_user(
+                email=f"reader{i}@example.com", password="password"
+            )
+            Borrowing.objects.create(
+                user=user,
+                book=self.book,
+                expected_return_date=TODAY - timedelta(days=days_overdue),
+            )
+
+    def sent_texts(self):
+        return [
+            call.kwargs["data"]["text"] for call in self.session.post.call_args_list
+        ]
+
+    def test_overdue_borrowings_are_sent_as_one_digest(self):
+        self.borrow(3)
+        Borrowing.objects.create(
+            user=User.objects.create_user(email="ontime@example.com", password="x"),
+            book=self.book,
+            expected_return_date=TODAY + timedelta(days=1),
+        )
+
+        with self.assertNumQueries(1):
+            stats = notify_overdue(TODAY, session=self.session)
+
+        self.assertEqual(stats["overdue"], 3)
+        self.assertEqual(stats["messages"], 1)
+        (text,) = self.sent_texts()
+        self.assertEqual(text.count("is overdue"), 3)
+        self.assertNotIn("ontime@example.com", text)
+        call = self.session.post.call_args
+        self.assertEqual(call.args[0], "https://api.telegram.org/bottoken/sendMessage")
+        self.assertEqual(call.kwargs["data"]["chat_id"], "42")
+        self.assertIsNotNone(call.kwargs["timeout"])
+
+    def test_nothing_overdue(self):
+        self.borrow(1, days_overdue=-1)
+
+        stats = notify_overdue(TODAY, session=self.session)
+
+        self.assertEqual(stats["overdue"], 0)
+        self.assertEqual(self.sent_texts(), [NOTHING_OVERDUE])
+
+    def test_failed_send_raises(self):
+        self.borrow(1)
+        self.session.post.return_value.raise_for_status.side_effect = Exception
+
+        with self.assertRaises(Exception):
+            notify_overdue(TODAY, session=self.session)
+
+    def test_only_undelivered_sends_are_retried(self):
+        with mock.patch.object(overdue, "_session", None):
+            retry = get_session().get_adapter("https://api.telegram.org").max_retries
+
+        self.assertTrue(retry.is_retry("POST", 429, has_retry_after=True))
+        self.assertFalse(retry.is_retry("POST", 500))
+        self.assertFalse(retry.is_retry("POST", 503))
+        self.assertEqual(retry.read, 0)
+        self.assertGreater(retry.connect, 0)
+
+    def test_build_digests_respects_limit(self):
+        entries = ["a" * 40, "b" * 40, "c" * 40, "d" * 200]
+
+        digests = list(build_digests(entries, limit=100))
+
+        self.assertEqual(digests, ["a" * 40 + "\n\n" + "b" * 40, "c" * 40, "d" * 100])
@@ -0,0 +1,227 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books.models import Book
+from borrowings.models import Borrowing
+from borrowings.payment_sessions import (
+    AWAITING_SESSION,
+    MAX_SESSION_ATTEMPTS,
+    PAYMENT_DEFERRED,
+    RETRY_BASE,
+    attach_payment_session,
+    create_missing_payment_sessions,
+)
+from borrowings.tasks import sweep_payment_sessions
+from payments.models import Payment
+from payments.services import CircuitBreaker
+from users.models import User
+
+SESSION = {
+    "success": True,
+    "session_id": "test_session_id",
+    "session_url": "https://test_url.com",
+}
+FAILED = {"success": False, "error": "Stripe is down"}
+DEFERRED = {"success": False, "deferred": True, "error": "Gateway unavailable."}
+
+
+@mock.patch("payments.services.StripePaymentService.create_payment_session")
+class PaymentSessionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(title="Hamlet", daily_fee=10, inventory=5)
+
+    def create_borrowing(self):
+        return self.client.post(
+            reverse("borrowing-create"),
+            {
+                "user": self.user.id,
+                "book": self.book.id,
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=1),
+                "amount_paid": 10,
+            },
+            format="json",
+        )
+
+    def test_session_is_created_after_the_borrowing_commits(self, mock_session):
+        # TestCase wraps every test in atomic blocks of its own; anything
+        # deeper means Stripe was called inside the checkout transaction.
+        outer_blocks = len(connection.atomic_blocks)
+        depth = []
+
+        def create_payment_session(payment_data):
+            depth.append(len(connection.atomic_blocks))
+            self.assertEqual(Borrowing.objects.get().payment_status, AWAITING_SESSION)
+            return SESSION
+
+        mock_session.side_effect = create_payment_session
+
+        response = self.create_borrowing()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(depth, [outer_blocks])
+        self.assertEqual(mock_session.call_args.args[0]["amount"], 10)
+        self.assertEqual(response.data["session_id"], "test_session_id")
+        self.assertEqual(response.data["payment_status"], "pending")
+        borrowing = Borrowing.objects.get()
+        self.assertEqual(borrowing.payment_status, "pending")
+        payment = borrowing.payments.get()
+        self.assertEqual(payment.purpose, Payment.RENTAL)
+        self.assertEqual(payment.amount, 10)
+        self.assertEqual(payment.session_url, "https://test_url.com")
+
+    def test_failed_session_is_swept_later(self, mock_session):
+        mock_session.return_value = FAILED
+        with self.assertLogs("borrowings.payment_sessions", "WARNING"):
+            response = self.create_borrowing()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["payment_status"], AWAITING_SESSION)
+        self.assertIsNone(response.data["session_id"])
+
+        borrowing = Borrowing.objects.get()
+        self.assertEqual(borrowing.session_attempts, 1)
+        self.assertGreater(borrowing.session_retry_at, timezone.now())
+        self.assertEqual(create_missing_payment_sessions(), 0)
+        Borrowing.objects.update(session_retry_at=timezone.now())
+
+        mock_session.return_value = SESSION
+        self.assertEqual(sweep_payment_sessions(), 1)
+        borrowing = Borrowing.objects.get()
+        self.assertEqual(borrowing.payment_status, "pending")
+        self.assertEqual(borrowing.payments.get().session_id, "test_session_id")
+        self.assertEqual(create_missing_payment_sessions(), 0)
+        # Same idempotency key, so the retry must repeat the params exactly.
+        first, retry = mock_session.call_args_list
+        self.assertEqual(retry, first)
+
+    def test_failing_rows_back_off_and_give_up(self, mock_session):
+        mock_session.return_value = FAILED
+        failing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today(),
+            amount_paid=0,
+            payment_status=AWAITING_SESSION,
+        )
+        newer = Borrowing.objects.create(
+            user=User.objects.create_user(email="other@example.com"),
+            book=self.book,
+            expected_return_date=date.today(),
+            amount_paid=7,
+            payment_status=AWAITING_SESSION,
+        )
+        Borrowing.objects.filter(id=failing.id).update(session_attempts=3)
+
+        # The row that never failed goes first, even with a later id.
+        with self.assertLogs("borrowings.payment_sessions", "WARNING"):
+            create_missing_payment_sessions(limit=1)
+        self.assertEqual(mock_session.call_args.args[0]["borrowing_id"], newer.id)
+
+        # Every retry waits longer, until the row is given up on.
+        Borrowing.objects.filter(id=newer.id).update(
+            session_retry_at=timezone.now() + RETRY_BASE
+        )
+        delays = []
+        with self.assertLogs("borrowings.payment_sessions", "WARNING") as logs:
+            while failing.session_attempts < MAX_SESSION_ATTEMPTS:
+                Borrowing.objects.filter(id=failing.id).update(session_retry_at=None)
+                before = timezone.now()
+                create_missing_payment_sessions()
+                failing.refresh_from_db()
+                delays.append(failing.session_retry_at - before)
+        self.assertIn("Giving up", logs.output[-1])
+        self.assertEqual(delays, sorted(delays))
+        self.assertGreater(delays[-1], delays[0])
+
+        calls = mock_session.call_count
+        Borrowing.objects.filter(id=failing.id).update(session_retry_at=None)
+        create_missing_payment_sessions()
+        self.assertEqual(mock_session.call_count, calls)
+
+    def test_recorded_session_is_not_overwritten(self, mock_session):
+        mock_session.return_value = SESSION
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            expected_return_date=date.today(),
+            amount_paid=7,
+            payment_status=AWAITING_SESSION,
+        )
+        stale = Borrowing.objects.select_related("book").get(id=borrowing.id)
+        self.assertTrue(attach_payment_session(borrowing))
+
+        mock_session.return_value = {**SESSION, "session_id": "second_session_id"}
+        self.assertFalse(attach_payment_session(stale))
+
+        self.assertEqual(
+            list(borrowing.payments.values_list("session_id", flat=True)),
+            ["test_session_id"],
+        )
+
+    def test_fine_session_is_created_after_the_return_commits(self, mock_session):
+        mock_session.return_value = FAILED
+        borrowing = Borrowing.objects.create(
+            user=self.user,
+            book=self.book,
+            borrow_date=date.today() - timedelta(days=5),
+            expected_return_date=date.today() - timedelta(days=3),
+        )
+
+        with self.assertLogs("borrowings.payment_sessions", "WARNING"):
+            response = self.client.patch(
+                reverse("borrowing-return", kwargs={"pk": borrowing.id}),
+                {"actual_return_date": date.today()},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        borrowing.refresh_from_db()
+        self.assertEqual(borrowing.actual_return_date, date.today())
+        self.assertEqual(borrowing.fine_payment_status, AWAITING_SESSION)
+
+        self.assertEqual(borrowing.fine_session_attempts, 1)
+        Borrowing.objects.update(fine_session_retry_at=None)
+
+        mock_session.return_value = SESSION
+        self.assertEqual(create_missing_payment_sessions(), 1)
+        borrowing.refresh_from_db()
+        self.assertEqual(borrowing.fine_payment_status, "pending")
+        self.assertEqual(borrowing.payments.get().purpose, Payment.FINE)
+        payment_data = mock_session.call_args.args[0]
+        self.assertEqual(payment_data["amount"], 300)
+        self.assertEqual(payment_data["borrowing_id"], borrowing.id)
+        self.assertEqual(payment_data["purpose"], "fine")
+
+    def test_open_breaker_defers_the_session(self, mock_session):
+        mock_session.return_value = DEFERRED
+
+        response = self.create_borrowing()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["payment_status"], PAYMENT_DEFERRED)
+        self.assertEqual(Borrowing.objects.get().payment_status, PAYMENT_DEFERRED)
+
+        open_breaker = CircuitBreaker(min_calls=1)
+        open_breaker.record(False, 0)
+        with mock.patch("borrowings.payment_sessions.breaker", open_breaker):
+            self.assertEqual(create_missing_payment_sessions(), 0)
+        self.assertEqual(mock_session.call_count, 1)
+
+        mock_session.return_value = SESSION
+        self.assertEqual(create_missing_payment_sessions(), 1)
+        borrowing = Borrowing.objects.get()
+        self.assertEqual(borrowing.payment_status, "pending")
+        self.assertEqual(borrowing.payments.get().session_id, "test_session_id")
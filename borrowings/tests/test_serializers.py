@@ -5,7 +5,11 @@ from rest_framework.exceptions import ValidationError
 from users.models import User
 from books.models import Book
 from borrowings.models import Borrowing
-from borrowings.serializers import BorrowingCreateSerializer, BorrowingReturnSerializer
+from borrowings.serializers import (
+    BorrowingCreateSerializer,
+    BorrowingReturnSerializer,
+    BorrowingSerializer,
+)
 
 
 class BorrowingCreateSerializerTestCase(TestCase):
@@ -79,3 +83,20 @@ class BorrowingReturnSerializerTestCase(TestCase):
         self.assertTrue(serializer.is_valid())
         borrowing = serializer.save()
         self.assertIsNone(borrowing.fine_payment_status)
+
+
+class BorrowingSerializerTestCase(TestCase):
+    def test_book_reads_author_display(self):
+        user = User.objects.create(email="test@example.com")
+        book = Book.objects.create(title="Test Book", inventory=1, daily_fee=1.0)
+        book.authors.create(first_name="John", last_name="Doe")
+        borrowing = Borrowing.objects.select_related("user", "book").get(
+            id=Borrowing.objects.create(
+                user=user,
+                book=book,
+                expected_return_date=timezone.now().date(),
+            ).id
+        )
+        with self.assertNumQueries(0):
+            data = BorrowingSerializer(borrowing).data
+        self.assertEqual(data["book"], "Test Book by John Doe")
@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books.models import Book
+from borrowings.models import (
+    BookBorrowDailyCount,
+    Borrowing,
+    TrendingBook,
+    TrendingState,
+)
+from borrowings.tasks import refresh_trending_books
+from borrowings.trending import GAP_WINDOW, refresh_trending
+from users.models import User
+
+TODAY = date(2024, 6, 30)
+
+
+class TrendingBooksTest(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(title=f"Book {i}", inventory=10, daily_fee=1)
+            for i in range(3)
+        ]
+        self.readers = 0
+
+    def borrow(self, book, days_ago=0, times=1, **fields):
+        for _ in range(times):
+            self.readers += 1
+            reader = User.objects.create_user(
+                email=f"reader{self.readers}@example.com", password="password"
+            )
+            Borrowing.objects.create(
+                **fields,
+                user=reader,
+                book=book,
+                borrow_date=TODAY - timedelta(days=days_ago),
+                expected_return_date=TODAY + timedelta(days=7),
+            )
+
+    def ranking(self, window):
+        return list(
+            TrendingBook.objects.filter(window=window)
+            .order_by("rank")
+            .values_list("book__title", "borrow_count")
+        )
+
+    def test_ranks_each_window(self):
+        self.borrow(self.books[0], days_ago=1, times=2)
+        self.borrow(self.books[1], days_ago=20, times=3)
+        self.borrow(self.books[2], days_ago=200, times=4)
+
+        self.assertEqual(refresh_trending(TODAY), 9)
+
+        self.assertEqual(self.ranking(7), [("Book 0", 2)])
+        self.assertEqual(self.ranking(30), [("Book 1", 3), ("Book 0", 2)])
+        self.assertEqual(
+            self.ranking(365), [("Book 2", 4), ("Book 1", 3), ("Book 0", 2)]
+        )
+
+    def test_only_reads_new_borrowings(self):
+        self.borrow(self.books[0], times=2)
+        refresh_trending(TODAY)
+        # Counted borrowings are not read again, even if they go away.
+        Borrowing.objects.all().delete()
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+
+        self.assertEqual(refresh_trending(TODAY), 2)
+        self.assertEqual(self.ranking(7), [("Book 0", 3), ("Book 1", 1)])
+        self.assertEqual(refresh_trending(TODAY), 0)
+
+    def test_late_commits_below_the_watermark_are_counted(self):
+        self.borrow(self.books[0], id=1)
+        self.borrow(self.books[0], id=4)
+        self.assertEqual(refresh_trending(TODAY), 2)
+
+        # 2 committed after 4 had been read; 3 never does.
+        self.borrow(self.books[1], id=2)
+        self.assertEqual(refresh_trending(TODAY), 1)
+        self.assertEqual(refresh_trending(TODAY), 0)
+        self.assertEqual(self.ranking(7), [("Book 0", 2), ("Book 1", 1)])
+        self.assertEqual(TrendingState.objects.get().missing_ids, [3])
+
+        # Once far enough behind, the missing id is given up on.
+        self.borrow(self.books[2], id=3 + GAP_WINDOW)
+        refresh_trending(TODAY)
+        self.assertNotIn(3, TrendingState.objects.get().missing_ids)
+
+    def test_windows_roll_without_new_borrowings(self):
+        self.borrow(self.books[0], days_ago=5)
+        refresh_trending(TODAY)
+        refresh_trending(TODAY + timedelta(days=3))
+        self.assertEqual(self.ranking(7), [])
+        self.assertEqual(self.ranking(30), [("Book 0", 1)])
+
+    def test_old_daily_counts_are_dropped(self):
+        self.borrow(self.books[0], days_ago=400)
+        refresh_trending(TODAY)
+        self.assertFalse(BookBorrowDailyCount.objects.exists())
+
+    def test_task(self):
+        self.borrow(self.books[0])
+        self.assertEqual(refresh_trending_books(), 1)
+
+
+class TrendingBookListAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email="testuser@example.com", password="pass")
+        )
+        for rank in range(1, 6):
+            book = Book.objects.create(title=f"Book {rank}", inventory=1, daily_fee=1)
+            TrendingBook.objects.create(
+                window=30, rank=rank, book=book, borrow_count=10 - rank
+            )
+
+    def test_pages_follow_rank(self):
+        url = reverse("borrowing-trending") + "?window=30&page_size=2"
+        titles = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            titles += [row["title"] for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(titles, [f"Book {rank}" for rank in range(1, 6)])
+
+    def test_serialized_row(self):
+        response = self.client.get(reverse("borrowing-trending"), {"window": 30})
+        self.assertEqual(
+            response.data["results"][0],
+            {
+                "rank": 1,
+                "book": Book.objects.get(title="Book 1").id,
+                "title": "Book 1",
+                "author_names": "",
+                "borrow_count": 9,
+            },
+        )
+
+    def test_default_window_and_invalid_window(self):
+        response = self.client.get(reverse("borrowing-trending"))
+        self.assertEqual(response.data["results"], [])
+        response = self.client.get(reverse("borrowing-trending"), {"window": 14})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
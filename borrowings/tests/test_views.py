@@ -5,7 +5,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
-from books.models import Book
+from books.models import Author, Book
 from borrowings.models import Borrowing
 from users.models import User
 
@@ -57,8 +57,49 @@ class BorrowingAPITestCase(APITestCase):
         borrowing = Borrowing.objects.first()
         self.assertEqual(borrowing.user, self.user)
         self.assertEqual(borrowing.book, self.book)
-        self.assertEqual(borrowing.session_id, "test_session_id")
-        self.assertEqual(borrowing.session_url, "https://test_url.com")
+        payment = borrowing.payments.get()
+        self.assertEqual(payment.session_id, "test_session_id")
+        self.assertEqual(payment.session_url, "https://test_url.com")
+        self.assertEqual(response.data["session_id"], "test_session_id")
+
+    @mock.patch(
+        "payments.services.StripePaymentService.create_payment_session",
+        return_value={
+            "success": True,
+            "session_id": "test_session_id",
+            "session_url": "https://test_url.com",
+        },
+    )
+    def test_create_borrowing_takes_one_copy(self, mock_create_payment_session):
+        data = {
+            "user": self.user.id,
+            "book": self.book.id,
+            "borrow_date": date.today(),
+            "expected_return_date": date.today() + timedelta(days=1),
+            "amount_paid": 10,
+        }
+        response = self.client.post(self.borrowing_url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+
+    @mock.patch("payments.services.StripePaymentService.create_payment_session")
+    def test_create_borrowing_without_inventory(self, mock_create_payment_session):
+        data = {
+            "user": self.user.id,
+            "book": self.book.id,
+            "borrow_date": date.today(),
+            "expected_return_date": date.today() + timedelta(days=1),
+            "amount_paid": 10,
+        }
+        # Another checkout takes the last copy after the request was validated.
+        with mock.patch.object(Book.objects, "check_out", return_value=False):
+            response = self.client.post(self.borrowing_url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Borrowing.objects.count(), 0)
+        mock_create_payment_session.assert_not_called()
 
     def test_list_borrowings(self):
         Borrowing.objects.create(
@@ -71,7 +112,50 @@ class BorrowingAPITestCase(APITestCase):
 
         response = self.client.get(self.borrowing_list_url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_list_borrowings_paginates_by_expected_return_date(self):
+        return_dates = [3, 1, 2, 1, 1]
+        for days in return_dates:
+            book = Book.objects.create(title="Book", daily_fee=1, inventory=1)
+            Borrowing.objects.create(
+                user=self.user,
+                book=book,
+                borrow_date=date.today(),
+                expected_return_date=date.today() + timedelta(days=days),
+            )
+
+        ids = []
+        url = self.borrowing_list_url + "?page_size=2"
+        while url:
+            response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(borrowing["id"] for borrowing in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(
+            Borrowing.objects.order_by("expected_return_date", "id").values_list(
+                "id", flat=True
+            )
+        )
+        self.assertEqual(ids, expected)
+
+    def test_list_borrowings_with_sparse_fields(self):
+        for i in range(3):
+            book = Book.objects.create(title=f"Book {i}", daily_fee=1, inventory=1)
+            Borrowing.objects.create(
+                user=self.user,
+                book=book,
+                expected_return_date=date.today() + timedelta(days=i),
+            )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.borrowing_list_url, {"fields": "id,book"}, format="json"
+            )
+        first = response.data["results"][0]
+        self.assertEqual(set(first), {"id", "book"})
+        self.assertEqual(first["book"], "Book 0 by ")
 
     def test_retrieve_borrowing_detail(self):
         borrowing = Borrowing.objects.create(
@@ -88,8 +172,16 @@ class BorrowingAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["id"], borrowing.id)
 
+    @mock.patch(
+        "payments.services.StripePaymentService.create_payment_session",
+        return_value={
+            "success": True,
+            "session_id": "fine_session_id",
+            "session_url": "https://test_url.com",
+        },
+    )
     @mock.patch("payments.services.calculate_amount", return_value=40)
-    def test_return_borrowing(self, mock_calculate_amount):
+    def test_return_borrowing(self, mock_calculate_amount, mock_create_payment_session):
         borrowing = Borrowing.objects.create(
             user=self.user,
             book=self.book,
@@ -154,3 +246,73 @@ class BorrowingAPITestCase(APITestCase):
         self.assertIn(
             "The fields user, book must make a unique set.", str(response.data)
         )
+
+
+class BorrowingQueryBudgetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_borrowings(self, count):
+        author = Author.objects.create(first_name="John", last_name="Doe")
+        borrowings = []
+        for i in range(count):
+            book = Book.objects.create(title=f"Book {i}", daily_fee=1, inventory=1)
+            book.authors.add(author)
+            borrowings.append(
+                Borrowing.objects.create(
+                    user=self.user,
+                    book=book,
+                    expected_return_date=date.today() + timedelta(days=1),
+                )
+            )
+        return borrowings
+
+    def test_list_query_count_does_not_grow_with_rows(self):
+        self.create_borrowings(20)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("borrowing-list"), {"page_size": 20})
+        self.assertEqual(len(response.data["results"]), 20)
+        self.assertEqual(response.data["results"][0]["book"], "Book 0 by John Doe")
+
+    def test_detail_takes_one_query(self):
+        borrowing = self.create_borrowings(1)[0]
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("borrowing-detail", kwargs={"pk": borrowing.pk})
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["user"], self.user.email)
+
+    def test_sparse_detail_takes_one_query(self):
+        borrowing = self.create_borrowings(1)[0]
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("borrowing-detail", kwargs={"pk": borrowing.pk}),
+                {"fields": "id"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"id": borrowing.pk})
+
+    def test_detail_of_another_user_is_forbidden(self):
+        borrowing = self.create_borrowings(1)[0]
+        other = User.objects.create_user(email="other@example.com", password="pass")
+        self.client.force_authenticate(user=other)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("borrowing-detail", kwargs={"pk": borrowing.pk})
+            )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_return_without_fine_query_count(self):
+        borrowing = self.create_borrowings(1)[0]
+        with self.assertNumQueries(4):
+            response = self.client.patch(
+                reverse("borrowing-return", kwargs={"pk": borrowing.pk}),
+                {"actual_return_date": borrowing.expected_return_date},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["book_details"], "Book 0 by John Doe")
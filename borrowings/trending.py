@@ -0,0 +1,130 @@
+"""
+Precomputed "most borrowed books" rankings over rolling windows.
+
+Borrowings are folded into per-book daily counts once, reading only the rows
+created since the previous refresh (tracked by id in ``TrendingState``).
+Ids are handed out before their transaction commits, so a lower id can
+appear after a higher one was read: the ids below the watermark that were
+missing are remembered and read again on the following refreshes, until
+they fall ``GAP_WINDOW`` ids behind (a rollback or a deleted row never
+shows up). The rankings are then rebuilt from the daily counts, which stay
+small: at most one row per book and day of the longest window.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from borrowings.models import (
+    BookBorrowDailyCount,
+    Borrowing,
+    TrendingBook,
+    TrendingState,
+)
+
+WINDOWS = [window for window, _ in TrendingBook.WINDOW_CHOICES]
+# How far behind the watermark a missing id is still waited for.
+GAP_WINDOW = 1000
+
+
+def get_limit():
+    return getattr(settings, "TRENDING_BOOKS_LIMIT", 100)
+
+
+def count_new_borrowings(state):
+    """
+    Add borrowings above the state's watermark, and those that were missing
+    below it, to the daily counts.
+    """
+    watermark = state.last_borrowing_id
+    last_id = max(
+        Borrowing.objects.aggregate(last_id=Max("id"))["last_id"] or 0, watermark
+    )
+    if last_id == watermark and not state.missing_ids:
+        return 0
+
+    seen = set()
+    new_counts = Counter()
+    rows = Borrowing.objects.filter(
+        Q(id__gt=watermark, id__lte=last_id) | Q(id__in=state.missing_ids)
+    ).values_list("id", "book_id", "borrow_date")
+    for borrowing_id, book_id, borrow_date in rows:
+        seen.add(borrowing_id)
+        new_counts[book_id, borrow_date] += 1
+
+    oldest = last_id - GAP_WINDOW
+    state.missing_ids = [
+        borrowing_id
+        for borrowing_id in (
+            *state.missing_ids,
+            *range(max(watermark, oldest) + 1, last_id + 1),
+        )
+        if borrowing_id > oldest and borrowing_id not in seen
+    ]
+    state.last_borrowing_id = last_id
+    if not new_counts:
+        return 0
+
+    counted = sum(new_counts.values())
+    existing = BookBorrowDailyCount.objects.filter(
+        book_id__in={book_id for book_id, _ in new_counts},
+        day__in={day for _, day in new_counts},
+    ).values_list("book_id", "day", "count")
+    for book_id, day, count in existing:
+        if (book_id, day) in new_counts:
+            new_counts[book_id, day] += count
+
+    BookBorrowDailyCount.objects.bulk_create(
+        [
+            BookBorrowDailyCount(book_id=book_id, day=day, count=count)
+            for (book_id, day), count in new_counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["book", "day"],
+        update_fields=["count"],
+    )
+    return counted
+
+
+def rank_window(window, today, limit):
+    totals = (
+        BookBorrowDailyCount.objects.filter(day__gt=today - timedelta(days=window))
+        .values("book_id")
+        .annotate(total=Sum("count"))
+        .order_by("-total", "book_id")[:limit]
+    )
+    TrendingBook.objects.filter(window=window).delete()
+    TrendingBook.objects.bulk_create(
+        TrendingBook(
+            window=window,
+            rank=rank,
+            book_id=row["book_id"],
+            borrow_count=row["total"],
+        )
+        for rank, row in enumerate(totals, start=1)
+    )
+
+
+@transaction.atomic
+def refresh_trending(today=None):
+    """Fold in new borrowings and rebuild every window; returns how many were new."""
+    today = today or timezone.localdate()
+    state, _ = TrendingState.objects.get_or_create(pk=1)
+    # Lock the state row so overlapping runs cannot count a borrowing twice.
+    state = TrendingState.objects.select_for_update().get(pk=state.pk)
+
+    counted = count_new_borrowings(state)
+    BookBorrowDailyCount.objects.filter(
+        day__lte=today - timedelta(days=max(WINDOWS))
+    ).delete()
+    limit = get_limit()
+    for window in WINDOWS:
+        rank_window(window, today, limit)
+
+    state.refreshed_at = timezone.now()
+    state.save()
+    return counted
@@ -4,6 +4,7 @@ from borrowings.views import (
     BorrowingListAPIView,
     BorrowingDetailAPIView,
     BorrowingReturnAPIView,
+    TrendingBookListAPIView,
 )
 
 urlpatterns = [
@@ -11,4 +12,5 @@ urlpatterns = [
     path("<int:pk>/", BorrowingDetailAPIView.as_view(), name="borrowing-detail"),
     path("<int:pk>/return/", BorrowingReturnAPIView.as_view(), name="borrowing-return"),
     path("create/", BorrowingCreateAPIView.as_view(), name="borrowing-create"),
+    path("trending/", TrendingBookListAPIView.as_view(), name="borrowing-trending"),
 ]
@@ -7,15 +7,23 @@ from rest_framework import generics, serializers, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, TrendingBook
+from library_management.sparse_fields import SparseFieldsetViewMixin
 from borrowings.notifications import notify_new_borrowing
+from borrowings.payment_sessions import (
+    AWAITING_SESSION,
+    CHECKOUT,
+    FINE,
+    attach_payment_session,
+)
+from borrowings.pagination import BorrowingPagination, TrendingPagination
 from borrowings.permissions import IsBorrowerOrAdmin
 from borrowings.serializers import (
     BorrowingSerializer,
     BorrowingCreateSerializer,
     BorrowingReturnSerializer,
+    TrendingBookSerializer,
 )
-from payments.services import StripePaymentService, calculate_amount
 
 stripe_api_key = os.getenv("STRIPE_API_KEY")
 
@@ -34,46 +42,26 @@ class BorrowingCreateAPIView(generics.CreateAPIView):
         responses={201: BorrowingCreateSerializer},
         request=BorrowingCreateSerializer,
     )
-    @transaction.atomic
     def perform_create(self, serializer):
         logger.info("Performing create operation...")
 
-        instance = serializer.save()
-
-        if instance.book.inventory < 1:
-            raise serializers.ValidationError(
-                "Not enough inventory to borrow this book"
-            )
-        instance.book.inventory -= 1
-        instance.book.save()
-        logger.info(f"Book inventory updated. New inventory: {instance.book.inventory}")
-
-        payment_service = StripePaymentService()
-        payment_data = {
-            "user_id": instance.user.id,
-            "amount": calculate_amount(instance),
-            "book_name": instance.book.title,
-        }
-        payment_response = payment_service.create_payment_session(payment_data)
-
-        if payment_response["success"]:
-            instance.session_id = payment_response["session_id"]
-            instance.session_url = payment_response["session_url"]
-            instance.save()
+        # The serializer takes the copy off the inventory.
+        with transaction.atomic():
+            instance = serializer.save()
+            # Sent by the outbox worker once this transaction commits.
             notify_new_borrowing(instance)
-            return Response(
-                {"borrowing": serializer.data}, status=status.HTTP_201_CREATED
-            )
-        else:
-            return Response(
-                {"error": "Payment processing failed"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        logger.info(f"Book {instance.book_id} checked out.")
 
+        # Stripe is called with no transaction open. If it fails, the
+        # borrowing stays "awaiting_session" (or "deferred" while the
+        # gateway's breaker is open) for the sweeper to retry.
+        attach_payment_session(instance, CHECKOUT)
 
-class BorrowingListAPIView(generics.ListAPIView):
+
+class BorrowingListAPIView(SparseFieldsetViewMixin, generics.ListAPIView):
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BorrowingPagination
 
     @extend_schema(
         summary="List borrowings",
@@ -98,7 +86,7 @@ class BorrowingListAPIView(generics.ListAPIView):
     def get_queryset(self):
         user_id = self.request.query_params.get("user_id")
         is_active = self.request.query_params.get("is_active")
-        queryset = Borrowing.objects.all()
+        queryset = Borrowing.objects.select_related("user", "book")
 
         if user_id:
             queryset = queryset.filter(user_id=user_id)
@@ -107,13 +95,17 @@ class BorrowingListAPIView(generics.ListAPIView):
             is_active_bool = is_active.lower() == "true"
             queryset = queryset.filter(actual_return_date__isnull=is_active_bool)
 
-        return queryset
+        return self.sparse_queryset(queryset)
 
 
-class BorrowingDetailAPIView(generics.RetrieveAPIView):
-    queryset = Borrowing.objects.all()
+class BorrowingDetailAPIView(SparseFieldsetViewMixin, generics.RetrieveAPIView):
+    queryset = Borrowing.objects.select_related("user", "book")
     serializer_class = BorrowingSerializer
     permission_classes = [IsBorrowerOrAdmin]
+    sparse_keep_fields = ("user", "book")
+
+    def get_queryset(self):
+        return self.sparse_queryset(super().get_queryset())
 
     @extend_schema(summary="Retrieve a borrowing", responses={200: BorrowingSerializer})
     def retrieve(self, request, *args, **kwargs):
@@ -121,13 +113,15 @@ class BorrowingDetailAPIView(generics.RetrieveAPIView):
 
 
 class BorrowingReturnAPIView(generics.UpdateAPIView):
-    queryset = Borrowing.objects.all()
+    queryset = Borrowing.objects.select_related("user", "book")
     serializer_class = BorrowingReturnSerializer
     permission_classes = [IsBorrowerOrAdmin]
 
     @extend_schema(summary="Return a borrowing", request=BorrowingReturnSerializer)
     def perform_update(self, serializer):
         instance = serializer.save()
+        if instance.fine_payment_status == AWAITING_SESSION:
+            attach_payment_session(instance, FINE)
 
         fine_amount = self.calculate_fine_amount(instance)
 
@@ -149,3 +143,52 @@ class BorrowingReturnAPIView(generics.UpdateAPIView):
             fine_amount = overdue_days * instance.book.daily_fee * FINE_MULTIPLIER
             return fine_amount
         return 0
+
+
+class TrendingBookListAPIView(generics.ListAPIView):
+    """
+    Most borrowed books of the last ``window`` days, best first.
+
+    Reads the ranking ``refresh_trending_books`` precomputes, one page at a
+    time along the (window, rank) unique index.
+    """
+
+    serializer_class = TrendingBookSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TrendingPagination
+
+    @extend_schema(
+        summary="List trending books",
+        responses={200: TrendingBookSerializer(many=True)},
+        parameters=[
+            {
+                "name": "window",
+                "required": False,
+                "in": "query",
+                "description": "Days to rank over",
+                "schema": {"type": "integer", "enum": [7, 30, 365], "default": 7},
+            }
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        window = self.request.query_params.get("window", "7")
+        windows = [str(value) for value, _ in TrendingBook.WINDOW_CHOICES]
+        if window not in windows:
+            raise serializers.ValidationError(
+                {"window": [f"Choose one of {', '.join(windows)}."]}
+            )
+        return (
+            TrendingBook.objects.filter(window=int(window))
+            .select_related("book")
+            .only(
+                "id",
+                "rank",
+                "borrow_count",
+                "book",
+                "book__title",
+                "book__author_display",
+            )
+        )
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 import os
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -97,6 +98,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Catalog cache invalidation bumps version keys, so every process must share
+# one cache: set CACHE_REDIS_URL whenever more than one worker is running.
+
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))
+
+# Availability changes with every checkout, so it is only cached briefly.
+CATALOG_AVAILABILITY_TIMEOUT = int(os.getenv("CATALOG_AVAILABILITY_TIMEOUT", 30))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -139,8 +160,27 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "6976462510")
 
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
+# Point at benchmarks/fake_stripe.py to load test without the real API.
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Stripe calls share one pooled client; failed requests are retried with
+# jittered exponential backoff under an idempotency key.
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", 3.05))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", 20))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", 2))
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", 10))
+# The circuit breaker opens when this share of the last calls failed or
+# were slow, and lets a probe through after STRIPE_BREAKER_OPEN_SECONDS.
+STRIPE_BREAKER_FAILURE_RATE = float(os.getenv("STRIPE_BREAKER_FAILURE_RATE", 0.5))
+STRIPE_BREAKER_SLOW_CALL_SECONDS = float(
+    os.getenv("STRIPE_BREAKER_SLOW_CALL_SECONDS", 5)
+)
+STRIPE_BREAKER_WINDOW = int(os.getenv("STRIPE_BREAKER_WINDOW", 20))
+STRIPE_BREAKER_MIN_CALLS = int(os.getenv("STRIPE_BREAKER_MIN_CALLS", 5))
+STRIPE_BREAKER_OPEN_SECONDS = float(os.getenv("STRIPE_BREAKER_OPEN_SECONDS", 30))
 DOMAIN_URL = os.getenv("DOMAIN_URL", "http://localhost:8000")
 
 STRIPE_SUCCESS_URL = (
@@ -155,9 +195,49 @@ CELERY_RESULT_BACKEND = "redis://localhost:6379"
 CELERY_TIMEZONE = "Europe/Kyiv"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERY_BEAT_SCHEDULE = {
+    "refresh-trending-books": {
+        "task": "borrowings.tasks.refresh_trending_books",
+        "schedule": int(os.getenv("TRENDING_REFRESH_SECONDS", 15 * 60)),
+    },
+    "send-notifications": {
+        "task": "borrowings.tasks.send_notifications",
+        "schedule": int(os.getenv("NOTIFICATION_DRAIN_SECONDS", 10)),
+    },
+    "process-stripe-events": {
+        "task": "payments.tasks.process_stripe_events",
+        "schedule": int(os.getenv("STRIPE_EVENTS_SECONDS", 5)),
+    },
+    "sweep-payment-sessions": {
+        "task": "borrowings.tasks.sweep_payment_sessions",
+        "schedule": int(os.getenv("PAYMENT_SESSION_SWEEP_SECONDS", 5 * 60)),
+    },
+    "reconcile-pending-payments": {
+        "task": "payments.tasks.reconcile_pending_payments",
+        "schedule": int(os.getenv("PAYMENT_RECONCILE_SECONDS", 30 * 60)),
+    },
+}
+
+# Length of each precomputed "most borrowed" ranking.
+TRENDING_BOOKS_LIMIT = int(os.getenv("TRENDING_BOOKS_LIMIT", 100))
+
+# MessagePack responses are offered only when the optional msgpack package
+# is installed.
+RENDERER_CLASSES = [
+    "library_management.renderers.ORJSONRenderer",
+    "rest_framework.renderers.BrowsableAPIRenderer",
+]
+if find_spec("msgpack") is not None:
+    RENDERER_CLASSES.append("library_management.renderers.MessagePackRenderer")
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": RENDERER_CLASSES,
+    "DEFAULT_PARSER_CLASSES": [
+        "library_management.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_THROTTLE_CLASSES": [
         "rest_framework.throttling.AnonRateThrottle",
         "rest_framework.throttling.UserRateThrottle",
@@ -167,6 +247,8 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    "DEFAULT_PAGINATION_CLASS": "library_management.pagination.KeysetPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", 50)),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -0,0 +1,144 @@
+"""
+Sparse fieldsets: ``?fields=id,title`` keeps only the listed fields and
+``?omit=author_names`` drops fields from the response.
+
+The serializer mixin trims the output. The view mixin pushes the same choice
+down to the queryset, so columns, joins and prefetches nobody asked for are
+not loaded either. Both only act on safe (read) requests.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+def parse_names(request, param):
+    names = []
+    for value in request.query_params.getlist(param):
+        names.extend(name.strip() for name in value.split(",") if name.strip())
+    return names
+
+
+def get_fieldset(request, available):
+    """
+    Return the names in ``available`` selected by the request, in
+    ``available`` order, or ``None`` when the request does not narrow them.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = parse_names(request, FIELDS_PARAM)
+    omit = parse_names(request, OMIT_PARAM)
+    if not fields and not omit:
+        return None
+
+    unknown = [name for name in fields + omit if name not in available]
+    if unknown:
+        raise ValidationError(
+            {FIELDS_PARAM: [f"Unknown field {name!r}." for name in unknown]}
+        )
+    return [
+        name
+        for name in available
+        if (not fields or name in fields) and name not in omit
+    ]
+
+
+def readable_fields(serializer):
+    return [name for name, field in serializer.fields.items() if not field.write_only]
+
+
+class SparseFieldsetSerializerMixin:
+    """Serialize only the fields picked with ``?fields=`` / ``?omit=``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fieldset = get_fieldset(self.context.get("request"), readable_fields(self))
+        if fieldset is not None:
+            for name in set(readable_fields(self)) - set(fieldset):
+                self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Narrow the queryset to what the selected serializer fields read.
+
+    Plain fields contribute their ``source``. Fields whose source cannot be
+    read off the serializer, such as ``SerializerMethodField``, are declared
+    in the serializer's ``Meta.sparse_sources`` as a list of lookups,
+    related ones spelled ``book__title``. When a selected field is neither,
+    the queryset is left alone. Many-valued relations are the view's own
+    business: check ``wants_field()`` before prefetching them.
+
+    ``sparse_keep_fields`` names the fields loaded whatever is selected, such
+    as the foreign keys a permission check reads off the object.
+    """
+
+    sparse_keep_fields = ()
+
+    def get_sparse_fieldset(self):
+        if not hasattr(self, "_sparse_fieldset"):
+            self._sparse_fieldset = get_fieldset(
+                self.request, readable_fields(self.get_serializer_class()())
+            )
+        return self._sparse_fieldset
+
+    def wants_field(self, name):
+        fieldset = self.get_sparse_fieldset()
+        return fieldset is None or name in fieldset
+
+    def get_sparse_variant(self):
+        """A cache key part telling sparse renderings of one object apart."""
+        fieldset = self.get_sparse_fieldset()
+        return "" if fieldset is None else ",".join(fieldset)
+
+    def sparse_queryset(self, queryset):
+        fieldset = self.get_sparse_fieldset()
+        if fieldset is None:
+            return queryset
+
+        serializer = self.get_serializer_class()()
+        sources = getattr(serializer.Meta, "sparse_sources", {})
+        opts = queryset.model._meta
+        lookups = {opts.pk.name, *self.sparse_keep_fields}
+        for name in fieldset:
+            if name in sources:
+                lookups.update(sources[name])
+                continue
+            field = serializer.fields[name]
+            if field.source == "*" or isinstance(
+                field, serializers.SerializerMethodField
+            ):
+                return queryset
+            source = field.source.replace(".", "__")
+            if source in queryset.query.annotations:
+                continue
+            try:
+                model_field = opts.get_field(source.split("__")[0])
+            except FieldDoesNotExist:
+                return queryset
+            if not (model_field.many_to_many or model_field.one_to_many):
+                lookups.add(source)
+
+        # A cursor paginator reads its ordering fields off the rows.
+        ordering = ()
+        if hasattr(self.paginator, "get_ordering"):
+            ordering = self.paginator.get_ordering(self.request, queryset, self)
+        for name in ordering:
+            name = name.lstrip("-")
+            try:
+                opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            lookups.add(name)
+
+        # Joins the view asked for are dropped unless a selected field needs
+        # them; only() refuses to defer a relation that is still joined.
+        related = {lookup.rsplit("__", 1)[0] for lookup in lookups if "__" in lookup}
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*lookups, *related)
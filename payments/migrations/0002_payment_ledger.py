@@ -0,0 +1,158 @@
+# Generated by Django 5.0.6 on 2026-10-18 05:26
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+# borrowings.payment_sessions.WITHOUT_SESSION when this migration was written.
+WITHOUT_SESSION = ("awaiting_session", "deferred")
+STATUSES = ("pending", "paid", "cancelled", "expired", "failed")
+
+
+def backfill_payments(apps, schema_editor):
+    """
+    One payment per borrowing with a session. A fine session replaced the
+    rental one on the borrowing, so the stored session is the fine's once
+    one was created for it; until then it is still the rental's. Statuses
+    outside the ledger's choices become "pending". Paid rows get their
+    return (or borrow) date as paid_at, and fines are dated at the return.
+    """
+    Borrowing = apps.get_model("borrowings", "Borrowing")
+    Payment = apps.get_model("payments", "Payment")
+
+    def to_datetime(day):
+        return django.utils.timezone.make_aware(
+            datetime.datetime.combine(day, datetime.time())
+        )
+
+    borrowings = (
+        Borrowing.objects.filter(session_id__isnull=False)
+        .exclude(session_id="")
+        .order_by("id")
+    )
+    batch = []
+    for borrowing in borrowings.iterator(chunk_size=BATCH_SIZE):
+        is_fine = bool(borrowing.fine_amount) and (
+            borrowing.fine_payment_status not in (None, *WITHOUT_SESSION)
+        )
+        status = borrowing.fine_payment_status if is_fine else borrowing.payment_status
+        if status not in STATUSES:
+            status = "pending"
+        paid_day = borrowing.actual_return_date or borrowing.borrow_date
+        created_day = paid_day if is_fine else borrowing.borrow_date
+        batch.append(
+            Payment(
+                borrowing_id=borrowing.id,
+                purpose="fine" if is_fine else "rental",
+                status=status,
+                amount=(borrowing.fine_amount if is_fine else borrowing.amount_paid)
+                or 0,
+                session_id=borrowing.session_id,
+                session_url=borrowing.session_url or "",
+                created_at=to_datetime(created_day),
+                paid_at=to_datetime(paid_day) if status == "paid" else None,
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            Payment.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Payment.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def restore_sessions(apps, schema_editor):
+    """Put each borrowing's latest session back on it."""
+    Borrowing = apps.get_model("borrowings", "Borrowing")
+    Payment = apps.get_model("payments", "Payment")
+
+    latest = {}
+    for payment in Payment.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        latest[payment.borrowing_id] = payment
+    borrowings = []
+    for borrowing_id, payment in latest.items():
+        borrowings.append(
+            Borrowing(
+                id=borrowing_id,
+                session_id=payment.session_id,
+                session_url=payment.session_url[:100],
+            )
+        )
+    Borrowing.objects.bulk_update(
+        borrowings, ["session_id", "session_url"], batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0007_notification_outbox"),
+        ("payments", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Payment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "purpose",
+                    models.CharField(
+                        choices=[("rental", "Rental"), ("fine", "Fine")], max_length=10
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("paid", "Paid"),
+                            ("cancelled", "Cancelled"),
+                            ("expired", "Expired"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("session_id", models.CharField(max_length=255, unique=True)),
+                ("session_url", models.URLField(blank=True, max_length=1000)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("paid_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "borrowing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="payments",
+                        to="borrowings.borrowing",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["borrowing", "purpose"],
+                        name="payment_borrowing_purpose_idx",
+                    ),
+                    models.Index(
+                        fields=["status", "paid_at"], name="payment_status_paid_idx"
+                    ),
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="payment_status_created_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_payments, restore_sessions),
+    ]
@@ -1,3 +1,105 @@
 from django.db import models
+from django.db.models import Sum
+from django.utils import timezone
 
-# Create your models here.
+
+class PaymentQuerySet(models.QuerySet):
+    def revenue(self, start, end):
+        """Paid total with ``start <= paid_at < end``: a range on (status, paid_at)."""
+        total = self.filter(
+            status=Payment.PAID, paid_at__gte=start, paid_at__lt=end
+        ).aggregate(total=Sum("amount"))["total"]
+        return total or 0
+
+    def outstanding(self, as_of=None):
+        """Unpaid total of sessions opened before ``as_of`` (default: now)."""
+        total = self.filter(
+            status=Payment.PENDING, created_at__lt=as_of or timezone.now()
+        ).aggregate(total=Sum("amount"))["total"]
+        return total or 0
+
+
+class Payment(models.Model):
+    """
+    One Stripe checkout session of a borrowing: the rental fee or a fine.
+
+    ``Borrowing.payment_status`` and ``fine_payment_status`` summarise the
+    latest session of each purpose; the ledger keeps every one of them.
+    """
+
+    RENTAL = "rental"
+    FINE = "fine"
+    PURPOSE_CHOICES = [(RENTAL, "Rental"), (FINE, "Fine")]
+
+    PENDING = "pending"
+    PAID = "paid"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (PAID, "Paid"),
+        (CANCELLED, "Cancelled"),
+        (EXPIRED, "Expired"),
+        (FAILED, "Failed"),
+    ]
+
+    borrowing = models.ForeignKey(
+        "borrowings.Borrowing", on_delete=models.CASCADE, related_name="payments"
+    )
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    session_id = models.CharField(max_length=255, unique=True)
+    session_url = models.URLField(max_length=1000, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PaymentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["borrowing", "purpose"], name="payment_borrowing_purpose_idx"
+            ),
+            models.Index(fields=["status", "paid_at"], name="payment_status_paid_idx"),
+            models.Index(
+                fields=["status", "created_at"], name="payment_status_created_idx"
+            ),
+        ]
+
+    @property
+    def borrowing_status_field(self):
+        """The ``Borrowing`` field summarising payments of this purpose."""
+        return "fine_payment_status" if self.purpose == self.FINE else "payment_status"
+
+    def __str__(self):
+        return f"{self.get_purpose_display()} {self.session_id} ({self.status})"
+
+
+class StripeEvent(models.Model):
+    """
+    A verified Stripe webhook event, stored as received.
+
+    Rows are only ever inserted (a redelivered event hits the unique
+    ``event_id`` and is dropped) and later marked processed by
+    ``payments.webhooks.process_events``.
+    """
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="stripe_event_unprocessed_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
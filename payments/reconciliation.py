@@ -0,0 +1,136 @@
+"""
+Reconciliation of pending payments with Stripe.
+
+A session stays "pending" when its webhook never arrived and the user never
+came back to the success URL. ``reconcile_payments`` pages through pending
+payments older than ``STALE_AFTER`` by id, asks Stripe for each session on a
+bounded thread pool (sharing the pooled client, so ``CONCURRENCY`` should
+not exceed ``STRIPE_POOL_SIZE``) and writes what changed with one
+``bulk_update`` per page. No transaction is open during the Stripe calls;
+the write re-reads the page's payments under ``select_for_update`` and skips
+any that a webhook or redirect settled in the meantime.
+
+``paid_at`` is the time of the session's charge, so ``revenue()`` books a
+late-reconciled payment in the period it was made; only when Stripe does
+not report the charge does the reconciliation time stand in for it.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+from payments.models import Payment
+from payments.services import StripePaymentService, breaker
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+CONCURRENCY = 8
+STALE_AFTER = timedelta(hours=1)
+
+
+def get_payment_status(session):
+    """The ledger status for a retrieved session; None while it is still open."""
+    if session["payment_status"] in ("paid", "no_payment_required"):
+        return Payment.PAID
+    if session["status"] == "expired":
+        return Payment.EXPIRED
+    return None
+
+
+def apply_statuses(changes):
+    """
+    Move still-pending payments to the ``(status, paid_at)`` in ``changes``
+    (by payment id) and mirror the status onto their borrowings; returns how
+    many were updated.
+    """
+    with transaction.atomic():
+        payments = (
+            Payment.objects.select_for_update()
+            .filter(id__in=changes, status=Payment.PENDING)
+            .select_related("borrowing")
+            .only(
+                "id",
+                "purpose",
+                "status",
+                "paid_at",
+                "borrowing__id",
+                "borrowing__payment_status",
+                "borrowing__fine_payment_status",
+            )
+        )
+        borrowings = {}
+        for payment in payments:
+            payment.status, paid_at = changes[payment.id]
+            if payment.status == Payment.PAID:
+                payment.paid_at = paid_at
+            # One instance per borrowing, as in ``webhooks.apply_events``.
+            borrowing = borrowings.setdefault(payment.borrowing_id, payment.borrowing)
+            setattr(borrowing, payment.borrowing_status_field, payment.status)
+
+        Payment.objects.bulk_update(payments, ["status", "paid_at"])
+        Borrowing.objects.bulk_update(
+            borrowings.values(), ["payment_status", "fine_payment_status"]
+        )
+    return len(payments)
+
+
+def reconcile_payments(
+    stale_after=STALE_AFTER, page_size=PAGE_SIZE, concurrency=CONCURRENCY
+):
+    """
+    Check every stale pending payment against Stripe. Stops early while the
+    breaker is open; the rest are picked up by the next run.
+
+    Returns how many sessions were checked, how many payments changed, how
+    many lookups failed, and the sessions checked per second.
+    """
+    cutoff = timezone.now() - stale_after
+    service = StripePaymentService()
+    stats = {"checked": 0, "reconciled": 0, "errors": 0}
+    start = time.perf_counter()
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while not breaker.is_open:
+            page = list(
+                Payment.objects.filter(
+                    status=Payment.PENDING, created_at__lt=cutoff, id__gt=last_id
+                )
+                .order_by("id")
+                .values_list("id", "session_id")[:page_size]
+            )
+            if not page:
+                break
+            last_id = page[-1][0]
+
+            responses = pool.map(
+                service.retrieve_session, [session_id for _, session_id in page]
+            )
+            changes = {}
+            for (payment_id, _), response in zip(page, responses):
+                if not response["success"]:
+                    stats["errors"] += 1
+                    continue
+                status = get_payment_status(response)
+                if status is not None:
+                    changes[payment_id] = (
+                        status,
+                        response.get("paid_at") or timezone.now(),
+                    )
+            stats["checked"] += len(page)
+            if changes:
+                stats["reconciled"] += apply_statuses(changes)
+
+    seconds = time.perf_counter() - start
+    stats["per_second"] = round(stats["checked"] / seconds, 1) if seconds else 0.0
+    logger.info(
+        "Reconciled %(reconciled)s of %(checked)s pending payments "
+        "(%(errors)s errors) at %(per_second)s sessions/s",
+        stats,
+    )
+    return stats
@@ -1,38 +1,303 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta, date
+from datetime import timezone as dt_timezone
 
+import requests
 import stripe
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+
+class StripeMetrics:
+    """Process-wide counters of the Stripe calls made through this module."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.total_seconds = 0.0
+            self.max_seconds = 0.0
+
+    @contextmanager
+    def track(self):
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.requests += 1
+                self.errors += failed
+                self.total_seconds += seconds
+                self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            average = self.total_seconds / self.requests if self.requests else 0.0
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "avg_ms": round(average * 1000, 1),
+                "max_ms": round(self.max_seconds * 1000, 1),
+            }
+
+
+metrics = StripeMetrics()
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing gateway for a while instead of queueing on it.
+
+    Outcomes of the last ``window`` calls are kept; a call counts as failed
+    when it raised a gateway error or took ``slow_call_seconds`` or longer.
+    Once at least ``min_calls`` were made and the failed share reaches
+    ``failure_rate`` the breaker opens and refuses calls for
+    ``open_seconds``. It then lets a single probe through (half-open): its
+    success closes the breaker, its failure opens it again. The state is
+    per process, like the client.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate=0.5,
+        slow_call_seconds=5.0,
+        window=20,
+        min_calls=5,
+        open_seconds=30.0,
+        clock=time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = self.CLOSED
+        self.times_opened = 0
+
+    @property
+    def is_open(self):
+        return (
+            self.state == self.OPEN
+            and self.clock() - self._opened_at < self.open_seconds
+        )
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, ok, seconds):
+        ok = ok and seconds < self.slow_call_seconds
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(ok)
+            failed = self._outcomes.count(False)
+            if (
+                len(self._outcomes) >= self.min_calls
+                and failed / len(self._outcomes) >= self.failure_rate
+            ):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            failed = self._outcomes.count(False)
+            return {
+                "state": self.state,
+                "recent_calls": calls,
+                "recent_failure_rate": round(failed / calls, 3) if calls else 0.0,
+                "times_opened": self.times_opened,
+            }
+
+
+breaker = CircuitBreaker(
+    failure_rate=settings.STRIPE_BREAKER_FAILURE_RATE,
+    slow_call_seconds=settings.STRIPE_BREAKER_SLOW_CALL_SECONDS,
+    window=settings.STRIPE_BREAKER_WINDOW,
+    min_calls=settings.STRIPE_BREAKER_MIN_CALLS,
+    open_seconds=settings.STRIPE_BREAKER_OPEN_SECONDS,
+)
+
+# Errors that say the gateway, not our request, is in trouble.
+GATEWAY_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+
+def get_stripe_client(api_key=None):
+    """
+    The process-wide Stripe client for ``api_key``, talking to
+    ``STRIPE_API_BASE``.
+
+    It keeps its connections in one pooled ``requests`` session, applies
+    the configured connect and read timeouts, and lets the Stripe library
+    retry failed requests with jittered exponential backoff.
+    """
+    global _client, _client_config
+    api_key = api_key or settings.STRIPE_API_KEY
+    config = (api_key, settings.STRIPE_API_BASE)
+    with _client_lock:
+        if _client is None or _client_config != config:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.STRIPE_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _client = stripe.StripeClient(
+                api_key,
+                base_addresses={"api": settings.STRIPE_API_BASE},
+                http_client=stripe.RequestsClient(
+                    timeout=(
+                        settings.STRIPE_CONNECT_TIMEOUT,
+                        settings.STRIPE_READ_TIMEOUT,
+                    ),
+                    session=session,
+                ),
+                max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+            )
+            _client_config = config
+        return _client
+
+
+@contextmanager
+def gateway_call():
+    """
+    Count a Stripe call in ``metrics`` and report its outcome to
+    ``breaker``; errors that are our request's fault count as successes.
+    """
+    start = time.perf_counter()
+    gateway_ok = False
+    try:
+        with metrics.track():
+            yield
+        gateway_ok = True
+    except stripe.error.StripeError as e:
+        gateway_ok = not isinstance(e, GATEWAY_ERRORS)
+        raise
+    finally:
+        breaker.record(gateway_ok, time.perf_counter() - start)
+
+
+def get_paid_time(session):
+    """The creation time of a session's (expanded) charge, else of its intent."""
+    intent = session.get("payment_intent")
+    if not isinstance(intent, dict):
+        return None
+    charge = intent.get("latest_charge")
+    created = charge.get("created") if isinstance(charge, dict) else None
+    created = created or intent.get("created")
+    if created is None:
+        return None
+    return datetime.fromtimestamp(created, tz=dt_timezone.utc)
+
+
+def idempotency_key(borrowing_id, purpose):
+    """One Stripe session per borrowing and purpose ("rental" or "fine")."""
+    return f"borrowing-{borrowing_id}-{purpose}"
 
 
 class StripePaymentService:
     def __init__(self, api_key=None):
         self.api_key = api_key or settings.STRIPE_API_KEY
-        stripe.api_key = self.api_key
 
     def create_payment_session(self, payment_data):
+        options = {}
+        references = {}
+        if "borrowing_id" in payment_data:
+            options["idempotency_key"] = idempotency_key(
+                payment_data["borrowing_id"], payment_data["purpose"]
+            )
+            # Read back by the webhook to tell rental and fine sessions apart.
+            references = {
+                "client_reference_id": str(payment_data["borrowing_id"]),
+                "metadata": {
+                    "borrowing_id": payment_data["borrowing_id"],
+                    "purpose": payment_data["purpose"],
+                },
+            }
+        if not breaker.allow_request():
+            return {
+                "success": False,
+                "deferred": True,
+                "error": "Payment gateway unavailable, try again later.",
+            }
+
         try:
-            expiration_time = datetime.now() + timedelta(hours=24)
+            # Part of the idempotent request, so it comes from the borrowing
+            # when there is one: a retry must send the same params.
+            expiration_time = payment_data.get("expires_at") or (
+                datetime.now() + timedelta(hours=24)
+            )
             expiration_time_unix = int(expiration_time.timestamp())
 
-            session = stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": "usd",
-                            "unit_amount": int(payment_data["amount"] * 100),
-                            "product_data": {"name": payment_data["book_name"]},
+            with gateway_call():
+                session = get_stripe_client(self.api_key).checkout.sessions.create(
+                    params={
+                        "payment_method_types": ["card"],
+                        "line_items": [
+                            {
+                                "price_data": {
+                                    "currency": "usd",
+                                    "unit_amount": int(payment_data["amount"] * 100),
+                                    "product_data": {"name": payment_data["book_name"]},
+                                },
+                                "quantity": 1,
+                            }
+                        ],
+                        "mode": "payment",
+                        "success_url": settings.STRIPE_SUCCESS_URL,
+                        "cancel_url": settings.STRIPE_CANCEL_URL,
+                        "payment_intent_data": {
+                            "metadata": {"expiration_time": expiration_time_unix}
                         },
-                        "quantity": 1,
-                    }
-                ],
-                mode="payment",
-                success_url=settings.STRIPE_SUCCESS_URL,
-                cancel_url=settings.STRIPE_CANCEL_URL,
-                payment_intent_data={
-                    "metadata": {"expiration_time": expiration_time_unix}
-                },
-            )
+                        **references,
+                    },
+                    options=options,
+                )
             return {
                 "success": True,
                 "session_id": session.id,
@@ -41,6 +306,32 @@ class StripePaymentService:
         except stripe.error.StripeError as e:
             return {"success": False, "error": str(e)}
 
+    def retrieve_session(self, session_id):
+        """
+        Stripe's current ``status`` and ``payment_status`` of a session, and
+        ``paid_at``: when its charge was made, None if it was not (or Stripe
+        did not say).
+        """
+        if not breaker.allow_request():
+            return {
+                "success": False,
+                "deferred": True,
+                "error": "Payment gateway unavailable, try again later.",
+            }
+        try:
+            with gateway_call():
+                session = get_stripe_client(self.api_key).checkout.sessions.retrieve(
+                    session_id, params={"expand": ["payment_intent.latest_charge"]}
+                )
+            return {
+                "success": True,
+                "status": session.status,
+                "payment_status": session.payment_status,
+                "paid_at": get_paid_time(session),
+            }
+        except stripe.error.StripeError as e:
+            return {"success": False, "error": str(e)}
+
     def get_success_url(self):
         return settings.STRIPE_SUCCESS_URL
 
@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from payments.reconciliation import reconcile_payments
+from payments.webhooks import process_events
+
+
+@shared_task
+def process_stripe_events():
+    return process_events()
+
+
+@shared_task
+def reconcile_pending_payments():
+    return reconcile_payments()
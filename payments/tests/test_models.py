@@ -0,0 +1,181 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books.models import Book
+from borrowings.models import Borrowing
+from payments.models import Payment
+from users.models import User
+
+NOW = timezone.make_aware(datetime(2024, 6, 15, 12))
+
+
+class PaymentLedgerTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Hamlet", inventory=10, daily_fee=1)
+        self.payments = 0
+
+    def pay(self, amount, status=Payment.PENDING, paid_at=None, created_at=NOW):
+        self.payments += 1
+        borrowing = Borrowing.objects.create(
+            user=User.objects.create_user(email=f"reader{self.payments}@example.com"),
+            book=self.book,
+            expected_return_date=date(2024, 6, 20),
+        )
+        return Payment.objects.create(
+            borrowing=borrowing,
+            purpose=Payment.RENTAL,
+            amount=amount,
+            status=status,
+            session_id=f"cs_{self.payments}",
+            created_at=created_at,
+            paid_at=paid_at,
+        )
+
+    def assertUsesIndex(self, queryset, index_pattern):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertRegex(plan, index_pattern)
+        self.assertNotIn("Seq Scan", plan)
+        self.assertNotRegex(plan, r"SCAN payments_payment(?! USING)")
+
+    def test_revenue(self):
+        self.pay(10, Payment.PAID, paid_at=NOW)
+        self.pay("2.50", Payment.PAID, paid_at=NOW + timedelta(days=1))
+        self.pay(7, Payment.PAID, paid_at=NOW + timedelta(days=30))
+        self.pay(100)
+
+        revenue = Payment.objects.revenue(NOW, NOW + timedelta(days=2))
+
+        self.assertEqual(revenue, Decimal("12.50"))
+        self.assertEqual(Payment.objects.revenue(NOW, NOW), 0)
+
+    def test_outstanding(self):
+        self.pay(10)
+        self.pay(5, created_at=NOW + timedelta(days=2))
+        self.pay(7, Payment.PAID, paid_at=NOW)
+
+        self.assertEqual(Payment.objects.outstanding(NOW + timedelta(days=1)), 10)
+        self.assertEqual(Payment.objects.outstanding(NOW + timedelta(days=3)), 15)
+
+    def test_ledger_queries_use_indexes(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(
+                status=Payment.PAID, paid_at__gte=NOW, paid_at__lt=NOW
+            ),
+            "payment_status_paid_idx",
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(status=Payment.PENDING, created_at__lt=NOW),
+            "payment_status_created_idx",
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(session_id="cs_1"),
+            r"payments_payment_session_id|sqlite_autoindex_payments_payment",
+        )
+
+    def test_summary_endpoint(self):
+        self.pay(10, Payment.PAID, paid_at=NOW)
+        self.pay(4)
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_superuser(email="admin@example.com", password="x")
+        )
+
+        response = client.get(
+            reverse("payment_summary"), {"start": "2024-06-01", "end": "2024-07-01"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revenue"], 10)
+        self.assertEqual(response.data["outstanding"], 4)
+
+        response = client.get(reverse("payment_summary"), {"start": "June"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentBackfillMigrationTest(TransactionTestCase):
+    before = [("borrowings", "0007_notification_outbox"), ("payments", "0001_initial")]
+    after = [
+        ("borrowings", "0008_remove_borrowing_session_fields"),
+        ("payments", "0002_payment_ledger"),
+    ]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_sessions_move_to_the_ledger(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model("users", "User")
+        Book = apps.get_model("books", "Book")
+        Borrowing = apps.get_model("borrowings", "Borrowing")
+        book = Book.objects.create(title="Hamlet", inventory=1, daily_fee=1)
+        common = {"book": book, "expected_return_date": date(2024, 6, 20)}
+        rental = Borrowing.objects.create(
+            user=User.objects.create(email="a@example.com"),
+            session_id="cs_rental",
+            session_url="https://stripe.test/a",
+            amount_paid=7,
+            payment_status="paid",
+            actual_return_date=date(2024, 6, 18),
+            **common,
+        )
+        fine = Borrowing.objects.create(
+            user=User.objects.create(email="b@example.com"),
+            session_id="cs_fine",
+            amount_paid=7,
+            fine_amount=30,
+            fine_payment_status="pending",
+            actual_return_date=date(2024, 6, 25),
+            **common,
+        )
+        # Returned late, but the fine session was never created.
+        awaiting_fine = Borrowing.objects.create(
+            user=User.objects.create(email="d@example.com"),
+            session_id="cs_rental_2",
+            amount_paid=7,
+            payment_status="awaiting_session",
+            fine_amount=30,
+            fine_payment_status="deferred",
+            actual_return_date=date(2024, 6, 25),
+            **common,
+        )
+        Borrowing.objects.create(
+            user=User.objects.create(email="c@example.com"), **common
+        )
+
+        apps = self.migrate(self.after)
+        Payment = apps.get_model("payments", "Payment")
+
+        payments = {p.session_id: p for p in Payment.objects.all()}
+        self.assertEqual(set(payments), {"cs_rental", "cs_fine", "cs_rental_2"})
+        self.assertEqual(payments["cs_rental"].borrowing_id, rental.id)
+        self.assertEqual(payments["cs_rental"].purpose, "rental")
+        self.assertEqual(payments["cs_rental"].amount, 7)
+        self.assertEqual(payments["cs_rental"].status, "paid")
+        self.assertEqual(payments["cs_rental"].paid_at.date(), date(2024, 6, 18))
+        self.assertEqual(payments["cs_rental"].session_url, "https://stripe.test/a")
+        self.assertEqual(payments["cs_fine"].borrowing_id, fine.id)
+        self.assertEqual(payments["cs_fine"].purpose, "fine")
+        self.assertEqual(payments["cs_fine"].amount, 30)
+        self.assertIsNone(payments["cs_fine"].paid_at)
+        self.assertEqual(payments["cs_fine"].created_at.date(), date(2024, 6, 25))
+        self.assertEqual(payments["cs_rental_2"].borrowing_id, awaiting_fine.id)
+        self.assertEqual(payments["cs_rental_2"].purpose, "rental")
+        self.assertEqual(payments["cs_rental_2"].amount, 7)
+        self.assertEqual(payments["cs_rental_2"].status, "pending")
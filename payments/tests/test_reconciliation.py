@@ -0,0 +1,159 @@
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from benchmarks.fake_stripe import GatewayProfile, start_server
+from books.models import Book
+from borrowings.models import Borrowing
+from payments import reconciliation, services
+from payments.models import Payment
+from payments.reconciliation import apply_statuses, reconcile_payments
+from payments.services import CircuitBreaker
+from payments.tasks import reconcile_pending_payments
+from users.models import User
+
+
+@override_settings(STRIPE_API_KEY="sk_test_fake", STRIPE_MAX_NETWORK_RETRIES=0)
+class ReconcilePaymentsTest(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker()
+        for module in (services, reconciliation):
+            patcher = mock.patch.object(module, "breaker", self.breaker)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.server = self.serve()
+        self.book = Book.objects.create(title="Hamlet", inventory=10, daily_fee=1)
+
+    def serve(self, **profile):
+        server = start_server(GatewayProfile(seed=1, **profile))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        settings = override_settings(STRIPE_API_BASE=server.api_base)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return server
+
+    def pending(
+        self, purpose=Payment.RENTAL, age=timedelta(hours=2), borrowing=None, **session
+    ):
+        borrowing = borrowing or Borrowing.objects.create(
+            user=User.objects.create_user(
+                email=f"reader{Payment.objects.count()}@example.com"
+            ),
+            book=self.book,
+            expected_return_date=date.today(),
+            payment_status=Payment.PENDING,
+            fine_payment_status=Payment.PENDING if purpose == Payment.FINE else None,
+        )
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            purpose=purpose,
+            amount=7,
+            session_id=f"cs_test_{Payment.objects.count()}",
+            created_at=timezone.now() - age,
+        )
+        self.server.set_session(payment.session_id, **session)
+        return payment
+
+    def test_stale_payments_take_the_gateway_status(self):
+        paid = self.pending(
+            status="complete",
+            payment_status="paid",
+            payment_intent={
+                "id": "pi_1",
+                "object": "payment_intent",
+                "created": 1717990000,
+                "latest_charge": {
+                    "id": "ch_1",
+                    "object": "charge",
+                    "created": 1718000000,
+                },
+            },
+        )
+        expired = self.pending(Payment.FINE, status="expired")
+        still_open = self.pending()
+        recent = self.pending(age=timedelta(minutes=5), payment_status="paid")
+
+        stats = reconcile_payments(page_size=2, concurrency=4)
+
+        self.assertEqual(stats["checked"], 3)
+        self.assertEqual(stats["reconciled"], 2)
+        self.assertEqual(stats["errors"], 0)
+        self.assertGreater(stats["per_second"], 0)
+        self.assertEqual(self.server.counts["retrievals"], 3)
+
+        for payment in (paid, expired, still_open, recent):
+            payment.refresh_from_db()
+        self.assertEqual(paid.status, Payment.PAID)
+        # Booked when the charge was made, not when it was reconciled.
+        self.assertEqual(
+            paid.paid_at, datetime(2024, 6, 10, 6, 13, 20, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(paid.borrowing.payment_status, Payment.PAID)
+        self.assertEqual(expired.status, Payment.EXPIRED)
+        self.assertIsNone(expired.paid_at)
+        self.assertEqual(expired.borrowing.fine_payment_status, Payment.EXPIRED)
+        self.assertEqual(expired.borrowing.payment_status, Payment.PENDING)
+        self.assertEqual(still_open.status, Payment.PENDING)
+        self.assertEqual(recent.status, Payment.PENDING)
+
+    def test_rental_and_fine_of_one_borrowing_on_one_page(self):
+        rental = self.pending(status="complete", payment_status="paid")
+        self.pending(
+            Payment.FINE,
+            borrowing=rental.borrowing,
+            status="complete",
+            payment_status="paid",
+        )
+        Borrowing.objects.update(fine_payment_status=Payment.PENDING)
+
+        self.assertEqual(reconcile_payments()["reconciled"], 2)
+
+        borrowing = Borrowing.objects.get()
+        self.assertEqual(borrowing.payment_status, Payment.PAID)
+        self.assertEqual(borrowing.fine_payment_status, Payment.PAID)
+
+    def test_failed_lookups_stay_pending(self):
+        self.server = self.serve(error_rate=1)
+        payment = self.pending(payment_status="paid")
+
+        stats = reconcile_payments()
+
+        self.assertEqual(stats["checked"], 1)
+        self.assertEqual(stats["errors"], 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.PENDING)
+
+    def test_open_breaker_stops_the_run(self):
+        self.pending(payment_status="paid")
+        self.breaker = CircuitBreaker(min_calls=1)
+        self.breaker.record(False, 0)
+
+        with mock.patch.object(reconciliation, "breaker", self.breaker):
+            stats = reconcile_payments()
+
+        self.assertEqual(stats["checked"], 0)
+        self.assertEqual(self.server.counts["retrievals"], 0)
+
+    def test_payments_settled_meanwhile_are_left_alone(self):
+        payment = self.pending()
+        Payment.objects.filter(id=payment.id).update(status=Payment.CANCELLED)
+
+        self.assertEqual(apply_statuses({payment.id: (Payment.EXPIRED, None)}), 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.CANCELLED)
+
+    def test_task(self):
+        self.pending(status="complete", payment_status="paid")
+
+        before = timezone.now()
+        stats = reconcile_pending_payments()
+
+        self.assertEqual(stats["reconciled"], 1)
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, Payment.PAID)
+        # Stripe did not report the charge: the run time stands in.
+        self.assertGreaterEqual(payment.paid_at, before)
@@ -0,0 +1,256 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+import stripe
+from django.test import SimpleTestCase, override_settings
+
+from benchmarks.fake_stripe import GatewayProfile, start_server
+from payments import services
+from payments.services import (
+    CircuitBreaker,
+    StripePaymentService,
+    get_stripe_client,
+    idempotency_key,
+    metrics,
+)
+
+PAYMENT_DATA = {
+    "borrowing_id": 7,
+    "purpose": "fine",
+    "user_id": 1,
+    "amount": 12.5,
+    "book_name": "Hamlet",
+    "expires_at": datetime(2024, 6, 16, tzinfo=timezone.utc),
+}
+
+
+@override_settings(STRIPE_API_KEY="sk_test_123")
+class StripeClientTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_client_is_shared_per_api_key(self):
+        client = get_stripe_client()
+
+        self.assertIsInstance(client, stripe.StripeClient)
+        self.assertEqual(StripePaymentService().api_key, "sk_test_123")
+        self.assertIs(get_stripe_client(), client)
+        self.assertIsNot(get_stripe_client("sk_test_other"), client)
+
+    @override_settings(STRIPE_CONNECT_TIMEOUT=1.5, STRIPE_READ_TIMEOUT=7)
+    def test_client_uses_configured_timeouts(self):
+        with mock.patch.object(services, "_client", None):
+            client = get_stripe_client()
+
+        self.assertEqual(client._requestor._client._timeout, (1.5, 7))
+
+    @mock.patch("payments.services.get_stripe_client")
+    def test_session_is_created_with_idempotency_key(self, mock_client):
+        create = mock_client.return_value.checkout.sessions.create
+        create.return_value = mock.Mock(id="cs_1", url="https://stripe.test/cs_1")
+
+        response = StripePaymentService().create_payment_session(PAYMENT_DATA)
+
+        self.assertEqual(
+            response,
+            {
+                "success": True,
+                "session_id": "cs_1",
+                "session_url": "https://stripe.test/cs_1",
+            },
+        )
+        self.assertEqual(
+            create.call_args.kwargs["options"],
+            {"idempotency_key": "borrowing-7-fine"},
+        )
+        self.assertEqual(
+            create.call_args.kwargs["params"]["line_items"][0]["price_data"][
+                "unit_amount"
+            ],
+            1250,
+        )
+        self.assertEqual(
+            create.call_args.kwargs["params"]["metadata"],
+            {"borrowing_id": 7, "purpose": "fine"},
+        )
+        self.assertEqual(
+            create.call_args.kwargs["params"]["payment_intent_data"],
+            {"metadata": {"expiration_time": 1718496000}},
+        )
+        self.assertEqual(metrics.snapshot()["requests"], 1)
+        self.assertEqual(metrics.snapshot()["errors"], 0)
+
+    @mock.patch("payments.services.get_stripe_client")
+    def test_errors_are_counted(self, mock_client):
+        mock_client.return_value.checkout.sessions.create.side_effect = (
+            stripe.error.APIConnectionError("timed out")
+        )
+
+        response = StripePaymentService().create_payment_session(PAYMENT_DATA)
+
+        self.assertFalse(response["success"])
+        self.assertEqual(metrics.snapshot()["requests"], 1)
+        self.assertEqual(metrics.snapshot()["errors"], 1)
+
+    def test_idempotency_key(self):
+        self.assertEqual(idempotency_key(3, "rental"), "borrowing-3-rental")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_rate=0.5,
+            slow_call_seconds=1.0,
+            window=4,
+            min_calls=4,
+            open_seconds=10,
+            clock=self.clock,
+        )
+
+    def fail(self, times):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record(False, 0.1)
+
+    def test_opens_at_failure_rate(self):
+        self.breaker.record(True, 0.1)
+        self.fail(1)
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.fail(1)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.snapshot()["times_opened"], 1)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(4):
+            self.breaker.record(True, 2.0)
+
+        self.assertTrue(self.breaker.is_open)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.fail(4)
+        self.clock.now = 10
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens(self):
+        self.fail(4)
+        self.clock.now = 10
+
+        self.fail(1)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.clock.now = 20
+        self.assertTrue(self.breaker.allow_request())
+
+    @override_settings(STRIPE_API_KEY="sk_test_123")
+    @mock.patch("payments.services.get_stripe_client")
+    def test_open_breaker_defers_without_calling_stripe(self, mock_client):
+        create = mock_client.return_value.checkout.sessions.create
+        create.side_effect = stripe.error.APIConnectionError("timed out")
+
+        with mock.patch.object(services, "breaker", self.breaker):
+            for _ in range(4):
+                StripePaymentService().create_payment_session(PAYMENT_DATA)
+            response = StripePaymentService().create_payment_session(PAYMENT_DATA)
+
+        self.assertEqual(create.call_count, 4)
+        self.assertFalse(response["success"])
+        self.assertTrue(response["deferred"])
+
+    @override_settings(STRIPE_API_KEY="sk_test_123")
+    @mock.patch("payments.services.get_stripe_client")
+    def test_request_errors_do_not_open_breaker(self, mock_client):
+        create = mock_client.return_value.checkout.sessions.create
+        create.side_effect = stripe.error.InvalidRequestError("bad amount", None)
+
+        with mock.patch.object(services, "breaker", self.breaker):
+            for _ in range(4):
+                StripePaymentService().create_payment_session(PAYMENT_DATA)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+@override_settings(STRIPE_API_KEY="sk_test_123", STRIPE_MAX_NETWORK_RETRIES=0)
+class FakeStripeGatewayTest(SimpleTestCase):
+    """The real client against the local stand-in from ``benchmarks``."""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker()
+        patcher = mock.patch.object(services, "breaker", self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, **profile):
+        server = start_server(GatewayProfile(seed=1, **profile))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        settings = override_settings(STRIPE_API_BASE=server.api_base)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return server
+
+    def test_session_is_created_once_per_idempotency_key(self):
+        server = self.serve(latency=5, distribution="uniform", jitter=5)
+
+        first = StripePaymentService().create_payment_session(PAYMENT_DATA)
+        again = StripePaymentService().create_payment_session(PAYMENT_DATA)
+
+        self.assertTrue(first["success"])
+        self.assertTrue(first["session_id"].startswith("cs_test_"))
+        self.assertEqual(again["session_id"], first["session_id"])
+        self.assertEqual(server.counts["sessions"], 1)
+
+    def test_reused_key_with_other_params_is_rejected(self):
+        self.serve()
+
+        first = StripePaymentService().create_payment_session(PAYMENT_DATA)
+        again = StripePaymentService().create_payment_session(
+            {**PAYMENT_DATA, "amount": 13}
+        )
+
+        self.assertTrue(first["success"])
+        self.assertFalse(again["success"])
+        self.assertIn("same parameters", again["error"])
+        self.assertEqual(self.breaker.snapshot()["recent_failure_rate"], 0)
+
+    def test_gateway_errors(self):
+        server = self.serve(error_rate=1)
+
+        response = StripePaymentService().create_payment_session(PAYMENT_DATA)
+
+        self.assertFalse(response["success"])
+        self.assertEqual(server.counts["errors"], 1)
+
+    def test_rate_limit(self):
+        server = self.serve(rate_limit=1)
+        payment_data = {**PAYMENT_DATA}
+        del payment_data["borrowing_id"]
+
+        responses = [
+            StripePaymentService().create_payment_session(payment_data)
+            for _ in range(3)
+        ]
+
+        self.assertTrue(responses[0]["success"])
+        self.assertFalse(responses[-1]["success"])
+        self.assertGreaterEqual(server.counts["rate_limited"], 1)
@@ -3,6 +3,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from borrowings.models import Borrowing, Book
+from payments.models import Payment
 import datetime
 
 User = get_user_model()
@@ -13,16 +14,19 @@ class StripePaymentSuccessAPITestCase(APITestCase):
         self.user = User.objects.create_user(
             email="test_user@gmail.com", password="12345678"
         )
-        self.client.force_authenticate(
-            user=self.user
-        )
+        self.client.force_authenticate(user=self.user)
         self.book = Book.objects.create(title="Test Book", inventory=10, daily_fee=5)
         self.borrowing = Borrowing.objects.create(
             user=self.user,
-            session_id="test_session_id",
             expected_return_date=datetime.date.today(),
             book_id=self.book.id,
         )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            purpose=Payment.RENTAL,
+            amount=5,
+            session_id="test_session_id",
+        )
 
     def test_payment_success(self):
         url = reverse("payment_success")
@@ -31,6 +35,9 @@ class StripePaymentSuccessAPITestCase(APITestCase):
         self.borrowing.refresh_from_db()
         self.assertEqual(self.borrowing.payment_status, "paid")
         self.assertIsNotNone(self.borrowing.actual_return_date)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.PAID)
+        self.assertIsNotNone(self.payment.paid_at)
 
     def test_payment_success_missing_session_id(self):
         url = reverse("payment_success")
@@ -43,16 +50,19 @@ class StripePaymentCancelAPITestCase(APITestCase):
         self.user = User.objects.create_user(
             email="test_user@gmail.com", password="12345678"
         )
-        self.client.force_authenticate(
-            user=self.user
-        )
+        self.client.force_authenticate(user=self.user)
         self.book = Book.objects.create(title="Test Book", inventory=10, daily_fee=5)
         self.borrowing = Borrowing.objects.create(
             user=self.user,
-            session_id="test_session_id",
             expected_return_date=datetime.date.today(),
             book_id=self.book.id,
         )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            purpose=Payment.RENTAL,
+            amount=5,
+            session_id="test_session_id",
+        )
 
     def test_payment_cancel(self):
         url = reverse("payment_cancel")
@@ -60,8 +70,37 @@ class StripePaymentCancelAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.borrowing.refresh_from_db()
         self.assertEqual(self.borrowing.payment_status, "cancelled")
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.CANCELLED)
 
     def test_payment_cancel_missing_session_id(self):
         url = reverse("payment_cancel")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentGatewayMetricsAPITestCase(APITestCase):
+    def test_admin_sees_metrics(self):
+        admin = User.objects.create_superuser(
+            email="admin@gmail.com", password="12345678"
+        )
+        self.client.force_authenticate(user=admin)
+
+        response = self.client.get(reverse("payment_metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("errors", response.data["stripe"])
+        self.assertIn(
+            response.data["circuit_breaker"]["state"],
+            ["closed", "open", "half_open"],
+        )
+
+    def test_metrics_are_admin_only(self):
+        user = User.objects.create_user(
+            email="test_user@gmail.com", password="12345678"
+        )
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(reverse("payment_metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
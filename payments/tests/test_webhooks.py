@@ -0,0 +1,174 @@
+import datetime
+import hashlib
+import hmac
+import json
+import time
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowings.models import Book, Borrowing
+from payments.models import Payment, StripeEvent
+from payments.tasks import process_stripe_events
+from payments.webhooks import process_events
+from users.models import User
+
+SECRET = "whsec_test"
+
+
+def sign(payload, secret=SECRET, age=0):
+    timestamp = int(time.time()) - age
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def session_event(event_id, type, session_id):
+    return {
+        "id": event_id,
+        "type": type,
+        "created": 1718000000,
+        "data": {"object": {"id": session_id, "object": "checkout.session"}},
+    }
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=SECRET)
+class StripeWebhookTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("payment_webhook")
+        self.user = User.objects.create_user(
+            email="test_user@gmail.com", password="12345678"
+        )
+        self.book = Book.objects.create(title="Test Book", inventory=10, daily_fee=5)
+
+    def post(self, event, signature=None):
+        payload = json.dumps(event)
+        return self.client.generic(
+            "POST",
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature or sign(payload),
+        )
+
+    def borrow(self, session_id, purpose=Payment.RENTAL, **fields):
+        borrowing = Borrowing.objects.create(
+            user=User.objects.create_user(email=f"{session_id}@gmail.com"),
+            book=self.book,
+            expected_return_date=datetime.date.today(),
+            **fields,
+        )
+        Payment.objects.create(
+            borrowing=borrowing, purpose=purpose, amount=5, session_id=session_id
+        )
+        return borrowing
+
+    def test_event_is_stored_once(self):
+        event = session_event("evt_1", "checkout.session.completed", "cs_1")
+
+        for _ in range(2):
+            response = self.post(event)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stored = StripeEvent.objects.get()
+        self.assertEqual(stored.event_id, "evt_1")
+        self.assertEqual(stored.payload, event)
+        self.assertIsNone(stored.processed_at)
+
+    def test_invalid_signature_is_rejected(self):
+        event = session_event("evt_1", "checkout.session.completed", "cs_1")
+
+        response = self.post(event, signature=sign("{}", secret="whsec_other"))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_replayed_signature_is_rejected(self):
+        event = session_event("evt_1", "checkout.session.completed", "cs_1")
+        payload = json.dumps(event)
+
+        response = self.post(event, signature=sign(payload, age=10 * 60))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_missing_signature_is_rejected(self):
+        response = self.client.post(self.url, {}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=None)
+    def test_unconfigured_secret_is_rejected(self):
+        event = session_event("evt_1", "checkout.session.completed", "cs_1")
+
+        with self.assertLogs("payments.views", "ERROR"):
+            response = self.post(event)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_rental_and_fine_of_one_borrowing_in_one_batch(self):
+        borrowing = self.borrow("cs_rental", fine_amount=10)
+        Payment.objects.create(
+            borrowing=borrowing, purpose=Payment.FINE, amount=10, session_id="cs_fine"
+        )
+        self.post(session_event("evt_1", "checkout.session.completed", "cs_rental"))
+        self.post(session_event("evt_2", "checkout.session.completed", "cs_fine"))
+
+        self.assertEqual(process_events(), {"events": 2, "payments": 2})
+
+        borrowing.refresh_from_db()
+        self.assertEqual(borrowing.payment_status, Payment.PAID)
+        self.assertEqual(borrowing.fine_payment_status, Payment.PAID)
+
+    def test_events_are_applied_in_batches(self):
+        rentals = [self.borrow(f"cs_{i}") for i in range(6)]
+        fine = self.borrow("cs_fine", Payment.FINE, fine_amount=10)
+        events = [
+            session_event(f"evt_{i}", "checkout.session.completed", f"cs_{i}")
+            for i in range(4)
+        ] + [
+            session_event("evt_4", "checkout.session.expired", "cs_4"),
+            session_event("evt_0b", "checkout.session.expired", "cs_0"),
+            session_event("evt_f", "checkout.session.completed", "cs_fine"),
+            session_event("evt_x", "customer.created", "cus_1"),
+        ]
+        for event in events:
+            self.post(event)
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = process_events(batch_size=4)
+
+        # Per batch: the events, their payments with the borrowings, the bulk
+        # updates of both and marking the events processed; then one read
+        # finding nothing left.
+        statements = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(len(statements), 2 * 5 + 1)
+
+        self.assertEqual(stats, {"events": 8, "payments": 6})
+        statuses = {
+            payment.session_id: payment.borrowing.payment_status
+            for payment in Payment.objects.select_related("borrowing")
+        }
+        self.assertEqual(statuses["cs_0"], "paid")
+        self.assertEqual(statuses["cs_3"], "paid")
+        self.assertEqual(statuses["cs_4"], "expired")
+        self.assertEqual(statuses["cs_5"], rentals[5].payment_status)
+        paid = Payment.objects.get(session_id="cs_0")
+        self.assertEqual(paid.status, Payment.PAID)
+        self.assertEqual(paid.paid_at.timestamp(), 1718000000)
+        fine.refresh_from_db()
+        self.assertEqual(fine.fine_payment_status, "paid")
+        self.assertEqual(fine.payment_status, "pending")
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True))
+        self.assertEqual(process_stripe_events(), {"events": 0, "payments": 0})
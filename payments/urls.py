@@ -1,7 +1,16 @@
 from django.urls import path
-from payments.views import StripePaymentSuccessAPIView, StripePaymentCancelAPIView
+from payments.views import (
+    PaymentGatewayMetricsAPIView,
+    PaymentSummaryAPIView,
+    StripePaymentCancelAPIView,
+    StripePaymentSuccessAPIView,
+    StripeWebhookAPIView,
+)
 
 urlpatterns = [
     path("success/", StripePaymentSuccessAPIView.as_view(), name="payment_success"),
     path("cancel/", StripePaymentCancelAPIView.as_view(), name="payment_cancel"),
+    path("webhook/", StripeWebhookAPIView.as_view(), name="payment_webhook"),
+    path("summary/", PaymentSummaryAPIView.as_view(), name="payment_summary"),
+    path("metrics/", PaymentGatewayMetricsAPIView.as_view(), name="payment_metrics"),
 ]
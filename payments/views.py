@@ -1,9 +1,16 @@
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from borrowings.models import Borrowing
+import stripe
+from payments.models import Payment
+from payments.services import breaker, metrics
+from payments.webhooks import record_event, verify_event
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,10 +24,19 @@ class StripePaymentSuccessAPIView(APIView):
                 {"error": "Session ID not provided"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        borrowing = get_object_or_404(Borrowing, session_id=session_id)
-        borrowing.payment_status = "paid"
+        payment = get_object_or_404(
+            Payment.objects.select_related("borrowing"), session_id=session_id
+        )
+        payment.status = Payment.PAID
+        payment.paid_at = timezone.now()
+        payment.save(update_fields=["status", "paid_at"])
+
+        borrowing = payment.borrowing
+        setattr(borrowing, payment.borrowing_status_field, Payment.PAID)
         borrowing.actual_return_date = timezone.now()
-        borrowing.save()
+        borrowing.save(
+            update_fields=[payment.borrowing_status_field, "actual_return_date"]
+        )
 
         return Response(
             {"message": "Payment successful", "borrowing": borrowing.id},
@@ -37,11 +53,99 @@ class StripePaymentCancelAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        borrowing = get_object_or_404(Borrowing, session_id=session_id)
-        borrowing.payment_status = "cancelled"
-        borrowing.save()
+        payment = get_object_or_404(
+            Payment.objects.select_related("borrowing"), session_id=session_id
+        )
+        payment.status = Payment.CANCELLED
+        payment.save(update_fields=["status"])
+
+        borrowing = payment.borrowing
+        setattr(borrowing, payment.borrowing_status_field, Payment.CANCELLED)
+        borrowing.save(update_fields=[payment.borrowing_status_field])
 
         return Response(
             {"message": "Payment cancelled", "borrowing": borrowing.id},
             status=status.HTTP_200_OK,
         )
+
+
+class PaymentSummaryAPIView(APIView):
+    """
+    Revenue paid in ``[start, end)`` and the balance still outstanding,
+    both read off the payment ledger's (status, date) indexes.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        today = timezone.localdate()
+        date_field = serializers.DateField()
+        try:
+            start = date_field.run_validation(
+                request.query_params.get("start") or today.replace(day=1)
+            )
+            end = date_field.run_validation(
+                request.query_params.get("end") or today + timedelta(days=1)
+            )
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({"date": exc.detail})
+
+        def at_midnight(day):
+            return timezone.make_aware(datetime.combine(day, time()))
+
+        return Response(
+            {
+                "start": start,
+                "end": end,
+                "revenue": Payment.objects.revenue(
+                    at_midnight(start), at_midnight(end)
+                ),
+                "outstanding": Payment.objects.outstanding(),
+            }
+        )
+
+
+class PaymentGatewayMetricsAPIView(APIView):
+    """Stripe call counters and circuit breaker state of this process."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {"stripe": metrics.snapshot(), "circuit_breaker": breaker.snapshot()}
+        )
+
+
+class StripeWebhookAPIView(APIView):
+    """
+    Receives Stripe events. They are verified and stored, nothing more; the
+    ``process_stripe_events`` task applies them to the borrowings.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    def post(self, request):
+        signature = request.headers.get("Stripe-Signature")
+        if not signature:
+            return Response(
+                {"error": "Signature not provided"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            event = verify_event(request.body, signature)
+        except ImproperlyConfigured as e:
+            # Stripe keeps redelivering until the secret is set.
+            logger.error("Stripe webhook rejected: %s", e)
+            return Response(
+                {"error": "Webhook secret not configured"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(
+                {"error": "Invalid event"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        record_event(event)
+        return Response({"received": True}, status=status.HTTP_200_OK)
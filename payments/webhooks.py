@@ -0,0 +1,143 @@
+"""
+Stripe webhook events: verified and stored by the view, applied in batches.
+
+``record_event`` only inserts the raw event, so the webhook answers at once
+and a redelivery is a no-op. ``process_events`` later folds pending events
+into the ledger with one ``bulk_update`` per batch, looking payments up by
+their unique session id, and mirrors the new status onto the borrowing.
+"""
+
+import json
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+from borrowings.payment_sessions import PURPOSES
+from payments.models import Payment, StripeEvent
+
+BATCH_SIZE = 500
+
+# Payment status a checkout session event moves its payment to.
+SESSION_STATUSES = {
+    "checkout.session.completed": Payment.PAID,
+    "checkout.session.async_payment_succeeded": Payment.PAID,
+    "checkout.session.async_payment_failed": Payment.FAILED,
+    "checkout.session.expired": Payment.EXPIRED,
+}
+# Stripe sends no event after these, but a late "expired" must not undo them.
+FINAL_STATUSES = {Payment.PAID}
+
+
+def verify_event(payload, signature):
+    """
+    Check the ``Stripe-Signature`` header and parse ``payload``; raises
+    ``stripe.error.SignatureVerificationError`` or ``ValueError``, and
+    ``ImproperlyConfigured`` when no webhook secret is set. A signature
+    older than Stripe's default tolerance is refused, so a captured request
+    cannot be replayed.
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise ImproperlyConfigured("STRIPE_WEBHOOK_SECRET is not set.")
+    stripe.WebhookSignature.verify_header(
+        payload.decode("utf-8"),
+        signature,
+        settings.STRIPE_WEBHOOK_SECRET,
+        tolerance=stripe.Webhook.DEFAULT_TOLERANCE,
+    )
+    event = json.loads(payload)
+    if not isinstance(event, dict) or "id" not in event or "type" not in event:
+        raise ValueError("Not a Stripe event.")
+    return event
+
+
+def record_event(event):
+    """Store ``event``; a redelivered one hits the unique event id and is dropped."""
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event["id"], type=event["type"], payload=event)],
+        ignore_conflicts=True,
+    )
+
+
+def get_event_time(event):
+    created = event.payload.get("created")
+    if created is None:
+        return timezone.now()
+    return datetime.fromtimestamp(created, tz=dt_timezone.utc)
+
+
+def apply_events(events):
+    """
+    Apply ``events`` (in id order) to their payments; returns payments
+    updated. The payments are locked until the caller's transaction ends,
+    so a redirect or reconciliation settling one meanwhile is not undone.
+    """
+    changes = {}
+    for event in events:
+        status = SESSION_STATUSES.get(event.type)
+        if status is None:
+            continue
+        session_id = event.payload["data"]["object"]["id"]
+        if changes.get(session_id, (None,))[0] not in FINAL_STATUSES:
+            changes[session_id] = (status, get_event_time(event))
+
+    payments = (
+        Payment.objects.select_for_update()
+        .filter(session_id__in=changes)
+        .select_related("borrowing")
+        .only(
+            "id",
+            "session_id",
+            "purpose",
+            "status",
+            "paid_at",
+            "borrowing__id",
+            *(f"borrowing__{field}" for field in PURPOSES),
+        )
+    )
+    updated_payments = []
+    updated_borrowings = {}
+    for payment in payments:
+        status, happened_at = changes[payment.session_id]
+        if payment.status in FINAL_STATUSES | {status}:
+            continue
+        payment.status = status
+        if status == Payment.PAID:
+            payment.paid_at = happened_at
+        updated_payments.append(payment)
+
+        # One instance per borrowing: its rental and fine payments each come
+        # with their own copy, and bulk_update writes both status fields.
+        borrowing = updated_borrowings.setdefault(
+            payment.borrowing_id, payment.borrowing
+        )
+        setattr(borrowing, payment.borrowing_status_field, status)
+
+    Payment.objects.bulk_update(updated_payments, ["status", "paid_at"])
+    Borrowing.objects.bulk_update(updated_borrowings.values(), list(PURPOSES))
+    return len(updated_payments)
+
+
+def process_events(batch_size=BATCH_SIZE):
+    """Apply every pending event; returns how many events and payments."""
+    stats = {"events": 0, "payments": 0}
+    while True:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.filter(processed_at__isnull=True)
+                .select_for_update(skip_locked=True)
+                .only("id", "type", "payload")
+                .order_by("id")[:batch_size]
+            )
+            if not events:
+                return stats
+            stats["payments"] += apply_events(events)
+            StripeEvent.objects.filter(id__in=[event.id for event in events]).update(
+                processed_at=timezone.now()
+            )
+            stats["events"] += len(events)